@@ -32,6 +32,7 @@
 """
 # Robot操作コマンド
 PROGRAM = 0x000
+PROGRAM_QUEUE = 0x001
 HOME = 0x100
 JMOVE_PTP = 0x101
 MOVE_PTP = 0x102
@@ -49,6 +50,15 @@ MARK = 0x10D
 JMARK = 0x10E
 ABORTM = 0x10F
 SYSSTS = 0x110
+RTOJ_BATCH = 0x111
+CHECK_PATH = 0x112
+MOVE_PATH = 0x113
+QJMOVE_TRAJ = 0x114
+QJMOVE_SPLINE = 0x115
+ESTIMATE = 0x116
+MOVE_PTP_REL = 0x117
+MOVE_LINE_REL = 0x118
+JMOVE_PTP_REL = 0x119
 
 # I/O操作コマンド
 SETIO = 0x200
@@ -56,6 +66,15 @@ GETIO = 0x201
 SETADC = 0x202
 GETADC = 0x203
 
+# 状態取得コマンド
+PROGRAM_HISTORY = 0x300
+CACHE_STATUS = 0x301
+
+# ポーズ登録コマンド
+POSE_SET = 0x400
+POSE_DELETE = 0x401
+POSE_LIST = 0x402
+
 # その他
 NOCOMMAND = 0xFFF
 
@@ -38,4 +38,5 @@ PROGRAM_ERROR = 0x1004
 ROBOT_ERROR = 0x1005
 OPERATION_GET_ERROR = 0x1006
 OPERATION_NONE_ERROR = 0x1007
+PROGRAM_RUNNING_ERROR = 0x1008
 
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+CCサーバーのエンドツーエンドのベンチマーク
+rblibのシミュレータ(fsrobo_r_rblib_sim)を相手にCCサーバーを起動し、
+実際のソケット通信で代表的な負荷をかけてコマンドごとのスループットと遅延を計測する
+
+使い方:
+    python fsrobo_r_cc_bench.py --duration 5 --output bench.json
+    python fsrobo_r_cc_bench.py --mix stream --clients 1 2 3 --latency 0.0005
+    python fsrobo_r_cc_bench.py --no-spawn --host 192.168.0.23    # 起動済みのサーバーを計測
+
+負荷の種類(--mix):
+    stream: 1台目が先読み動作(QJMOVE_PTP)を送り続けて定期的に位置(JMARK, MARK)を取得し、
+            他は状態を取得する
+    telemetry: 全台で状態とI/O(SYSSTS, GETIO, GETADC)を取得する
+    io: 全台でI/Oの出力と読み込み(SETIO, GETIO)を繰り返す
+    program: 1台目がプログラム実行(PROGRAM)を繰り返し、他は状態を取得する
+    mixed: 先読み動作、状態取得、I/Oを組み合わせる
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fsrobo_r_rblib_sim
+# CCサーバーの設定を参照するため、rblibの代わりにシミュレータを読み込む
+fsrobo_r_rblib_sim.install()
+import CommandID
+import ErrorCode
+import fsrobo_r_cc_codec
+import fsrobo_r_traffic
+from fsrobo_r_cc_server import FSRoboRCCServer, ServiceThread
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 負荷の種類ごとの接続の役割
+# 1台目に先頭の役割、2台目以降に残りの役割を順に割り当てる
+# 操作権は最後に取得した接続のみが有効なため、操作権が必要な役割は先頭にのみ置く
+_ROLE_STREAM = "stream"
+_ROLE_TELEMETRY = "telemetry"
+_ROLE_IO = "io"
+_ROLE_PROGRAM = "program"
+MIXES = {
+    "stream": [_ROLE_STREAM, _ROLE_TELEMETRY],
+    "telemetry": [_ROLE_TELEMETRY],
+    "io": [_ROLE_IO],
+    "program": [_ROLE_PROGRAM, _ROLE_TELEMETRY],
+    "mixed": [_ROLE_STREAM, _ROLE_TELEMETRY, _ROLE_IO]
+}
+
+# ベンチマークで実行するプログラム
+_PROGRAM_SOURCE = """
+import rblib
+rb = rblib.Robot("127.0.0.1", 12345)
+rb.open()
+rb.acq_permission()
+for angle in (5, -5, 0):
+    rb.jntmove(angle, 0, 0, 0, 0, 0, 50, 0.1, 0.1)
+rb.rel_permission()
+rb.close()
+"""
+
+# シミュレータとCCサーバーの起動待ち時間(秒)
+_START_TIMEOUT = 10.0
+# 先読み動作の振幅(deg)
+_STREAM_AMPLITUDE = 5.0
+# 先読み動作中に位置を取得する間隔(動作コマンド数)
+_STREAM_FEEDBACK_INTERVAL = 10
+
+
+class BenchClient(object):
+    """
+    CCサーバーのクライアント
+    """
+
+    _PROCESS_ID = 0
+
+    def __init__(self, host, port):
+        # 前回の計測のセッションが終了するまでは接続数の上限で拒否されるため、接続し直す
+        deadline = time.time() + _START_TIMEOUT
+        while True:
+            self._connect(host, port)
+            try:
+                code, _ = self.request(fsrobo_r_cc_codec.DATA_TYPE_CONNECT_CHECK, CommandID.NOCOMMAND, {})
+            except (socket.error, IOError):
+                # 拒否の応答より先に切断を検出した場合
+                if time.time() > deadline:
+                    raise
+                code = ErrorCode.PROCESS_ERROR
+            if code != ErrorCode.PROCESS_ERROR or time.time() > deadline:
+                break
+            self.close()
+            time.sleep(0.05)
+
+    def _connect(self, host, port):
+        self._sock = socket.create_connection((host, port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = fsrobo_r_cc_codec.MessageReader()
+        self._replies = []
+
+    def request(self, data_type, cmd_id, data):
+        """
+        要求を送信し、応答を受信する
+
+        戻り値:
+            reply: 応答のエラーコード
+            latency: 送信から応答の受信完了までの時間(秒)
+        """
+        message = fsrobo_r_cc_codec.encode_request(cmd_id, data, data_type, self._PROCESS_ID)
+        start = time.time()
+        self._sock.sendall(message)
+        while not self._replies:
+            chunk = self._sock.recv(65536)
+            if len(chunk) == 0:
+                raise IOError("connection closed by server")
+            self._replies.extend(self._reader.feed(chunk))
+        reply = self._replies.pop(0)
+        return reply[fsrobo_r_cc_codec.TAG_REPLY], time.time() - start
+
+    def close(self):
+        self._sock.close()
+
+
+class _Recorder(object):
+    """
+    コマンドごとの遅延と失敗数を記録する
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, name, reply, latency):
+        self.latencies.setdefault(name, []).append(latency)
+        if reply != ErrorCode.SUCCESS:
+            codes = self.errors.setdefault(name, {})
+            codes[reply] = codes.get(reply, 0) + 1
+
+
+def _run_role(role, client, deadline, recorder, program_path, index):
+    """
+    役割ごとの負荷をかける
+    """
+    cmd = ServiceThread._DATA_TYPE_CMD
+    if role in (_ROLE_STREAM, _ROLE_PROGRAM):
+        client.request(ServiceThread._DATA_TYPE_OPERATION_GET, CommandID.NOCOMMAND, {})
+
+    step = 0
+    while time.time() < deadline:
+        step += 1
+        if role == _ROLE_STREAM:
+            angle = _STREAM_AMPLITUDE * ((step % 20) - 10) / 10.0
+            joints = {"J1": angle, "J2": 0, "J3": 0, "J4": 0, "J5": angle, "J6": 0}
+            recorder.add("QJMOVE_PTP", *client.request(cmd, CommandID.QJMOVE_PTP, joints))
+            if step % _STREAM_FEEDBACK_INTERVAL == 0:
+                recorder.add("JMARK", *client.request(cmd, CommandID.JMARK, {}))
+                recorder.add("MARK", *client.request(cmd, CommandID.MARK, {}))
+        elif role == _ROLE_TELEMETRY:
+            recorder.add("SYSSTS", *client.request(cmd, CommandID.SYSSTS, {"TYPE": 0}))
+            recorder.add("GETIO", *client.request(cmd, CommandID.GETIO, {"SA": 0, "EA": 31}))
+            recorder.add("GETADC", *client.request(cmd, CommandID.GETADC, {}))
+        elif role == _ROLE_IO:
+            # 接続ごとに別のアドレスで出力し、読み込んで確認する
+            address = index % 32
+            recorder.add("SETIO", *client.request(cmd, CommandID.SETIO, {"AD": address, "SL": str(step % 2)}))
+            recorder.add("GETIO", *client.request(cmd, CommandID.GETIO, {"SA": address, "EA": address}))
+        elif role == _ROLE_PROGRAM:
+            recorder.add("PROGRAM", *client.request(ServiceThread._DATA_TYPE_PROGRAM, CommandID.PROGRAM,
+                                                    {"PATH": program_path, "DEL": 0}))
+
+
+def _role(roles, index):
+    """
+    接続の番号に役割を割り当てる
+    """
+    if index == 0 or len(roles) == 1:
+        return roles[0]
+    return roles[1 + (index - 1) % (len(roles) - 1)]
+
+
+def percentile(values, ratio):
+    """
+    最近接順位法で百分位数を求める values は昇順
+    """
+    index = max(0, int(len(values) * ratio + 0.999999) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def run_bench(host, port, mix, clients, duration, program_path):
+    """
+    1つの負荷の種類と接続数でベンチマークを実行する
+
+    戻り値:
+        result: 計測結果 JSON形式
+    """
+    roles = MIXES[mix]
+    connections = [BenchClient(host, port) for _ in range(clients)]
+    recorders = [_Recorder() for _ in range(clients)]
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=_run_role,
+                                args=(_role(roles, index), connections[index], deadline,
+                                      recorders[index], program_path, index))
+               for index in range(clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    for connection in connections:
+        connection.close()
+
+    latencies = {}
+    errors = {}
+    for recorder in recorders:
+        for name, values in recorder.latencies.items():
+            latencies.setdefault(name, []).extend(values)
+        for name, codes in recorder.errors.items():
+            merged = errors.setdefault(name, {})
+            for code, count in codes.items():
+                merged["0x{:04X}".format(code)] = merged.get("0x{:04X}".format(code), 0) + count
+
+    commands = {}
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        commands[name] = {
+            "count": len(values),
+            "errors": errors.get(name, {}),
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000.0,
+            "p95_ms": percentile(values, 0.95) * 1000.0,
+            "p99_ms": percentile(values, 0.99) * 1000.0,
+            "max_ms": values[-1] * 1000.0
+        }
+    return {
+        "mix": mix,
+        "clients": clients,
+        "duration": elapsed,
+        "rps": sum(command["count"] for command in commands.values()) / elapsed,
+        "commands": commands
+    }
+
+
+def _wait_port(host, port, process):
+    """
+    サーバーが接続を受け付けるまで待つ
+    """
+    deadline = time.time() + _START_TIMEOUT
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("process exited with {}".format(process.returncode))
+        try:
+            socket.create_connection((host, port), 0.5).close()
+            return
+        except socket.error:
+            time.sleep(0.1)
+    raise RuntimeError("timed out waiting for {}:{}".format(host, port))
+
+
+def start_servers(latency, jitter, time_scale, port, log, record=None):
+    """
+    シミュレータとCCサーバーを子プロセスで起動する
+
+    引数:
+        latency, jitter, time_scale: シミュレータの設定
+        port: CCサーバーの待ち受けポート番号 接続の確認に使用する
+        log: 子プロセスの出力先
+        record: CCサーバーの通信を記録するファイルパス ※省略時は記録しない
+    戻り値:
+        processes: 起動した子プロセスのリスト stop_servers()で停止する
+    """
+    sim = subprocess.Popen([sys.executable, os.path.join(_DIR, "fsrobo_r_rblib_sim.py"),
+                            "--port", str(FSRoboRCCServer._RBLIB_PORT),
+                            "--latency", str(latency), "--jitter", str(jitter),
+                            "--time-scale", str(time_scale)],
+                           stdout=log, stderr=subprocess.STDOUT)
+    processes = [sim]
+    try:
+        _wait_port(FSRoboRCCServer._RBLIB_HOST, FSRoboRCCServer._RBLIB_PORT, sim)
+        env = dict(os.environ)
+        env[fsrobo_r_rblib_sim.SIM_ENV] = fsrobo_r_rblib_sim.SIM_TCP
+        env.pop(fsrobo_r_traffic.RECORD_ENV, None)
+        if record is not None:
+            env[fsrobo_r_traffic.RECORD_ENV] = record
+        server = subprocess.Popen([sys.executable, os.path.join(_DIR, "fsrobo_r_cc_server.py")],
+                                  stdout=log, stderr=subprocess.STDOUT, env=env, cwd=_DIR)
+        processes.append(server)
+        _wait_port("127.0.0.1", port, server)
+    except Exception:
+        stop_servers(processes)
+        raise
+    return processes
+
+
+def stop_servers(processes):
+    """
+    start_servers()で起動した子プロセスを停止する
+    """
+    for process in reversed(processes):
+        if process.poll() is None:
+            process.terminate()
+            process.wait()
+
+
+def _print_result(result):
+    print("mix={} clients={} total={:.1f} req/s".format(result["mix"], result["clients"], result["rps"]))
+    for name, command in sorted(result["commands"].items()):
+        print("  {:<12} {:>8} req {:>9.1f} req/s  p50 {:>7.2f} ms  p95 {:>7.2f} ms  p99 {:>7.2f} ms  err {}".format(
+            name, command["count"], command["rps"], command["p50_ms"], command["p95_ms"],
+            command["p99_ms"], command["errors"]))
+
+
+def main():
+    """
+    main関数
+    """
+    parser = argparse.ArgumentParser(description="FSRobo-R CC server end-to-end benchmark")
+    parser.add_argument("--mix", nargs="+", choices=sorted(MIXES), default=sorted(MIXES))
+    parser.add_argument("--clients", nargs="+", type=int,
+                        default=list(range(1, FSRoboRCCServer._CONNECT_DEVICE_MAX + 1)))
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated rblib latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated rblib jitter in seconds")
+    parser.add_argument("--time-scale", type=float, default=0.0, help="simulated motion time scale")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=FSRoboRCCServer._SOCKET_PORT_NUMBER)
+    parser.add_argument("--no-spawn", action="store_true", help="use an already running server")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    for clients in args.clients:
+        if clients < 1 or clients > FSRoboRCCServer._CONNECT_DEVICE_MAX:
+            parser.error("clients must be between 1 and {}".format(FSRoboRCCServer._CONNECT_DEVICE_MAX))
+
+    work_dir = tempfile.mkdtemp(prefix="fsrobo_r_cc_bench")
+    program_path = os.path.join(work_dir, "bench_program.py")
+    with open(program_path, "w") as f:
+        f.write(_PROGRAM_SOURCE)
+
+    processes = []
+    log = open(os.path.join(work_dir, "servers.log"), "w")
+    try:
+        if not args.no_spawn:
+            processes = start_servers(args.latency, args.jitter, args.time_scale, args.port, log)
+        runs = []
+        for mix in args.mix:
+            for clients in args.clients:
+                result = run_bench(args.host, args.port, mix, clients, args.duration, program_path)
+                _print_result(result)
+                runs.append(result)
+    finally:
+        stop_servers(processes)
+        log.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "simulator": None if args.no_spawn else {
+                "latency": args.latency, "jitter": args.jitter, "time_scale": args.time_scale
+            },
+            "runs": runs
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
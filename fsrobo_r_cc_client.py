@@ -0,0 +1,686 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+FSRobo-R CCサーバーのクライアントモジュール
+CCサーバーと同じコーデック(fsrobo_r_cc_codec)でメッセージを送受信する
+
+使い方:
+    from fsrobo_r_cc_client import FSRoboRCCClient
+
+    with FSRoboRCCClient("192.168.0.23") as client:
+        client.acquire_operation()
+        client.jmove_ptp([0, 0, 90, 0, 90, 0], speed=20)
+        print(client.jmark())
+
+        # パイプライン送信: まとめて送信し、応答を順に受信する
+        with client.batch() as batch:
+            batch.jmark()
+            batch.getio(0, 31)
+        joints, io = batch.results()
+
+        # 先読み動作を送り続ける
+        client.stream_joints(points, window=8)
+
+接続が切れた場合は次の要求で再接続する
+状態を変更しないコマンドは送受信中に切断された場合も再接続して1回だけ再送する
+操作権を取得していた場合は再接続時に取得し直す
+Python 2.7とPython 3で使用できる asyncio版はfsrobo_r_cc_client_async
+"""
+
+import socket
+
+import CommandID
+import ErrorCode
+import fsrobo_r_cc_codec
+import fsrobo_r_packed
+from fsrobo_r_cc_codec import (DATA_TYPE_CMD, DATA_TYPE_PROGRAM, DATA_TYPE_CONNECT_CHECK,
+                               DATA_TYPE_OPERATION_GET, DATA_TYPE_METRICS, DATA_TYPE_TRACE)
+
+# CCサーバーの待ち受けポート番号
+DEFAULT_PORT = 5500
+# 観測セッション(読み込み専用)の接続先のポート番号
+OBSERVER_PORT = 5501
+# 応答待ちのタイムアウトの既定値(秒)
+DEFAULT_TIMEOUT = 30.0
+
+_ERROR_NAMES = dict((value, name) for name, value in vars(ErrorCode).items()
+                    if name.isupper() and isinstance(value, int))
+
+# 再送しても状態が変わらない要求(データ種別, コマンドID) コマンドIDがNoneの場合はデータ種別のみで判断
+RETRY_SAFE = frozenset([
+    (DATA_TYPE_CONNECT_CHECK, None),
+    (DATA_TYPE_OPERATION_GET, None),
+    (DATA_TYPE_METRICS, None),
+    (DATA_TYPE_CMD, CommandID.RTOJ),
+    (DATA_TYPE_CMD, CommandID.RTOJ_BATCH),
+    (DATA_TYPE_CMD, CommandID.CHECK_PATH),
+    (DATA_TYPE_CMD, CommandID.ESTIMATE),
+    (DATA_TYPE_CMD, CommandID.GETPOSTURE),
+    (DATA_TYPE_CMD, CommandID.MARK),
+    (DATA_TYPE_CMD, CommandID.JMARK),
+    (DATA_TYPE_CMD, CommandID.SYSSTS),
+    (DATA_TYPE_CMD, CommandID.GETIO),
+    (DATA_TYPE_CMD, CommandID.GETADC),
+    (DATA_TYPE_CMD, CommandID.PROGRAM_HISTORY),
+    (DATA_TYPE_CMD, CommandID.CACHE_STATUS),
+    (DATA_TYPE_CMD, CommandID.POSE_LIST)
+])
+
+# 座標情報と軸情報のキー
+POSE_KEYS = ("X", "Y", "Z", "Rx", "Ry", "Rz")
+JOINT_KEYS = ("J1", "J2", "J3", "J4", "J5", "J6")
+
+
+def _retry_safe(data_type, cmd_id):
+    return (data_type, None) in RETRY_SAFE or (data_type, cmd_id) in RETRY_SAFE
+
+
+class CCError(Exception):
+    """
+    CCサーバーがエラーコードを返した場合の例外
+    """
+
+    def __init__(self, cmd_id, code, data=None):
+        super(CCError, self).__init__("command 0x{:03X} failed with {} (0x{:04X})".format(
+            cmd_id, _ERROR_NAMES.get(code, "UNKNOWN"), code))
+        self.cmd_id = cmd_id
+        self.code = code
+        self.data = data
+
+
+def _motion(data, speed, acc, dacc):
+    """
+    動作コマンドの共通項目を設定
+    """
+    if speed is not None:
+        data["SP"] = speed
+    if acc is not None:
+        data["ATM"] = acc
+    if dacc is not None:
+        data["DTM"] = dacc
+    return data
+
+
+def _joints(joints):
+    return dict(zip(JOINT_KEYS, joints))
+
+
+def _pose(pose, posture=None):
+    data = dict(zip(POSE_KEYS, pose))
+    if posture is not None:
+        data["P"] = posture
+    return data
+
+
+def _packed_rows(rows):
+    """
+    [N, 6]の座標情報または軸情報をパックされた配列にする
+    """
+    shape, data = fsrobo_r_packed.pack_rows("d", [list(row) for row in rows], 6)
+    return fsrobo_r_packed.encode("d", shape, data)
+
+
+class _Commands(object):
+    """
+    コマンドごとの要求を作成する関数
+    送信方法は継承先の_command()で決める
+    各関数は応答のDAを返す(バッチの場合は結果の位置)
+    """
+
+    def _command(self, cmd_id, data=None, data_type=DATA_TYPE_CMD):
+        raise NotImplementedError
+
+    # 接続、状態取得
+    def connect_check(self):
+        return self._command(CommandID.NOCOMMAND, data_type=DATA_TYPE_CONNECT_CHECK)
+
+    def metrics(self):
+        return self._command(CommandID.NOCOMMAND, data_type=DATA_TYPE_METRICS)
+
+    def trace(self, enable=None, path=None, clear=False):
+        data = {}
+        if path is not None:
+            data["PATH"] = path
+        if clear:
+            data["CLR"] = 1
+        if enable is not None:
+            data["EN"] = 1 if enable else 0
+        return self._command(CommandID.NOCOMMAND, data, DATA_TYPE_TRACE)
+
+    # Robot操作コマンド
+    def program(self, path, delete=False, param=None, arrays=None, wait=True):
+        """
+        プログラムを実行する wait=Falseの場合は結果をwait_program()で受信する
+        delete=Trueの場合、pathはサーバーのプログラムの格納先直下のプログラムごとのフォルダに置く
+        arraysは配列名ごとのfsrobo_r_packed.encode()の結果
+        """
+        data = {"PATH": path, "DEL": 1 if delete else 0}
+        if param is not None:
+            data["PAR"] = param
+        if arrays:
+            data["BIN"] = arrays
+        if not wait:
+            data["ASYNC"] = 1
+        return self._command(CommandID.PROGRAM, data, DATA_TYPE_PROGRAM)
+
+    def program_queue(self, items, stop_on_error=True, wait=True):
+        """
+        プログラムを連続実行する itemsはprogram()と同じキー(PATH, DEL, PAR, BIN)の辞書のリスト
+        """
+        data = {"ITEMS": items, "STOP": 1 if stop_on_error else 0}
+        if not wait:
+            data["ASYNC"] = 1
+        return self._command(CommandID.PROGRAM_QUEUE, data, DATA_TYPE_PROGRAM)
+
+    def home(self):
+        return self._command(CommandID.HOME)
+
+    def jmove_ptp(self, joints=None, name=None, speed=None, acc=None, dacc=None):
+        data = {"NAME": name} if name is not None else _joints(joints)
+        return self._command(CommandID.JMOVE_PTP, _motion(data, speed, acc, dacc))
+
+    def move_ptp(self, pose=None, posture=None, name=None, speed=None, acc=None, dacc=None):
+        data = {"NAME": name} if name is not None else _pose(pose, posture)
+        return self._command(CommandID.MOVE_PTP, _motion(data, speed, acc, dacc))
+
+    def speed_ptp(self, speed):
+        return self._command(CommandID.SPEED_PTP, {"SP": speed})
+
+    def speed_line(self, speed):
+        return self._command(CommandID.SPEED_LINE, {"SP": speed})
+
+    def rtoj(self, pose, posture):
+        return self._command(CommandID.RTOJ, _pose(pose, posture))
+
+    def rtoj_batch(self, poses, posture=None):
+        data = {"PS": _packed_rows(poses)}
+        if posture is not None:
+            data["P"] = posture
+        return self._command(CommandID.RTOJ_BATCH, data)
+
+    def check_path(self, poses=None, joints=None, posture=None, line=True):
+        data = {"MD": 1 if line else 0}
+        if poses is not None:
+            data["PS"] = _packed_rows(poses)
+            if posture is not None:
+                data["P"] = posture
+        else:
+            data["JS"] = _packed_rows(joints)
+        return self._command(CommandID.CHECK_PATH, data)
+
+    def qjmove_ptp(self, joints, speed=None, acc=None, dacc=None):
+        return self._command(CommandID.QJMOVE_PTP, _motion(_joints(joints), speed, acc, dacc))
+
+    def qjmove_traj(self, joints, tolerance=None, speed=None, acc=None, dacc=None):
+        data = {"JS": _packed_rows(joints)}
+        if tolerance is not None:
+            data["TOL"] = tolerance
+        return self._command(CommandID.QJMOVE_TRAJ, _motion(data, speed, acc, dacc))
+
+    def qjmove_spline(self, knots, times, degree=None, period=None, speed=None, acc=None, dacc=None):
+        data = {"JS": _packed_rows(knots), "TM": list(times)}
+        if degree is not None:
+            data["DG"] = degree
+        if period is not None:
+            data["DT"] = period
+        return self._command(CommandID.QJMOVE_SPLINE, _motion(data, speed, acc, dacc))
+
+    def estimate(self, moves, start=None):
+        """
+        movesはCMD(コマンドID)と各動作コマンドと同じキーを持つ辞書のリスト
+        startは開始位置の辞書 省略時は現在位置
+        """
+        data = {"MV": moves}
+        if start is not None:
+            data["ST"] = start
+        return self._command(CommandID.ESTIMATE, data)
+
+    def settool(self, offset):
+        return self._command(CommandID.SETTOOL, _pose(offset))
+
+    def setbase(self, offset, posture):
+        return self._command(CommandID.SETBASE, _pose(offset, posture))
+
+    def jmove_line(self, joints, speed=None, acc=None, dacc=None):
+        return self._command(CommandID.JMOVE_LINE, _motion(_joints(joints), speed, acc, dacc))
+
+    def move_line(self, pose=None, posture=None, name=None, speed=None, acc=None, dacc=None):
+        data = {"NAME": name} if name is not None else _pose(pose, posture)
+        return self._command(CommandID.MOVE_LINE, _motion(data, speed, acc, dacc))
+
+    def move_path(self, waypoints, zone=None, wait=False):
+        """
+        waypointsはMOVE_PATHのWPと同じキーを持つ辞書のリスト
+        """
+        data = {"WP": waypoints, "WAIT": 1 if wait else 0}
+        if zone is not None:
+            data["ZN"] = zone
+        return self._command(CommandID.MOVE_PATH, data)
+
+    def move_ptp_rel(self, offset, tool_frame=False, posture=None, speed=None, acc=None, dacc=None):
+        data = dict(zip(("DX", "DY", "DZ", "DRx", "DRy", "DRz"), offset))
+        data["FR"] = 1 if tool_frame else 0
+        if posture is not None:
+            data["P"] = posture
+        return self._command(CommandID.MOVE_PTP_REL, _motion(data, speed, acc, dacc))
+
+    def move_line_rel(self, offset, tool_frame=False, posture=None, speed=None, acc=None, dacc=None):
+        data = dict(zip(("DX", "DY", "DZ", "DRx", "DRy", "DRz"), offset))
+        data["FR"] = 1 if tool_frame else 0
+        if posture is not None:
+            data["P"] = posture
+        return self._command(CommandID.MOVE_LINE_REL, _motion(data, speed, acc, dacc))
+
+    def jmove_ptp_rel(self, offset, speed=None, acc=None, dacc=None):
+        data = dict(zip(("DJ1", "DJ2", "DJ3", "DJ4", "DJ5", "DJ6"), offset))
+        return self._command(CommandID.JMOVE_PTP_REL, _motion(data, speed, acc, dacc))
+
+    def setposture(self, posture):
+        return self._command(CommandID.SETPOSTURE, {"P": posture})
+
+    def getposture(self):
+        return self._command(CommandID.GETPOSTURE)
+
+    def mark(self):
+        return self._command(CommandID.MARK)
+
+    def jmark(self):
+        return self._command(CommandID.JMARK)
+
+    def abortm(self):
+        return self._command(CommandID.ABORTM)
+
+    def syssts(self, status_type):
+        return self._command(CommandID.SYSSTS, {"TYPE": status_type})
+
+    # I/O操作コマンド
+    def setio(self, address, signal):
+        return self._command(CommandID.SETIO, {"AD": address, "SL": signal})
+
+    def getio(self, start, end):
+        return self._command(CommandID.GETIO, {"SA": start, "EA": end})
+
+    def setadc(self, channel, mode):
+        return self._command(CommandID.SETADC, {"CH": channel, "MO": mode})
+
+    def getadc(self):
+        return self._command(CommandID.GETADC)
+
+    # 状態取得コマンド
+    def program_history(self, count=None, sort=None):
+        data = {}
+        if count is not None:
+            data["N"] = count
+        if sort is not None:
+            data["SORT"] = sort
+        return self._command(CommandID.PROGRAM_HISTORY, data)
+
+    def cache_status(self):
+        return self._command(CommandID.CACHE_STATUS)
+
+    # ポーズ登録コマンド
+    def pose_set(self, name, pose=None, posture=None):
+        data = _pose(pose, posture) if pose is not None else {}
+        if pose is None and posture is not None:
+            data["P"] = posture
+        data["NAME"] = name
+        return self._command(CommandID.POSE_SET, data)
+
+    def pose_delete(self, name):
+        return self._command(CommandID.POSE_DELETE, {"NAME": name})
+
+    def pose_list(self):
+        return self._command(CommandID.POSE_LIST)
+
+
+class FSRoboRCCClient(_Commands):
+    """
+    CCサーバーのクライアント
+    1つの接続を使い回し、切断された場合は次の要求で再接続する
+    スレッドセーフではないため、スレッドごとに作成する
+    """
+
+    _RECV_SIZE = 65536
+    _PROGRAM_COMMANDS = (CommandID.PROGRAM, CommandID.PROGRAM_QUEUE)
+
+    def __init__(self, host, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, reconnect=True, process=0):
+        """
+        初期化 接続は最初の要求時に行う
+
+        引数:
+            host, port: CCサーバーの接続先
+            timeout: 接続と応答待ちのタイムアウト(秒)
+            reconnect: 切断された場合に再接続するか
+            process: 要求のPRに設定する送信元プロセス
+        """
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._reconnect = reconnect
+        self._process = process
+        self._sock = None
+        self._reader = None
+        self._received = []
+        self._connected_once = False
+        self._operation = False
+        # 結果を受信していない非同期実行のプログラムの数と、先に受信したプログラムの結果
+        self._async_pending = 0
+        self._async_replies = []
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def connect(self):
+        """
+        接続する 操作権を取得していた場合は取得し直す
+        """
+        if self._sock is not None:
+            return
+        if self._connected_once and not self._reconnect:
+            raise IOError("connection to CC server was lost")
+        sock = socket.create_connection((self._host, self._port), self._timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self._timeout)
+        self._sock = sock
+        self._reader = fsrobo_r_cc_codec.MessageReader()
+        self._received = []
+        self._connected_once = True
+        # 切断で失われた非同期実行の結果は受信できない
+        self._async_pending = 0
+        if self._operation:
+            reply = self._exchange([(CommandID.NOCOMMAND, None, DATA_TYPE_OPERATION_GET)])[0]
+            self._check(*reply)
+
+    def close(self):
+        """
+        切断する
+        """
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._reader = None
+                # 切断で失われた非同期実行の結果は受信できない
+                self._async_pending = 0
+
+    def acquire_operation(self):
+        """
+        操作権を取得する 再接続時は自動で取得し直す
+        """
+        self.request(CommandID.NOCOMMAND, data_type=DATA_TYPE_OPERATION_GET, check=True)
+        self._operation = True
+
+    def request(self, cmd_id, data=None, data_type=DATA_TYPE_CMD, check=False):
+        """
+        要求を送信し、応答を受信する
+
+        引数:
+            cmd_id: コマンドID
+            data: コマンド実行用データ
+            data_type: データ種別
+            check: Trueの場合はエラーコードが成功以外の時にCCErrorを送出する
+        戻り値:
+            error_code: エラーコード 非同期実行のプログラムはNone
+            data: 応答のDA 非同期実行のプログラムはNone
+        """
+        reply = self.pipeline([(cmd_id, data, data_type)])[0]
+        if reply is None:
+            return None, None
+        if check:
+            self._check(*reply)
+        return reply[1], reply[2]
+
+    def _command(self, cmd_id, data=None, data_type=DATA_TYPE_CMD):
+        return self.request(cmd_id, data, data_type, check=True)[1]
+
+    @staticmethod
+    def _check(cmd_id, error_code, data):
+        if error_code != ErrorCode.SUCCESS:
+            raise CCError(cmd_id, error_code, data)
+
+    def pipeline(self, requests):
+        """
+        複数の要求をまとめて送信し、応答を順に受信する
+        サーバーは受信順に実行するため、応答待ちの往復時間は1回分になる
+
+        引数:
+            requests: (コマンドID, データ[, データ種別])のリスト
+        戻り値:
+            replies: 要求ごとの(コマンドID, エラーコード, 応答のDA)のリスト 非同期実行のプログラムはNone
+        """
+        requests = [(request[0], request[1], request[2] if len(request) > 2 else DATA_TYPE_CMD)
+                    for request in requests]
+        try:
+            return self._exchange(requests)
+        except (socket.error, IOError):
+            # 状態を変更しない要求のみ再送する
+            if not (self._reconnect and all(_retry_safe(data_type, cmd_id)
+                                            for cmd_id, _, data_type in requests)):
+                raise
+            return self._exchange(requests)
+
+    def batch(self):
+        """
+        コマンド関数の呼び出しをまとめてパイプライン送信する
+
+        戻り値:
+            batch: withを抜けると送信する results()で応答のDAを取得する
+        """
+        return Batch(self)
+
+    def wait_program(self, timeout=None):
+        """
+        非同期実行したプログラムの結果を受信する
+
+        引数:
+            timeout: タイムアウト(秒) ※省略時は接続時の値
+        戻り値:
+            cmd_id: PROGRAM または PROGRAM_QUEUE
+            error_code: エラーコード
+            data: 応答のDA
+        """
+        if self._async_replies:
+            return self._async_replies.pop(0)
+        if self._sock is None:
+            raise IOError("connection to CC server was lost")
+        if self._async_pending == 0:
+            raise ValueError("no asynchronous program is running")
+        self._sock.settimeout(timeout if timeout is not None else self._timeout)
+        try:
+            while True:
+                reply = self._receive_reply(None)
+                if reply is None:
+                    return self._async_replies.pop(0)
+        except (socket.error, IOError):
+            self.close()
+            raise
+        finally:
+            if self._sock is not None:
+                self._sock.settimeout(self._timeout)
+
+    def stream_joints(self, points, window=8, speed=None, acc=None, dacc=None):
+        """
+        軸情報を先読み動作(QJMOVE_PTP)で送り続ける
+        応答を待たずに最大window個の要求を送信しておき、サーバーとコントローラの先読みを途切れさせない
+        エラーが返された場合は以降の点を送信せず、送信済みの応答を受信してからCCErrorを送出する
+
+        引数:
+            points: 軸情報(J1～J6)のイテラブル
+            window: 応答待ちにする要求の最大数
+            speed, acc, dacc: QJMOVE_PTPのSP, ATM, DTM
+        戻り値:
+            count: 送信した点の数
+        """
+        self.connect()
+        sent = 0
+        received = 0
+        error = None
+        try:
+            for joints in points:
+                while sent - received >= window:
+                    reply = self._receive_reply(CommandID.QJMOVE_PTP)
+                    received += 1
+                    if error is None and reply[1] != ErrorCode.SUCCESS:
+                        error = CCError(*reply)
+                if error is not None:
+                    break
+                data = _motion(_joints(joints), speed, acc, dacc)
+                self._sock.sendall(fsrobo_r_cc_codec.encode_request(
+                    CommandID.QJMOVE_PTP, data, DATA_TYPE_CMD, self._process))
+                sent += 1
+            while received < sent:
+                reply = self._receive_reply(CommandID.QJMOVE_PTP)
+                received += 1
+                if error is None and reply[1] != ErrorCode.SUCCESS:
+                    error = CCError(*reply)
+        except (socket.error, IOError):
+            self.close()
+            raise
+        if error is not None:
+            raise error
+        return sent
+
+    def _exchange(self, requests):
+        """
+        要求を送信し、応答を受信する 通信エラーの場合は切断する
+        """
+        self.connect()
+        try:
+            messages = []
+            for cmd_id, data, data_type in requests:
+                if data_type == DATA_TYPE_PROGRAM and self._async_pending > 0:
+                    # 結果の対応が取れなくなるため、非同期実行の結果を受信してから実行する
+                    raise ValueError("wait_program() before running another program")
+                messages.append(fsrobo_r_cc_codec.encode_request(cmd_id, data, data_type, self._process))
+            self._sock.sendall(b"".join(messages))
+            replies = []
+            for cmd_id, data, data_type in requests:
+                if data_type == DATA_TYPE_PROGRAM and data is not None and data.get("ASYNC") == 1:
+                    self._async_pending += 1
+                    replies.append(None)
+                else:
+                    replies.append(self._receive_reply(cmd_id))
+            return replies
+        except (socket.error, IOError):
+            self.close()
+            raise
+
+    def _receive_reply(self, cmd_id):
+        """
+        要求に対する応答を1つ受信する
+        非同期実行したプログラムの結果を受信した場合は保存して次の応答を待つ
+
+        引数:
+            cmd_id: 応答を待つ要求のコマンドID Noneの場合はプログラムの結果を受信した時点でNoneを返す
+        戻り値:
+            reply: (コマンドID, エラーコード, 応答のDA)
+        """
+        while True:
+            while not self._received:
+                chunk = self._sock.recv(self._RECV_SIZE)
+                if len(chunk) == 0:
+                    raise IOError("connection closed by CC server")
+                self._received.extend(self._reader.feed(chunk))
+            reply = fsrobo_r_cc_codec.decode_reply(self._received.pop(0))
+            if self._async_pending > 0 and reply[0] in self._PROGRAM_COMMANDS:
+                self._async_pending -= 1
+                self._async_replies.append(reply)
+                if cmd_id is None:
+                    return None
+                continue
+            return reply
+
+
+class Batch(_Commands):
+    """
+    コマンド関数の呼び出しをまとめてパイプライン送信する
+    各コマンド関数は結果の位置を返す
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._requests = []
+        self._replies = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.send()
+        return False
+
+    def _command(self, cmd_id, data=None, data_type=DATA_TYPE_CMD):
+        if self._replies is not None:
+            raise ValueError("batch was already sent")
+        self._requests.append((cmd_id, data, data_type))
+        return len(self._requests) - 1
+
+    def send(self):
+        """
+        まとめた要求を送信し、全ての応答を受信する
+
+        戻り値:
+            replies: 要求ごとの(コマンドID, エラーコード, 応答のDA)のリスト
+        """
+        self._replies = self._client.pipeline(self._requests)
+        return self._replies
+
+    def results(self, check=True):
+        """
+        応答のDAを取得する
+
+        引数:
+            check: Trueの場合はエラーコードが成功以外の応答があればCCErrorを送出する
+        戻り値:
+            results: 要求ごとの応答のDAのリスト
+        """
+        if self._replies is None:
+            raise ValueError("batch has not been sent")
+        results = []
+        for reply in self._replies:
+            if reply is None:
+                results.append(None)
+                continue
+            if check and reply[1] != ErrorCode.SUCCESS:
+                raise CCError(*reply)
+            results.append(reply[2])
+        return results
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+FSRobo-R CCサーバーのasyncio版クライアントモジュール (Python 3.5以降)
+fsrobo_r_cc_clientと同じコマンド関数を持ち、各関数はawaitできるFutureを返す
+
+使い方:
+    import asyncio
+    from fsrobo_r_cc_client_async import AsyncFSRoboRCCClient
+
+    async def main():
+        client = AsyncFSRoboRCCClient("192.168.0.23")
+        await client.connect()
+        await client.acquire_operation()
+        # 応答を待たずに複数の要求を送信できる(パイプライン送信)
+        joints, position = await asyncio.gather(client.jmark(), client.mark())
+        await client.stream_joints(points, window=8)
+        client.close()
+
+Python 2.7でも読み込めるよう、コルーチン構文を使わずにFutureとコールバックで実装する
+"""
+
+import asyncio
+import collections
+import socket
+
+import CommandID
+import ErrorCode
+import fsrobo_r_cc_codec
+from fsrobo_r_cc_client import (DEFAULT_PORT, CCError, _Commands, _joints, _motion, _retry_safe)
+from fsrobo_r_cc_codec import DATA_TYPE_CMD, DATA_TYPE_PROGRAM, DATA_TYPE_OPERATION_GET
+
+
+def _then(loop, future, callback):
+    """
+    Futureの完了後にcallbackを呼び出し、その結果を返すFutureを作成する
+    callbackがFutureを返した場合はその完了を待つ
+    """
+    result = loop.create_future()
+
+    def copy(source):
+        if result.done():
+            return
+        if source.cancelled():
+            result.cancel()
+        elif source.exception() is not None:
+            result.set_exception(source.exception())
+        else:
+            result.set_result(source.result())
+
+    def done(source):
+        if result.done():
+            return
+        if source.cancelled() or source.exception() is not None:
+            copy(source)
+            return
+        try:
+            value = callback(source.result())
+        except Exception as e:
+            result.set_exception(e)
+            return
+        if isinstance(value, asyncio.Future):
+            value.add_done_callback(copy)
+        else:
+            result.set_result(value)
+
+    future.add_done_callback(done)
+    return result
+
+
+class _CCProtocol(asyncio.Protocol):
+    """
+    CCサーバーとの接続 応答を要求の送信順に対応付ける
+    """
+
+    _PROGRAM_COMMANDS = (CommandID.PROGRAM, CommandID.PROGRAM_QUEUE)
+
+    def __init__(self, client):
+        self._client = client
+        self._reader = fsrobo_r_cc_codec.MessageReader()
+        self.transport = None
+        # 応答待ちの(コマンドID, Future)
+        self.waiters = collections.deque()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def data_received(self, data):
+        for envelope in self._reader.feed(data):
+            reply = fsrobo_r_cc_codec.decode_reply(envelope)
+            if self._client._async_pending > 0 and reply[0] in self._PROGRAM_COMMANDS:
+                self._client._program_done(reply)
+                continue
+            if not self.waiters:
+                continue
+            _, future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(reply)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        error = IOError("connection closed by CC server") if exc is None else exc
+        while self.waiters:
+            _, future = self.waiters.popleft()
+            if not future.done():
+                future.set_exception(error)
+        self._client._connection_lost(self, error)
+
+
+class AsyncFSRoboRCCClient(_Commands):
+    """
+    asyncio版のCCサーバーのクライアント
+    1つの接続を使い回し、切断された場合は次の要求で再接続する
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, reconnect=True, process=0, loop=None):
+        """
+        初期化
+
+        引数:
+            host, port: CCサーバーの接続先
+            reconnect: 切断された場合に再接続するか
+            process: 要求のPRに設定する送信元プロセス
+            loop: イベントループ ※省略時は現在のイベントループ
+        """
+        self._host = host
+        self._port = port
+        self._reconnect = reconnect
+        self._process = process
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._protocol = None
+        self._connecting = None
+        self._connected_once = False
+        self._operation = False
+        self._async_pending = 0
+        self._async_replies = collections.deque()
+        self._async_waiters = collections.deque()
+
+    @property
+    def connected(self):
+        return self._protocol is not None and self._protocol.transport is not None
+
+    def connect(self):
+        """
+        接続する 操作権を取得していた場合は取得し直す
+
+        戻り値:
+            future: 接続完了を待つFuture
+        """
+        if self.connected:
+            future = self._loop.create_future()
+            future.set_result(None)
+            return future
+        if self._connecting is not None:
+            return self._connecting
+        if self._connected_once and not self._reconnect:
+            future = self._loop.create_future()
+            future.set_exception(IOError("connection to CC server was lost"))
+            return future
+
+        def connected(result):
+            self._protocol = result[1]
+            self._connected_once = True
+            self._async_pending = 0
+            if self._operation:
+                return _then(self._loop, self._send([(CommandID.NOCOMMAND, None, DATA_TYPE_OPERATION_GET)]),
+                             lambda replies: self._check(*replies[0]))
+            return None
+
+        def finished(future):
+            self._connecting = None
+
+        creating = self._loop.create_task(self._loop.create_connection(
+            lambda: _CCProtocol(self), self._host, self._port))
+        self._connecting = _then(self._loop, creating, connected)
+        self._connecting.add_done_callback(finished)
+        return self._connecting
+
+    def close(self):
+        """
+        切断する
+        """
+        if self.connected:
+            self._protocol.transport.close()
+        self._protocol = None
+
+    def acquire_operation(self):
+        """
+        操作権を取得する 再接続時は自動で取得し直す
+        """
+        def acquired(reply):
+            self._operation = True
+        return _then(self._loop, self.request(CommandID.NOCOMMAND, data_type=DATA_TYPE_OPERATION_GET,
+                                              check=True), acquired)
+
+    def request(self, cmd_id, data=None, data_type=DATA_TYPE_CMD, check=False):
+        """
+        要求を送信する
+
+        戻り値:
+            future: (エラーコード, 応答のDA)を返すFuture 非同期実行のプログラムは(None, None)
+        """
+        def done(replies):
+            reply = replies[0]
+            if reply is None:
+                return None, None
+            if check:
+                self._check(*reply)
+            return reply[1], reply[2]
+        return _then(self._loop, self.pipeline([(cmd_id, data, data_type)]), done)
+
+    def _command(self, cmd_id, data=None, data_type=DATA_TYPE_CMD):
+        return _then(self._loop, self.request(cmd_id, data, data_type, check=True), lambda reply: reply[1])
+
+    @staticmethod
+    def _check(cmd_id, error_code, data):
+        if error_code != ErrorCode.SUCCESS:
+            raise CCError(cmd_id, error_code, data)
+
+    def pipeline(self, requests):
+        """
+        複数の要求をまとめて送信する
+
+        引数:
+            requests: (コマンドID, データ[, データ種別])のリスト
+        戻り値:
+            future: 要求ごとの(コマンドID, エラーコード, 応答のDA)のリストを返すFuture
+        """
+        requests = [(request[0], request[1], request[2] if len(request) > 2 else DATA_TYPE_CMD)
+                    for request in requests]
+        first = _then(self._loop, self.connect(), lambda _: self._send(requests))
+        if not (self._reconnect and all(_retry_safe(data_type, cmd_id) for cmd_id, _, data_type in requests)):
+            return first
+
+        # 状態を変更しない要求のみ、通信エラーの場合に再送する
+        result = self._loop.create_future()
+
+        def retried(future):
+            if result.done():
+                return
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(future.result())
+
+        def done(future):
+            if future.cancelled():
+                result.cancel()
+            elif isinstance(future.exception(), (socket.error, IOError)):
+                _then(self._loop, self.connect(), lambda _: self._send(requests)).add_done_callback(retried)
+            else:
+                retried(future)
+        first.add_done_callback(done)
+        return result
+
+    def _send(self, requests):
+        """
+        接続済みの状態で要求を送信し、応答を待つFutureを返す
+        """
+        if not self.connected:
+            raise IOError("not connected to CC server")
+        protocol = self._protocol
+        futures = []
+        messages = []
+        for cmd_id, data, data_type in requests:
+            if data_type == DATA_TYPE_PROGRAM and self._async_pending > 0:
+                raise ValueError("wait_program() before running another program")
+            messages.append(fsrobo_r_cc_codec.encode_request(cmd_id, data, data_type, self._process))
+            if data_type == DATA_TYPE_PROGRAM and data is not None and data.get("ASYNC") == 1:
+                self._async_pending += 1
+                future = self._loop.create_future()
+                future.set_result(None)
+            else:
+                future = self._loop.create_future()
+                protocol.waiters.append((cmd_id, future))
+            futures.append(future)
+        protocol.transport.write(b"".join(messages))
+        return asyncio.gather(*futures)
+
+    def wait_program(self):
+        """
+        非同期実行したプログラムの結果を受信する
+
+        戻り値:
+            future: (コマンドID, エラーコード, 応答のDA)を返すFuture
+        """
+        future = self._loop.create_future()
+        if self._async_replies:
+            future.set_result(self._async_replies.popleft())
+        elif self._async_pending == 0:
+            future.set_exception(ValueError("no asynchronous program is running"))
+        else:
+            self._async_waiters.append(future)
+        return future
+
+    def _program_done(self, reply):
+        self._async_pending -= 1
+        while self._async_waiters:
+            future = self._async_waiters.popleft()
+            if not future.done():
+                future.set_result(reply)
+                return
+        self._async_replies.append(reply)
+
+    def _connection_lost(self, protocol, error):
+        if protocol is self._protocol:
+            self._protocol = None
+        self._async_pending = 0
+        while self._async_waiters:
+            future = self._async_waiters.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    def stream_joints(self, points, window=8, speed=None, acc=None, dacc=None):
+        """
+        軸情報を先読み動作(QJMOVE_PTP)で送り続ける
+        応答を待たずに最大window個の要求を送信しておく
+        エラーが返された場合は以降の点を送信せず、送信済みの応答を待ってからCCErrorで失敗する
+
+        戻り値:
+            future: 送信した点の数を返すFuture
+        """
+        points = iter(points)
+        result = self._loop.create_future()
+        state = {"sent": 0, "received": 0, "error": None, "finished": False}
+
+        def fail(error):
+            if not result.done():
+                result.set_exception(error)
+
+        def check_done():
+            if state["received"] == state["sent"] and (state["finished"] or state["error"] is not None):
+                if state["error"] is not None:
+                    fail(state["error"])
+                elif not result.done():
+                    result.set_result(state["sent"])
+
+        def replied(future):
+            state["received"] += 1
+            if future.cancelled() or future.exception() is not None:
+                fail(future.exception() if not future.cancelled() else asyncio.CancelledError())
+                return
+            reply = future.result()[0]
+            if state["error"] is None and reply[1] != ErrorCode.SUCCESS:
+                state["error"] = CCError(*reply)
+            fill()
+            check_done()
+
+        def fill():
+            while (not state["finished"] and state["error"] is None
+                   and state["sent"] - state["received"] < window):
+                try:
+                    joints = next(points)
+                except StopIteration:
+                    state["finished"] = True
+                    break
+                try:
+                    future = self._send([(CommandID.QJMOVE_PTP, _motion(_joints(joints), speed, acc, dacc),
+                                          DATA_TYPE_CMD)])
+                except Exception as e:
+                    state["finished"] = True
+                    fail(e)
+                    return
+                state["sent"] += 1
+                future.add_done_callback(replied)
+
+        def start(_):
+            fill()
+            check_done()
+        _then(self._loop, self.connect(), start).add_done_callback(
+            lambda future: fail(future.exception()) if not future.cancelled() and future.exception() else None)
+        return result
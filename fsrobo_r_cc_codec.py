@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+CCプロトコルのメッセージの符号化と復号を行うモジュール
+CCサーバーとクライアント(fsrobo_r_cc_client)で共通に使用する
+
+メッセージの形式(JSON):
+    要求: {"CD": コマンドID, "PR": 送信元プロセス, "DT": データ種別, "DA": データのJSON文字列}
+    応答: {"CD": コマンドID, "RE": エラーコード, "DA": データのJSON文字列}
+メッセージは区切り文字なしで連続して送信できる
+"""
+
+import json
+import re
+
+# jsonタグ
+TAG_COMMAND = "CD"
+TAG_PROCESS = "PR"
+TAG_DATATYPE = "DT"
+TAG_DATA = "DA"
+TAG_REPLY = "RE"
+
+# データの種別
+DATA_TYPE_CMD = 0x00
+DATA_TYPE_PROGRAM = 0x01
+DATA_TYPE_CONNECT_CHECK = 0x02
+DATA_TYPE_OPERATION_GET = 0x03
+DATA_TYPE_METRICS = 0x04
+DATA_TYPE_TRACE = 0x05
+
+# メッセージの分割に使用する文字
+_NON_SPACE = re.compile(b"[^ \t\r\n]")
+_OPEN = re.compile(b"[{\\[]")
+_STRUCTURAL = re.compile(b'[{}\\[\\]"]')
+# 文字列の終わりの引用符またはエスケープ文字の直前まで
+_STRING_BODY = re.compile(b'[^"\\\\]*(?:\\\\.[^"\\\\]*)*', re.S)
+# 入れ子の無いオブジェクト(文字列の値のみを持つ要求など)
+_FLAT_OBJECT = re.compile(b'{(?:[^{}\\[\\]"\\\\]*"[^"\\\\]*(?:\\\\.[^"\\\\]*)*")*[^{}\\[\\]"]*}', re.S)
+_OPENERS = bytearray(b"{[")
+_QUOTE = ord('"')
+# 応答の先頭部分のキャッシュの最大件数 不正なコマンドIDで増え続けないようにする
+_REPLY_CACHE_MAX = 1024
+
+_encoder = json.JSONEncoder()
+# DAが空の応答
+_EMPTY_DATA = json.encoder.encode_basestring_ascii(_encoder.encode({}))
+# (コマンドID, エラーコード)ごとの応答の先頭部分とDAが空の応答
+_reply_prefixes = {}
+_empty_replies = {}
+
+
+def _to_bytes(text):
+    """
+    送信用のバイト列に変換 Python 2のstrはそのまま返す
+    """
+    if isinstance(text, bytes):
+        return text
+    return text.encode("utf-8")
+
+
+def encode_request(cmd_id, data=None, data_type=DATA_TYPE_CMD, process=0):
+    """
+    要求メッセージを作成
+
+    引数:
+        cmd_id: コマンドID
+        data: コマンド実行用データ ※省略時は空
+        data_type: データ種別
+        process: 送信元プロセス
+    戻り値:
+        message: 送信するバイト列
+    """
+    return _to_bytes(json.dumps({
+        TAG_COMMAND: cmd_id,
+        TAG_PROCESS: process,
+        TAG_DATATYPE: data_type,
+        TAG_DATA: json.dumps(data if data is not None else {})
+    }))
+
+
+def decode_request(message):
+    """
+    要求メッセージを解析
+
+    引数:
+        message: 受信したメッセージ
+    戻り値:
+        cmd_id: コマンドID
+        process: 送信元プロセス
+        data_type: データ種別
+        data: コマンド実行用データ
+    例外:
+        ValueError: JSONとして不正な場合、オブジェクトでない場合
+        KeyError: タグが不足している場合
+    """
+    envelope = json.loads(message)
+    if not isinstance(envelope, dict):
+        raise ValueError("message is not an object")
+    return (envelope[TAG_COMMAND], envelope[TAG_PROCESS], envelope[TAG_DATATYPE],
+            json.loads(envelope[TAG_DATA]))
+
+
+def encode_reply(cmd_id, error_code, data):
+    """
+    応答メッセージを作成
+
+    引数:
+        cmd_id: 実行したコマンドID
+        error_code: エラーコード
+        data: コマンド実行による出力
+    戻り値:
+        message: 送信するバイト列
+    """
+    key = (cmd_id, error_code)
+    try:
+        hash(key)
+    except TypeError:
+        # 不正な受信データのコマンドIDなど、ハッシュできない値はキャッシュしない
+        key = None
+    if isinstance(data, dict) and len(data) == 0:
+        # 動作コマンドの応答など、DAが空の応答は作成済みのものを返す
+        message = _empty_replies.get(key)
+        if message is None:
+            message = _to_bytes(_reply_prefix(cmd_id, error_code, key) + _EMPTY_DATA + "}")
+            _cache(_empty_replies, key, message)
+        return message
+    # DAはJSON文字列のため、データのJSONを文字列としてもう一度符号化する
+    body = json.encoder.encode_basestring_ascii(_encoder.encode(data))
+    return _to_bytes("%s%s}" % (_reply_prefix(cmd_id, error_code, key), body))
+
+
+def _reply_prefix(cmd_id, error_code, key):
+    """
+    応答のDAの値より前の部分を取得
+
+    引数:
+        cmd_id: コマンドID
+        error_code: エラーコード
+        key: キャッシュのキー キャッシュしない場合はNone
+    戻り値:
+        prefix: '{"CD": コマンドID, "RE": エラーコード, "DA": '
+    """
+    prefix = _reply_prefixes.get(key)
+    if prefix is None:
+        prefix = '{"%s": %s, "%s": %s, "%s": ' % (TAG_COMMAND, _encoder.encode(cmd_id),
+                                                TAG_REPLY, _encoder.encode(error_code), TAG_DATA)
+        _cache(_reply_prefixes, key, prefix)
+    return prefix
+
+
+def _cache(cache, key, value):
+    """
+    上限に達していなければキャッシュに追加する
+    """
+    if key is not None and len(cache) < _REPLY_CACHE_MAX:
+        cache[key] = value
+
+
+def decode_reply(envelope):
+    """
+    応答メッセージを解析
+
+    引数:
+        envelope: 応答メッセージ 文字列またはJSONを解析済みの辞書
+    戻り値:
+        cmd_id: コマンドID
+        error_code: エラーコード
+        data: コマンド実行による出力
+    """
+    if not isinstance(envelope, dict):
+        envelope = json.loads(envelope)
+    return envelope[TAG_COMMAND], envelope[TAG_REPLY], json.loads(envelope[TAG_DATA])
+
+
+class MessageSplitter(object):
+    """
+    受信したバイト列を区切り文字の無いメッセージごとに分割する
+    括弧の深さと文字列の内外を受信データの到着順に追跡するため、
+    受信済みのデータを再走査せず、受信データ全体に対して線形時間で分割できる
+    メッセージはJSONのオブジェクトまたは配列とし、メッセージ外の空白は読み飛ばす
+    それ以外のデータは次の括弧の直前までを1つのメッセージとして返す(復号時にエラーとなる)
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        # 次に走査する位置
+        self._pos = 0
+        # 受信途中のメッセージの開始位置 メッセージ外の場合はNone
+        self._start = None
+        # 括弧の深さ 0の場合はメッセージ外の不正なデータ
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data):
+        """
+        受信データを追加する
+
+        引数:
+            data: 受信したバイト列
+        戻り値:
+            messages: 受信が完了したメッセージのバイト列のリスト
+        """
+        buf = self._buf
+        buf.extend(data)
+        messages = []
+        length = len(buf)
+        pos = self._pos
+        while pos < length:
+            if self._start is None:
+                # メッセージの開始を探す
+                match = _NON_SPACE.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.start()
+                # 入れ子の無い要求は1回の照合で切り出す 受信途中の場合は1文字ずつ追跡する
+                match = _FLAT_OBJECT.match(buf, pos)
+                if match is not None:
+                    pos = match.end()
+                    messages.append(bytes(buf[match.start():pos]))
+                    continue
+                self._start = pos
+                if buf[pos] in _OPENERS:
+                    self._depth = 1
+                    pos += 1
+                else:
+                    self._depth = 0
+            elif self._depth == 0:
+                # 不正なデータは次のメッセージの開始までとする
+                match = _OPEN.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.start()
+                messages.append(bytes(buf[self._start:pos]))
+                self._start = None
+            elif self._in_string:
+                # エスケープを含む文字列の内容を読み飛ばす
+                pos = _STRING_BODY.match(buf, pos).end()
+                if pos >= length or buf[pos] != _QUOTE:
+                    # 文字列の途中、またはエスケープ文字で受信データが終わっている
+                    break
+                pos += 1
+                self._in_string = False
+            else:
+                match = _STRUCTURAL.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.end()
+                char = buf[match.start()]
+                if char == _QUOTE:
+                    self._in_string = True
+                elif char in _OPENERS:
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        messages.append(bytes(buf[self._start:pos]))
+                        self._start = None
+
+        # 分割済みのデータを破棄する
+        consumed = pos if self._start is None else self._start
+        if consumed > 0:
+            del buf[:consumed]
+            pos -= consumed
+            if self._start is not None:
+                self._start -= consumed
+        self._pos = pos
+        return messages
+
+    def pending(self):
+        """
+        受信途中のデータがあるかを判断
+        """
+        return self._start is not None
+
+    def take_pending(self):
+        """
+        受信途中のデータを取り出し、状態を初期化する
+
+        戻り値:
+            data: 受信途中のデータのバイト列
+        """
+        data = bytes(self._buf[self._start:]) if self._start is not None else b""
+        self.__init__()
+        return data
+
+
+def split(buf):
+    """
+    受信データを完全なメッセージごとに分割する
+
+    引数:
+        buf: 受信データ
+    戻り値:
+        messages: 完全なメッセージのリスト
+        rest: 末尾の受信途中のデータ
+    """
+    splitter = MessageSplitter()
+    messages = splitter.feed(buf)
+    return messages, splitter.take_pending()
+
+
+class MessageReader(object):
+    """
+    ソケットから受信したバイト列を解析済みのメッセージに変換する
+    """
+
+    def __init__(self):
+        self._splitter = MessageSplitter()
+
+    def feed(self, data):
+        """
+        受信データを追加する
+
+        引数:
+            data: 受信したバイト列
+        戻り値:
+            envelopes: 受信が完了したメッセージ(JSONを解析済みの辞書)のリスト
+        例外:
+            ValueError: JSONとして不正なメッセージを受信した場合
+        """
+        return [json.loads(message.decode("utf-8")) for message in self._splitter.feed(data)]
+
+    def pending(self):
+        """
+        受信途中のデータがあるかを判断
+        """
+        return self._splitter.pending()
@@ -31,12 +31,25 @@
 受信したコマンドを実行するモジュール
 """
 from fsrobo_r_io import FSRoboRIO
+from fsrobo_r_modal_state import FSRoboRModalState
+from fsrobo_r_ik_cache import FSRoboRIKCache
+from fsrobo_r_kinematics import FSRoboRKinematics
+from fsrobo_r_joint_spec import FSRoboRJointSpec
+from fsrobo_r_motion_estimator import FSRoboRMotionEstimator
+from fsrobo_r_pose_library import FSRoboRPoseLibrary
+import fsrobo_r_trace
+from fsrobo_r_trace import FSRoboRTracer
+import fsrobo_r_packed
+import fsrobo_r_trajectory
+import fsrobo_r_frame
+from fsrobo_r_cc_exec_program import FSRoboRCCExecProgram
 import rblib
 import CommandID
 import ErrorCode
 
 import traceback
 import threading
+import time
 import uuid
 
 class FSRoboRCCExecCommand(object):
@@ -47,6 +60,7 @@ class FSRoboRCCExecCommand(object):
     # クラス変数
     _MOTION_MODE_NORMAL = 0
     _MOTION_MODE_ROS = 1
+    _MOTION_MODE_PATH = 2
     _last_motion_mode = None
     _last_motion_commander_id = None
 
@@ -86,22 +100,79 @@ class FSRoboRCCExecCommand(object):
     _POSTURE_NONE = -1
     _POSTURE_DEFAULT = 7
 
+    # 座標情報のキー
+    _POSE_KEYS = ("X", "Y", "Z", "Rx", "Ry", "Rz")
+
     # マニピュレータの動作指定
     _RBCOORD_PTP = 0
     _RBCOORD_LINE = 1
 
+    # 相対移動の座標系
+    _FRAME_BASE = 0
+    _FRAME_TOOL = 1
+
+    # 経路動作の完了待ち
+    _PATH_WAIT_TRUE = 1
+
     # PTP動作時の速度制限
     _SPEED_LIMIT_MAX = 100
     _SPEED_LIMIT_MIN = 0
 
     _IK_SOLVER_OPTION_DEFAULT = 0x11111111
 
+    # スプライン補間の既定値
+    _SPLINE_DEGREE_DEFAULT = 3
+    _SPLINE_PERIOD_DEFAULT = 0.02                           # 秒
+
+    # 相対移動で記録済みの位置を使用する経過時間の上限(秒)
+    # ティーチングペンダントなどサーバー外での移動は検知できないため、短い間隔の連続した移動に限る
+    _POSITION_MAX_AGE = 1.0
+
+    # 経路確認の結果
+    _CHECK_UNREACHABLE = 1
+    _CHECK_JOINT_LIMIT = 2
+    _CHECK_POSTURE = 3
+
     # Neativeとの通信
     _RBLIB_HOST = "127.0.0.1"
     _RBLIB_PORT = 12345
 
+    # プログラム実行中も実行可能な読み込み専用コマンド
+    _READ_ONLY_COMMANDS = (
+        CommandID.JMARK,
+        CommandID.MARK,
+        CommandID.SYSSTS,
+        CommandID.GETIO,
+        CommandID.GETADC
+    )
+
+    # 観測セッションで実行可能なコマンド(値は処理関数名)
+    # 操作権が無くても状態を変更せず、短時間で終わるものに限る
+    _OBSERVER_COMMANDS = {
+        CommandID.JMARK: "_cmd_jmark",
+        CommandID.MARK: "_cmd_mark",
+        CommandID.GETPOSTURE: "_cmd_getposture",
+        CommandID.SYSSTS: "_cmd_syssts",
+        CommandID.GETIO: "_cmd_getio",
+        CommandID.GETADC: "_cmd_getadc",
+        CommandID.PROGRAM_HISTORY: "_cmd_program_history",
+        CommandID.CACHE_STATUS: "_cmd_cache_status",
+        CommandID.POSE_LIST: "_cmd_pose_list"
+    }
+
+    # 動作時間の見積もりに使用する速度プロファイルのモデル
+    _ESTIMATE_MODELS = {
+        CommandID.JMOVE_PTP: FSRoboRMotionEstimator.MODEL_PTP,
+        CommandID.MOVE_PTP: FSRoboRMotionEstimator.MODEL_PTP,
+        CommandID.JMOVE_LINE: FSRoboRMotionEstimator.MODEL_LINE,
+        CommandID.MOVE_LINE: FSRoboRMotionEstimator.MODEL_LINE
+    }
+
     # 共通クラス変数
     _posture = _POSTURE_DEFAULT
+    _program_running = False
+    _program_lock = threading.Lock()
+    _batch_lock = threading.Lock()
 
     def __init__(self, rblib_rob):
         """
@@ -109,6 +180,12 @@ class FSRoboRCCExecCommand(object):
         """
         self._p("FSRoboRCCExecCommand init")
         self._rblib = rblib_rob
+        self._modal = FSRoboRModalState.get_instance()
+        self._ik_cache = FSRoboRIKCache.get_instance()
+        self._kinematics = FSRoboRKinematics.get_instance()
+        self._estimator = FSRoboRMotionEstimator.get_instance()
+        self._pose_library = FSRoboRPoseLibrary.get_instance()
+        self._tracer = FSRoboRTracer.get_instance()
         print('thread id: {}'.format(threading.current_thread().ident))
         self._motion_commander_id = uuid.uuid1()
 
@@ -154,6 +231,30 @@ class FSRoboRCCExecCommand(object):
     def has_op_perm(self):
         return self._ope_permission
 
+    @classmethod
+    def begin_program(cls):
+        """
+        プログラム実行の開始を登録
+        実行中は全セッションで読み込み専用コマンド以外の操作コマンドを拒否する
+
+        戻り値:
+            True: 登録成功
+            False: 他のプログラムが実行中
+        """
+        with cls._program_lock:
+            if cls._program_running:
+                return False
+            cls._program_running = True
+            return True
+
+    @classmethod
+    def end_program(cls):
+        """
+        プログラム実行の終了を登録
+        """
+        with cls._program_lock:
+            cls._program_running = False
+
     def exec_command(self, command_id, exec_data, ret_data):
         """
         コマンドを実行する
@@ -172,11 +273,17 @@ class FSRoboRCCExecCommand(object):
             CommandID.SPEED_PTP: self._cmd_speed_ptp,
             CommandID.SPEED_LINE: self._cmd_speed_line,
             CommandID.QJMOVE_PTP: self._cmd_qjmove_ptp,
+            CommandID.QJMOVE_TRAJ: self._cmd_qjmove_traj,
+            CommandID.QJMOVE_SPLINE: self._cmd_qjmove_spline,
             CommandID.SETTOOL: self._cmd_settool,
             CommandID.SETBASE: self._cmd_setbase,
             CommandID.HOME: self._cmd_home,
             CommandID.JMOVE_LINE: self._cmd_jmove_line,
             CommandID.MOVE_LINE: self._cmd_move_line,
+            CommandID.MOVE_PATH: self._cmd_move_path,
+            CommandID.MOVE_PTP_REL: self._cmd_move_ptp_rel,
+            CommandID.MOVE_LINE_REL: self._cmd_move_line_rel,
+            CommandID.JMOVE_PTP_REL: self._cmd_jmove_ptp_rel,
             CommandID.SETPOSTURE: self._cmd_setposture,
             CommandID.GETPOSTURE: self._cmd_getposture,
             CommandID.MARK: self._cmd_mark,
@@ -186,25 +293,40 @@ class FSRoboRCCExecCommand(object):
 
         normal_commands = {
             CommandID.RTOJ: self._cmd_pos2joint,
+            CommandID.RTOJ_BATCH: self._cmd_pos2joint_batch,
+            CommandID.CHECK_PATH: self._cmd_check_path,
+            CommandID.ESTIMATE: self._cmd_estimate,
             CommandID.SYSSTS: self._cmd_syssts,
             CommandID.SETIO: self._cmd_setio,
             CommandID.GETIO: self._cmd_getio,
             CommandID.SETADC: self._cmd_setadc,
-            CommandID.GETADC: self._cmd_getadc
+            CommandID.GETADC: self._cmd_getadc,
+            CommandID.PROGRAM_HISTORY: self._cmd_program_history,
+            CommandID.CACHE_STATUS: self._cmd_cache_status,
+            CommandID.POSE_SET: self._cmd_pose_set,
+            CommandID.POSE_DELETE: self._cmd_pose_delete,
+            CommandID.POSE_LIST: self._cmd_pose_list
         }
 
         try:
             cmd = op_commands.get(command_id)
-            if cmd is not None:
+            if cmd is not None and FSRoboRCCExecCommand._program_running:
+                # プログラム実行中は操作権を持たないため、読み込み専用コマンドのみ実行する
+                if command_id in self._READ_ONLY_COMMANDS:
+                    error_code = self._run_command(cmd, exec_data, ret_data)
+                else:
+                    self._p("program is running")
+                    error_code = ErrorCode.PROGRAM_RUNNING_ERROR
+            elif cmd is not None:
                 if self.has_op_perm():
-                    error_code = cmd(exec_data, ret_data)
+                    error_code = self._run_command(cmd, exec_data, ret_data)
                 else:
                     self._p("operation is not permitted")
                     error_code = ErrorCode.OPERATION_NONE_ERROR
             else:
                 cmd = normal_commands.get(command_id)
                 if cmd is not None:
-                    error_code = cmd(exec_data, ret_data)
+                    error_code = self._run_command(cmd, exec_data, ret_data)
                 else:
                     self._p("cmdid error")
                     self._p("cmdid: {}", str(command_id))
@@ -218,6 +340,39 @@ class FSRoboRCCExecCommand(object):
         #self._p(ret_data)
         return error_code
 
+    def exec_observer_command(self, command_id, exec_data, ret_data):
+        """
+        観測セッションのコマンドを実行する
+        全観測セッションで1つのインスタンスを共有するため、読み込み専用のコマンドのみ実行する
+
+        引数：
+            command_id: 実行するコマンドID
+            exec_data: 実行時に使用するデータ
+            ret_data: 実行結果を返すための引数 ※参照変数
+        戻り値： 関数の実行結果
+        """
+        name = self._OBSERVER_COMMANDS.get(command_id)
+        if name is None:
+            self._p("command is not permitted for observer")
+            self._p("cmdid: {}", str(command_id))
+            return ErrorCode.OPERATION_NONE_ERROR
+
+        try:
+            error_code = self._run_command(getattr(self, name), exec_data, ret_data)
+        except Exception:
+            self._p("command execution error")
+            traceback.print_exc()
+            error_code = ErrorCode.DATA_ERROR
+        return error_code
+
+    def _run_command(self, cmd, exec_data, ret_data):
+        """
+        コマンドの処理関数を実行する
+        トレースが有効な場合は処理関数名で区間を記録する
+        """
+        with self._tracer.span(cmd.__name__, fsrobo_r_trace.CATEGORY_COMMAND):
+            return cmd(exec_data, ret_data)
+
     def _cmd_home(self, exec_data, ret_data):
         """
         マニピュレータを原点に戻す
@@ -233,6 +388,10 @@ class FSRoboRCCExecCommand(object):
         # 原点に戻す
         res = self._rblib.jntmove(0, 0, 0, 0, 0, 0, self._jnt_speed, self._acctime, self._dacctime)
         error_code = self._create_error_code(res)
+        if error_code == ErrorCode.SUCCESS:
+            self._estimator.set_position((0, 0, 0, 0, 0, 0), None)
+        else:
+            self._estimator.invalidate()
 
         return error_code
 
@@ -242,13 +401,26 @@ class FSRoboRCCExecCommand(object):
 
         引数：
             exec_data: コマンド実行用データ JSON形式
+                NAME: 登録済みのポーズ名 ※座標情報の代わりに指定可能
         戻り値:
             error_code: 関数の実行結果
         """
         self._p("_cmd_move_ptp execution")
         # asyncmをOFFに設定する
         self._set_normal_mode()
-        error_code = self._move_ptp(exec_data)
+        named = "NAME" in exec_data
+        if named:
+            # 登録済みのポーズは計算済みの軸情報に移動する
+            error_code, exec_data = self._resolve_joints(exec_data)
+            if error_code != ErrorCode.SUCCESS:
+                return error_code
+        start = self._estimator.position()
+        begin = time.time()
+        if named:
+            error_code = self._jmove_ptp(exec_data)
+        else:
+            error_code = self._move_ptp(exec_data)
+        self._record_motion(CommandID.MOVE_PTP, start, exec_data, time.time() - begin, error_code)
         # 実行結果を返す
         return error_code
 
@@ -258,29 +430,163 @@ class FSRoboRCCExecCommand(object):
 
         引数：
             exec_data: コマンド実行用データ JSON形式
+                NAME: 登録済みのポーズ名 ※座標情報の代わりに指定可能
         戻り値:
             error_code: 関数の実行結果
         """
         self._p("_cmd_move_line execution")
         # asyncmをOFFに設定する
         self._set_normal_mode()
+        exec_data = self._resolve_pose(exec_data)
+        start = self._estimator.position()
+        begin = time.time()
         error_code = self._move_line(exec_data)
+        self._record_motion(CommandID.MOVE_LINE, start, exec_data, time.time() - begin, error_code)
         # 実行結果を返す
         return error_code
 
+    def _cmd_move_ptp_rel(self, exec_data, ret_data):
+        """
+        現在位置からの相対移動量を指定してPTP動作でマニピュレータを操作する
+
+        引数：
+            exec_data: コマンド実行用データ JSON形式
+                DX, DY, DZ, DRx, DRy, DRz: 相対移動量 ※省略時は0
+                FR: 0: ベース座標系 1: ツール座標系 ※省略時は0
+                P: ロボットの姿勢情報 ※省略時は現在の値
+                SP, ATM, DTM: MOVE_PTPと同じ
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                X, Y, Z, Rx, Ry, Rz, P: 移動先の座標情報
+        戻り値:
+            error_code: 関数の実行結果
+        """
+        self._p("_cmd_move_ptp_rel execution")
+        # 移動中の位置を読まないように先に動作の完了を待つ
+        self._set_normal_mode()
+        res = self._current_pose()
+        if res[0] != True:
+            return self._create_error_code(res)
+        target = self._offset_pose(res[1:8], exec_data, ret_data)
+        return self._cmd_move_ptp(target, {})
+
+    def _cmd_move_line_rel(self, exec_data, ret_data):
+        """
+        現在位置からの相対移動量を指定して直線補間動作でマニピュレータを操作する
+
+        引数：
+            exec_data: コマンド実行用データ JSON形式
+                DX, DY, DZ, DRx, DRy, DRz: 相対移動量 ※省略時は0
+                FR: 0: ベース座標系 1: ツール座標系 ※省略時は0
+                P: ロボットの姿勢情報 ※省略時は現在の値
+                SP, ATM, DTM: MOVE_LINEと同じ
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                X, Y, Z, Rx, Ry, Rz, P: 移動先の座標情報
+        戻り値:
+            error_code: 関数の実行結果
+        """
+        self._p("_cmd_move_line_rel execution")
+        # 移動中の位置を読まないように先に動作の完了を待つ
+        self._set_normal_mode()
+        res = self._current_pose()
+        if res[0] != True:
+            return self._create_error_code(res)
+        target = self._offset_pose(res[1:8], exec_data, ret_data)
+        return self._cmd_move_line(target, {})
+
+    def _cmd_jmove_ptp_rel(self, exec_data, ret_data):
+        """
+        現在位置からの軸ごとの相対移動量を指定してPTP動作でマニピュレータを動かす
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                DJ1～DJ6: 軸ごとの相対移動量 ※省略時は0
+                SP, ATM, DTM: JMOVE_PTPと同じ
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                J1～J6: 移動先の軸情報
+        戻り値:
+            error_code: 関数の実行結果
+        """
+        self._p("_cmd_jmove_ptp_rel execution")
+        # 移動中の位置を読まないように先に動作の完了を待つ
+        self._set_normal_mode()
+        res = self._current_joints()
+        if res[0] != True:
+            return self._create_error_code(res)
+        target = dict((key, exec_data[key]) for key in ("SP", "ATM", "DTM") if key in exec_data)
+        for axis in range(1, 7):
+            key = "J{}".format(axis)
+            target[key] = res[axis] + exec_data.get("D" + key, 0)
+            ret_data[key] = target[key]
+        return self._cmd_jmove_ptp(target, {})
+
+    def _cmd_move_path(self, exec_data, ret_data):
+        """
+        複数の座標情報を通過する直線補間動作でマニピュレータを操作する
+        各点で停止せずにzoneの範囲で次の区間に移行する
+
+        引数：
+            exec_data: コマンド実行用データ JSON形式
+                WP: 通過点のリスト
+                    X, Y, Z, Rx, Ry, Rz: 座標情報
+                    P: ロボットの姿勢情報 ※省略時はクラスに設定されている値
+                    SP: 通過点までの速度 ※省略時は直線補間動作の速度
+                    ATM: 加速時間 ※省略時はクラスに設定されている値
+                    DTM: 減速時間 ※省略時はクラスに設定されている値
+                    ZN: 通過点のzone ※省略時は直前の値
+                    NAME: 登録済みのポーズ名 ※座標情報の代わりに指定可能
+                ZN: 最初の通過点のzone ※省略時はデフォルト値
+                WAIT: 1: 動作完了まで待つ 0: 全ての動作を登録した時点で戻る ※省略時は0
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                N: 登録した通過点の数
+        戻り値:
+            error_code: 関数の実行結果
+        """
+        self._p("_cmd_move_path execution")
+        waypoints = exec_data["WP"]
+        zone = exec_data.get("ZN", self._CMD_DEFAULT_ZONE)
+        self._set_path_mode(zone)
+
+        error_code = ErrorCode.SUCCESS
+        count = 0
+        for waypoint in waypoints:
+            if "ZN" in waypoint:
+                # 先読み中に変更するため移動完了は待たない
+                res = self._modal.apply(self._rblib, [(FSRoboRModalState.ZONE, waypoint["ZN"])])
+                error_code = self._create_error_code(res)
+                if error_code != ErrorCode.SUCCESS:
+                    break
+            error_code = self._move_line(self._resolve_pose(waypoint))
+            if error_code != ErrorCode.SUCCESS:
+                break
+            count += 1
+
+        if exec_data.get("WAIT", 0) == self._PATH_WAIT_TRUE and error_code == ErrorCode.SUCCESS:
+            res = self._rblib.joinm()
+            error_code = self._create_error_code(res)
+
+        ret_data["N"] = count
+        return error_code
+
     def _cmd_jmove_ptp(self, exec_data, ret_data):
         """
         軸情報を使用してPTP動作でマニピュレータを動かす
 
         引数:
             exec_data: コマンド実行用データ JSON形式
+                NAME: 登録済みのポーズ名 ※軸情報の代わりに指定可能
         戻り値:
             error_code: 関数の実行結果
         """
         self._p("_cmd_jmove_ptp execution")
         # asyncmをOFFに設定する
         self._set_normal_mode()
+        error_code, exec_data = self._resolve_joints(exec_data)
+        if error_code != ErrorCode.SUCCESS:
+            return error_code
+        start = self._estimator.position()
+        begin = time.time()
         error_code = self._jmove_ptp(exec_data)
+        self._record_motion(CommandID.JMOVE_PTP, start, exec_data, time.time() - begin, error_code)
 
         # 実行結果を返す
         return error_code
@@ -297,7 +603,10 @@ class FSRoboRCCExecCommand(object):
         self._p("_cmd_jmove_line execution")
         # asyncmをOFFに設定する
         self._set_normal_mode()
+        start = self._estimator.position()
+        begin = time.time()
         error_code = self._jmove_line(exec_data)
+        self._record_motion(CommandID.JMOVE_LINE, start, exec_data, time.time() - begin, error_code)
 
         # 実行結果を返す
         return error_code
@@ -317,6 +626,136 @@ class FSRoboRCCExecCommand(object):
         error_code = self._jmove_ptp(exec_data)
         return error_code
 
+    def _cmd_qjmove_traj(self, exec_data, ret_data):
+        """
+        軸情報の軌道を先読みのPTP動作でマニピュレータに送る
+        許容誤差を指定した場合は、軌道を間引いてから送る
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                JS: 軸情報のパックされた配列 型d 形状[N, 6]
+                TOL: 間引きの許容誤差(deg) 関節空間での距離 ※省略時は間引かない
+                SP: 速度 ※省略時はクラスに設定されている値
+                ATM: 加速時間 ※省略時はクラスに設定されている値
+                DTM: 減速時間 ※省略時はクラスに設定されている値
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                N: 送った点の数
+                RM: 間引いた点の数
+                DV: 間引いた点の最大の距離(deg)
+        戻り値:
+            error_code: 関数の実行結果
+        """
+        self._p("_cmd_qjmove_traj execution")
+        joints = self._unpack_points(exec_data["JS"])
+        indices, deviation = fsrobo_r_trajectory.simplify(joints, exec_data.get("TOL", 0.0))
+
+        # asyncmをONに設定する
+        self._set_ros_mode()
+        error_code = self._send_trajectory([joints[index] for index in indices], exec_data, ret_data)
+        ret_data["RM"] = len(joints) - len(indices)
+        ret_data["DV"] = deviation
+        return error_code
+
+    def _cmd_qjmove_spline(self, exec_data, ret_data):
+        """
+        軸情報のノットをスプライン補間し、先読みのPTP動作でマニピュレータに送る
+        補間した点の速度はSPから求めた軸の速度制限内に収める
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                JS: ノットの軸情報のパックされた配列 型d 形状[K, 6] K>=2
+                TM: 各ノットの時刻(秒)のリスト 単調増加
+                DG: 3: 3次スプライン 5: 5次スプライン ※省略時は3
+                DT: サンプリング周期(秒) ※省略時は0.02
+                SP: 速度 ※省略時はクラスに設定されている値
+                ATM: 加速時間 ※省略時はクラスに設定されている値
+                DTM: 減速時間 ※省略時はクラスに設定されている値
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                N: 送った点の数
+                SC: 速度制限のための時間の引き伸ばし率
+                LS: 軸の最大速度の取得元 FILE: 軸の仕様のファイル DEFAULT: 標準設定
+        戻り値:
+            error_code: 関数の実行結果
+        """
+        self._p("_cmd_qjmove_spline execution")
+        if not fsrobo_r_trajectory.spline_available():
+            self._p("numpy is not available")
+            return ErrorCode.PROCESS_ERROR
+
+        knots = self._unpack_points(exec_data["JS"])
+        limits = self._joint_speed_limits(exec_data.get("SP", self._jnt_speed))
+        samples, scale = fsrobo_r_trajectory.spline(knots, exec_data["TM"],
+                                                    exec_data.get("DT", self._SPLINE_PERIOD_DEFAULT),
+                                                    exec_data.get("DG", self._SPLINE_DEGREE_DEFAULT), limits)
+
+        # asyncmをONに設定する
+        self._set_ros_mode()
+        error_code = self._send_trajectory(samples, exec_data, ret_data)
+        ret_data["SC"] = scale
+        ret_data["LS"] = FSRoboRJointSpec.get_instance().source()
+        return error_code
+
+    def _cmd_estimate(self, exec_data, ret_data):
+        """
+        動作コマンドの実行時間を見積もる
+        最初の動作は開始位置から、以降の動作は直前の動作の目標位置から開始するものとする
+        開始位置の指定が無く、同期動作で移動した位置も記録されていない場合のみ現在位置を取得する
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                ST: 開始位置 J1～J6 または X, Y, Z, Rx, Ry, Rz, P または NAME ※省略時は現在位置
+                MV: 見積もる動作のリスト
+                    CMD: コマンドID(JMOVE_PTP, MOVE_PTP, JMOVE_LINE, MOVE_LINE)
+                    J1～J6 または X, Y, Z, Rx, Ry, Rz, P または NAME: 各コマンドと同じ目標位置
+                    SP, ATM, DTM: 各コマンドと同じ速度、加速時間、減速時間
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                T: 動作ごとの見積もり時間(秒)のリスト
+                TT: 見積もり時間の合計(秒)
+                CAL: 補正の状態 PTP: PTP動作 LINE: 直線補間動作
+                    R: 補正比率(計測値/計算値)
+                    N: 補正に使用した計測数
+                    C: 1: 補正済み 0: 未補正(見積もりは軸の仕様の値のみに基づく)
+                LS: PTP動作の見積もりに使用した軸の最大速度の取得元 FILE: 軸の仕様のファイル DEFAULT: 標準設定
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_estimate execution")
+        if "ST" in exec_data:
+            joints, pose = self._motion_target(self._resolve_pose(exec_data["ST"]))
+        else:
+            joints, pose = self._estimator.position()
+            if joints is None and pose is None:
+                # 座標情報は必要になった場合に軸情報から求める
+                res = self._rblib.jmark()
+                if res[0] != True:
+                    return self._create_error_code(res)
+                joints = tuple(res[1:7])
+
+        times = []
+        for move in exec_data["MV"]:
+            model = self._ESTIMATE_MODELS[move["CMD"]]
+            move = self._resolve_pose(move)
+            target_joints, target_pose = self._motion_target(move)
+            if model == FSRoboRMotionEstimator.MODEL_PTP:
+                if target_joints is None:
+                    target_joints = self._pose_to_joints(target_pose)
+                if joints is None:
+                    joints = self._pose_to_joints(pose)
+                motion_time = self._motion_time(model, joints, target_joints, move)
+            else:
+                if target_pose is None:
+                    target_pose = self._joints_to_pose(target_joints)
+                if pose is None:
+                    pose = self._joints_to_pose(joints)
+                motion_time = self._motion_time(model, pose, target_pose, move)
+            times.append(self._estimator.estimate(model, motion_time))
+            joints, pose = target_joints, target_pose
+
+        ret_data["T"] = times
+        ret_data["TT"] = sum(times)
+        ret_data["CAL"] = self._estimator.stats()
+        ret_data["LS"] = FSRoboRJointSpec.get_instance().source()
+        return ErrorCode.SUCCESS
+
     def _cmd_speed_ptp(self, exec_data, ret_data):
         """
         PTP動作時のスピードを設定
@@ -388,7 +827,7 @@ class FSRoboRCCExecCommand(object):
             posture = FSRoboRCCExecCommand._posture
 
         error_code = ErrorCode.SUCCESS
-        res = self._rblib.r2j_mt(data_x, data_y, data_z, data_rz, data_ry, data_rx, posture, self._RBCOORD_LINE, self._CC_NOT_USE, self._IK_SOLVER_OPTION_DEFAULT)
+        res = self._pos2joint(data_x, data_y, data_z, data_rz, data_ry, data_rx, posture)
         if res[0] == True:
             ret_data["J1"] = res[1]
             ret_data["J2"] = res[2]
@@ -402,6 +841,117 @@ class FSRoboRCCExecCommand(object):
 
         return error_code
 
+    def _cmd_pos2joint_batch(self, exec_data, ret_data):
+        """
+        複数の座標情報をまとめて軸情報に変換
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                PS: 座標情報のパックされた配列 型d 形状[N, 6] 列はX, Y, Z, Rx, Ry, Rz
+                P: 姿勢情報 ※省略時はクラスに設定されている値
+                    数値の場合は全座標で共通、パックされた配列(型i 形状[N])の場合は座標ごと
+                    -1の場合はクラスに設定されている値を使用
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                JS: 軸情報のパックされた配列 型d 形状[N, 6] 変換に失敗した行は0
+                EC: 座標ごとのエラーコードのパックされた配列 型i 形状[N]
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_pos2joint_batch execution")
+        poses = self._unpack_points(exec_data["PS"])
+        postures = self._unpack_postures(exec_data, len(poses))
+
+        joints = []
+        error_codes = []
+        # 他のバッチと交互に実行されないよう、まとめてrblibを呼び出す
+        # 同じ座標が複数含まれる場合は1回だけ変換する
+        results = {}
+        with FSRoboRCCExecCommand._batch_lock:
+            for (x, y, z, rx, ry, rz), posture in zip(poses, postures):
+                request = (x, y, z, rx, ry, rz, posture)
+                res = results.get(request)
+                if res is None:
+                    res = self._pos2joint(x, y, z, rz, ry, rx, posture)
+                    results[request] = res
+                if res[0] == True:
+                    joints.append(res[1:7])
+                    error_codes.append(ErrorCode.SUCCESS)
+                else:
+                    joints.append((0.0,) * 6)
+                    error_codes.append(self._create_error_code(res))
+
+        ret_data["JS"] = fsrobo_r_packed.encode("d", *fsrobo_r_packed.pack_rows("d", joints, 6))
+        ret_data["EC"] = fsrobo_r_packed.encode("i", *fsrobo_r_packed.pack_values("i", error_codes))
+        return ErrorCode.SUCCESS
+
+    def _cmd_check_path(self, exec_data, ret_data):
+        """
+        動作開始前に経路全体が実行可能かを確認
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                PS: 座標情報のパックされた配列 型d 形状[N, 6] 列はX, Y, Z, Rx, Ry, Rz
+                JS: 軸情報のパックされた配列 型d 形状[N, 6] ※PSを省略した場合に使用
+                P: 姿勢情報 ※PS使用時のみ RTOJ_BATCHと同じ形式
+                MD: 0: PTP動作 1: 直線補間動作(姿勢情報の変化を不可とする) ※省略時は1
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                N: 確認した点数
+                NG: 実行できない点のリスト
+                    I: インデックス
+                    R: 理由 1: 逆運動学の解なし 2: 軸の可動範囲外 3: 姿勢情報の変化
+                LS: 可動範囲の取得元 FILE: 軸の仕様のファイル DEFAULT: 標準設定
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_check_path execution")
+        line = exec_data.get("MD", self._RBCOORD_LINE) == self._RBCOORD_LINE
+        tool = self._modal.active_tool()
+
+        failures = {}
+        # 共有のrblibを他のバッチと交互に使用しないよう、まとめて呼び出す
+        with FSRoboRCCExecCommand._batch_lock:
+            if "PS" in exec_data:
+                # 逆運動学は指定された姿勢情報の解を求めるため、姿勢情報は入力値を比較する
+                poses = self._unpack_points(exec_data["PS"])
+                postures = self._unpack_postures(exec_data, len(poses))
+                joints = []
+                for index, ((x, y, z, rx, ry, rz), posture) in enumerate(zip(poses, postures)):
+                    res = self._pos2joint(x, y, z, rz, ry, rx, posture)
+                    if res[0] == True:
+                        joints.append(res[1:7])
+                    else:
+                        joints.append(None)
+                        failures[index] = self._CHECK_UNREACHABLE
+            else:
+                # 姿勢情報は順運動学で求める
+                joints = self._unpack_points(exec_data["JS"])
+                postures = []
+                for index, res in enumerate(self._kinematics.joint2pos_batch(self._rblib, joints, tool)):
+                    if res[0] == True:
+                        postures.append(res[7])
+                    else:
+                        postures.append(None)
+                        failures[index] = self._CHECK_UNREACHABLE
+
+        joint_spec = FSRoboRJointSpec.get_instance()
+        for index, joint in enumerate(joints):
+            if index in failures:
+                continue
+            for value, (lower, upper) in zip(joint, joint_spec.limits()):
+                if value < lower or value > upper:
+                    failures[index] = self._CHECK_JOINT_LIMIT
+                    break
+
+        if line:
+            # 直線補間では途中で姿勢情報を変更できない
+            for index in range(1, len(postures)):
+                if index not in failures and postures[index - 1] is not None \
+                        and postures[index] is not None and postures[index] != postures[index - 1]:
+                    failures[index] = self._CHECK_POSTURE
+
+        ret_data["N"] = len(joints)
+        ret_data["NG"] = [{"I": index, "R": failures[index]} for index in sorted(failures)]
+        ret_data["LS"] = joint_spec.source()
+        return ErrorCode.SUCCESS
+
     def _cmd_settool(self, exec_data, ret_data):
         """
         ツールオフセットを設定
@@ -425,21 +975,28 @@ class FSRoboRCCExecCommand(object):
         data_rz = exec_data["Rz"]
 
         # ツールオフセット変更前にツールオフセットをリセットする
-        ct_res = self._rblib.changetool(self._SETTOOL_ID_NOT_USE)
+        ct_res = self._modal.apply(self._rblib, [(FSRoboRModalState.TOOL, self._SETTOOL_ID_NOT_USE)])
         ct_error_code = self._create_error_code(ct_res)
         if ct_error_code != ErrorCode.SUCCESS:
             return ct_error_code
 
+        # ツールオフセットが変わるため逆運動学のキャッシュと記録した座標情報を破棄
+        self._ik_cache.clear()
+        self._estimator.set_position(self._estimator.position()[0], None)
         st_res = self._rblib.settool(self._SETTOOL_ID_USE, data_x, data_y, data_z, data_rz, data_ry, data_rx)
 
         st_error_code = self._create_error_code(st_res)
-        if st_error_code != ErrorCode.SUCCESS:
+        if st_error_code == ErrorCode.SUCCESS:
+            self._modal.record(FSRoboRModalState.TOOL_OFFSET,
+                               (self._SETTOOL_ID_USE, data_x, data_y, data_z, data_rz, data_ry, data_rx))
+        else:
             # エラーコードが返された場合
             # エラー発生前のツールオフセットの設定に戻す
-            self._rblib.changetool(self._usingtool)
+            self._modal.record(FSRoboRModalState.TOOL_OFFSET, None)
+            self._modal.apply(self._rblib, [(FSRoboRModalState.TOOL, self._usingtool)])
             return st_error_code
 
-        self._rblib.changetool(self._SETTOOL_ID_USE)
+        self._modal.apply(self._rblib, [(FSRoboRModalState.TOOL, self._SETTOOL_ID_USE)])
 
         # 現在の使用しているツールIDを更新
         self._usingtool = self._SETTOOL_ID_USE
@@ -651,6 +1208,7 @@ class FSRoboRCCExecCommand(object):
 
         error_code = ErrorCode.SUCCESS
         res = self._rblib.abortm()
+        self._estimator.invalidate()
         if res[0] == True:
             ret_data["ID"] = res[1]
         
@@ -680,6 +1238,127 @@ class FSRoboRCCExecCommand(object):
 
         return error_code
 
+    def _cmd_program_history(self, exec_data, ret_data):
+        """
+        プログラムの実行履歴を取得
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                N: 取得する最大件数 ※省略時は全件
+                SORT: 降順に並び替える項目(WALL, SETUP, RUN, WAIT, CPU, RSS, CALLS) ※省略時は新しい順
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                HIST: 実行履歴のリスト
+                    PATH: プログラムのパス
+                    ST: 開始時刻
+                    WALL: 全体の所要時間
+                    SETUP: 実行前の初期化時間
+                    RUN: プログラムの実行時間
+                    WAIT: 実行後の待機時間
+                    CPU: 子プロセスのCPU時間(CPU_U: ユーザー, CPU_S: システム)
+                    RSS: 子プロセスの最大常駐メモリ(KB)
+                    CALLS: rblibの呼び出し回数 ※計測できない場合はnull
+                    EXIT: 終了コード
+                    RE: エラーコード
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_program_history execution")
+        count = exec_data.get("N")
+        sort_key = exec_data.get("SORT")
+        if sort_key is not None and sort_key not in FSRoboRCCExecProgram.HISTORY_SORT_KEYS:
+            self._p("sort key error")
+            return ErrorCode.DATA_ERROR
+
+        ret_data["HIST"] = FSRoboRCCExecProgram.get_history(count, sort_key)
+        return ErrorCode.SUCCESS
+
+    def _cmd_cache_status(self, exec_data, ret_data):
+        """
+        キャッシュの統計情報を取得
+
+        引数:
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                IK: 逆運動学キャッシュの統計情報
+                    HIT: ヒット数
+                    MISS: ミス数
+                    SIZE: 保持件数
+                    CAP: 最大保持件数
+                    CLEAR: 破棄回数
+                FK: 順運動学の統計情報
+                    STATE: 状態(UNAVAILABLE, VERIFYING, TRUSTED, DISABLED)
+                    LOCAL: サーバー内で計算した回数
+                    NATIVE: j2r_mtを使用した回数
+                    MISMATCH: 照合で不一致となった回数
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_cache_status execution")
+        ret_data["IK"] = self._ik_cache.stats()
+        ret_data["FK"] = self._kinematics.stats()
+        return ErrorCode.SUCCESS
+
+    def _cmd_pose_set(self, exec_data, ret_data):
+        """
+        ポーズを登録または更新
+        使用中のツールオフセットと姿勢情報での軸情報を計算しておく
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                NAME: ポーズ名
+                X, Y, Z, Rx, Ry, Rz: 座標情報 ※省略時は現在位置
+                P: ロボットの姿勢情報 ※省略時は使用時にクラスに設定されている値
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                J: 計算した軸情報のリスト 逆運動学の解が無い場合はNone
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_pose_set execution")
+        name = exec_data["NAME"]
+        if "X" in exec_data:
+            pose = dict((key, exec_data[key]) for key in self._POSE_KEYS)
+            pose["P"] = exec_data.get("P", self._POSTURE_NONE)
+        else:
+            res = self._rblib.mark()
+            if res[0] != True:
+                return self._create_error_code(res)
+            pose = {"X": res[1], "Y": res[2], "Z": res[3], "Rz": res[4], "Ry": res[5], "Rx": res[6],
+                    "P": exec_data.get("P", res[7])}
+        self._pose_library.set(name, pose)
+
+        ret_data["J"] = None
+        tool = self._modal.active_tool()
+        target = self._motion_target(pose)[1]
+        res = self._pos2joint(*target)
+        if res[0] == True:
+            ret_data["J"] = list(res[1:7])
+            if tool is not None:
+                self._pose_library.store_joints(name, tool, target[6], res[1:7], save=True)
+        return ErrorCode.SUCCESS
+
+    def _cmd_pose_delete(self, exec_data, ret_data):
+        """
+        ポーズを削除
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                NAME: ポーズ名
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_pose_delete execution")
+        if not self._pose_library.delete(exec_data["NAME"]):
+            self._p("pose is not registered")
+            return ErrorCode.DATA_ERROR
+        return ErrorCode.SUCCESS
+
+    def _cmd_pose_list(self, exec_data, ret_data):
+        """
+        登録済みのポーズを取得
+
+        引数:
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                POSES: ポーズ名ごとの座標情報(X, Y, Z, Rx, Ry, Rz, P)
+        戻り値: 関数の実行結果
+        """
+        self._p("_cmd_pose_list execution")
+        ret_data["POSES"] = self._pose_library.poses()
+        return ErrorCode.SUCCESS
 
     def _reset_default_params(self):
         """
@@ -693,19 +1372,22 @@ class FSRoboRCCExecCommand(object):
         self._acctime = self._CMD_DEFAULT_ACCT
         self._usingtool = self._SETTOOL_ID_NOT_USE
         # Neativeの状態を初期化
-        # 移動が終わるまで待機
-        self._rblib.joinm()
-        self._rblib.changetool(self._SETTOOL_ID_NOT_USE)
+        # 変更がある場合のみ移動が終わるまで待機して設定する
         # 初期ではasyncmはOFFに設定する
-        self._rblib.asyncm(self._ASYNCM_OFF)
-        self._rblib.passm(self._CMD_DEFAULT_PASS)
-        self._rblib.overlap(self._CMD_DEFAULT_OVERLAP)
-        self._rblib.zone(self._CMD_DEFAULT_ZONE)
-        self._rblib.disable_mdo(self._MDO_ALL)
+        self._modal.apply(self._rblib, [
+            (FSRoboRModalState.TOOL, self._SETTOOL_ID_NOT_USE),
+            (FSRoboRModalState.ASYNCM, self._ASYNCM_OFF),
+            (FSRoboRModalState.PASSM, self._CMD_DEFAULT_PASS),
+            (FSRoboRModalState.OVERLAP, self._CMD_DEFAULT_OVERLAP),
+            (FSRoboRModalState.ZONE, self._CMD_DEFAULT_ZONE),
+            (FSRoboRModalState.MDO, self._MDO_ALL)
+        ], join=True)
 
         FSRoboRCCExecCommand._posture = self._POSTURE_DEFAULT
 
     def _set_ros_mode(self):
+        # 先読み動作の移動先は記録しない
+        self._estimator.invalidate()
         current_id = self._motion_commander_id
         print('current_id: {}'.format(current_id))
         if FSRoboRCCExecCommand._last_motion_mode != FSRoboRCCExecCommand._MOTION_MODE_ROS \
@@ -713,14 +1395,15 @@ class FSRoboRCCExecCommand(object):
             FSRoboRCCExecCommand._last_motion_mode = FSRoboRCCExecCommand._MOTION_MODE_ROS
             FSRoboRCCExecCommand._last_motion_commander_id = current_id
             print('set ROS mode')
-            self._rblib.joinm()
             self._acctime = 0
             self._dacctime = 0
-            self._rblib.passm(self._PASSM_ON)
-            self._rblib.asyncm(self._ASYNCM_ON)
-            self._rblib.overlap(self._CMD_DEFAULT_OVERLAP)
-            self._rblib.zone(self._CMD_DEFAULT_ZONE)
-            self._rblib.disable_mdo(self._MDO_ALL)
+            self._modal.apply(self._rblib, [
+                (FSRoboRModalState.PASSM, self._PASSM_ON),
+                (FSRoboRModalState.ASYNCM, self._ASYNCM_ON),
+                (FSRoboRModalState.OVERLAP, self._CMD_DEFAULT_OVERLAP),
+                (FSRoboRModalState.ZONE, self._CMD_DEFAULT_ZONE),
+                (FSRoboRModalState.MDO, self._MDO_ALL)
+            ], join=True)
 
     def _set_normal_mode(self):
         current_id = self._motion_commander_id
@@ -730,14 +1413,336 @@ class FSRoboRCCExecCommand(object):
             FSRoboRCCExecCommand._last_motion_mode = FSRoboRCCExecCommand._MOTION_MODE_NORMAL
             FSRoboRCCExecCommand._last_motion_commander_id = current_id
             print('set Normal mode')
-            self._rblib.joinm()
             self._dacctime = self._CMD_DEFAULT_DACCT
             self._acctime = self._CMD_DEFAULT_ACCT
-            self._rblib.passm(self._PASSM_OFF)
-            self._rblib.asyncm(self._ASYNCM_OFF)
-            self._rblib.overlap(self._CMD_DEFAULT_OVERLAP)
-            self._rblib.zone(self._CMD_DEFAULT_ZONE)
-            self._rblib.disable_mdo(self._MDO_ALL)
+            self._modal.apply(self._rblib, [
+                (FSRoboRModalState.PASSM, self._PASSM_OFF),
+                (FSRoboRModalState.ASYNCM, self._ASYNCM_OFF),
+                (FSRoboRModalState.OVERLAP, self._CMD_DEFAULT_OVERLAP),
+                (FSRoboRModalState.ZONE, self._CMD_DEFAULT_ZONE),
+                (FSRoboRModalState.MDO, self._MDO_ALL)
+            ], join=True)
+
+    def _set_path_mode(self, zone):
+        """
+        経路動作用にpassmとasyncmをONに設定する
+        経路動作中の場合は動作を待たずにzoneのみ設定する
+
+        引数:
+            zone: 最初の通過点のzone
+        """
+        self._estimator.invalidate()
+        current_id = self._motion_commander_id
+        join = FSRoboRCCExecCommand._last_motion_mode != FSRoboRCCExecCommand._MOTION_MODE_PATH \
+            or FSRoboRCCExecCommand._last_motion_commander_id != current_id
+        FSRoboRCCExecCommand._last_motion_mode = FSRoboRCCExecCommand._MOTION_MODE_PATH
+        FSRoboRCCExecCommand._last_motion_commander_id = current_id
+        if join:
+            print('set Path mode')
+            self._dacctime = self._CMD_DEFAULT_DACCT
+            self._acctime = self._CMD_DEFAULT_ACCT
+        self._modal.apply(self._rblib, [
+            (FSRoboRModalState.PASSM, self._PASSM_ON),
+            (FSRoboRModalState.ASYNCM, self._ASYNCM_ON),
+            (FSRoboRModalState.OVERLAP, self._CMD_DEFAULT_OVERLAP),
+            (FSRoboRModalState.ZONE, zone),
+            (FSRoboRModalState.MDO, self._MDO_ALL)
+        ], join=join)
+
+    def _joint_speed_limits(self, speed):
+        """
+        PTP動作の速度から軸ごとの最高速度を求める
+
+        引数:
+            speed: PTP動作の速度(%)
+        戻り値:
+            limits: 軸ごとの最高速度(deg/s)のリスト
+        """
+        return FSRoboRJointSpec.get_instance().speed_limits(speed)
+
+    def _motion_target(self, exec_data):
+        """
+        動作コマンドの目標位置を取得
+
+        引数:
+            exec_data: 動作コマンドの実行用データ JSON形式
+        戻り値:
+            joints: 軸情報 座標情報で指定された場合はNone
+            pose: 座標情報(X, Y, Z, Rz, Ry, Rx, 姿勢情報) 軸情報で指定された場合はNone
+        """
+        if "J1" in exec_data:
+            return (exec_data["J1"], exec_data["J2"], exec_data["J3"],
+                    exec_data["J4"], exec_data["J5"], exec_data["J6"]), None
+        posture = exec_data.get("P", self._POSTURE_NONE)
+        if posture == self._POSTURE_NONE:
+            posture = FSRoboRCCExecCommand._posture
+        return None, (exec_data["X"], exec_data["Y"], exec_data["Z"],
+                      exec_data["Rz"], exec_data["Ry"], exec_data["Rx"], posture)
+
+    def _current_pose(self):
+        """
+        現在位置の座標情報を取得
+        同期動作で移動した位置が直前に記録されている場合はrblibを呼び出さない
+
+        戻り値:
+            res: markと同じ形式の結果
+        """
+        pose = self._estimator.position(self._POSITION_MAX_AGE)[1]
+        if pose is not None:
+            return (True,) + tuple(pose)
+        return self._rblib.mark()
+
+    def _current_joints(self):
+        """
+        現在位置の軸情報を取得
+        同期動作で移動した位置が直前に記録されている場合はrblibを呼び出さない
+
+        戻り値:
+            res: jmarkと同じ形式の結果
+        """
+        joints = self._estimator.position(self._POSITION_MAX_AGE)[0]
+        if joints is not None:
+            return (True,) + tuple(joints)
+        return self._rblib.jmark()
+
+    def _offset_pose(self, pose, exec_data, ret_data):
+        """
+        座標情報に相対移動量を加えた動作コマンドの実行用データを作成する
+
+        引数:
+            pose: 現在の座標情報(X, Y, Z, Rz, Ry, Rx, 姿勢情報)
+            exec_data: 相対移動コマンドの実行用データ JSON形式
+            ret_data: 移動先の座標情報を返す変数 JSON形式 ※参照変数
+        戻り値:
+            exec_data: 移動先の座標情報を指定した実行用データ
+        """
+        offset = tuple(exec_data.get(key, 0) for key in ("DX", "DY", "DZ", "DRz", "DRy", "DRx"))
+        tool_frame = exec_data.get("FR", self._FRAME_BASE) == self._FRAME_TOOL
+        x, y, z, rz, ry, rx = fsrobo_r_frame.offset_pose(pose[:6], offset, tool_frame)
+        moved = {"X": x, "Y": y, "Z": z, "Rz": rz, "Ry": ry, "Rx": rx, "P": exec_data.get("P", pose[6])}
+        ret_data.update(moved)
+        target = dict((key, exec_data[key]) for key in ("SP", "ATM", "DTM") if key in exec_data)
+        target.update(moved)
+        return target
+
+    def _resolve_pose(self, exec_data):
+        """
+        NAMEで指定されたポーズの座標情報を実行用データに展開する
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                NAME: 登録済みのポーズ名
+        戻り値:
+            exec_data: 座標情報を展開した実行用データ 指定された値はポーズより優先する
+        """
+        if "NAME" not in exec_data:
+            return exec_data
+        pose = self._pose_library.get(exec_data["NAME"])
+        if pose is None:
+            raise KeyError("pose is not registered: {}".format(exec_data["NAME"]))
+        pose.update(exec_data)
+        return pose
+
+    def _resolve_joints(self, exec_data):
+        """
+        NAMEで指定されたポーズの軸情報を実行用データに展開する
+        使用中のツールオフセットと姿勢情報での軸情報が無い場合は計算して保持する
+        座標情報が指定された場合はポーズと異なる位置のため、保持している軸情報を使用せず、保持もしない
+        多回転情報が指定された場合は指定された解を求めるため、保持している軸情報を使用せず、保持もしない
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                NAME: 登録済みのポーズ名
+                CC: ロボットの多回転情報 ※省略可
+        戻り値:
+            error_code: 関数の実行結果 逆運動学の解が無い場合はrblibのエラー
+            exec_data: 軸情報(J1～J6)を展開した実行用データ
+        """
+        if "NAME" not in exec_data:
+            return ErrorCode.SUCCESS, exec_data
+        name = exec_data["NAME"]
+        resolved = self._resolve_pose(exec_data)
+        pose = self._motion_target(resolved)[1]
+        cc = int(exec_data.get("CC", "FF000000"), 16)
+        tool = self._modal.active_tool()
+        if cc != self._CC_NOT_USE or any(key in exec_data for key in self._POSE_KEYS):
+            tool = None
+        joints = None
+        if tool is not None:
+            joints = self._pose_library.joints(name, tool, pose[6])
+        if joints is None:
+            res = self._pos2joint(*pose, cc=cc)
+            if res[0] != True:
+                return self._create_error_code(res), resolved
+            joints = tuple(res[1:7])
+            if tool is not None:
+                self._pose_library.store_joints(name, tool, pose[6], joints)
+        resolved.update(zip(("J1", "J2", "J3", "J4", "J5", "J6"), joints))
+        return ErrorCode.SUCCESS, resolved
+
+    def _pose_to_joints(self, pose):
+        """
+        座標情報を軸情報に変換する
+
+        引数:
+            pose: 座標情報(X, Y, Z, Rz, Ry, Rx, 姿勢情報)
+        戻り値:
+            joints: 軸情報
+        """
+        res = self._pos2joint(*pose)
+        if res[0] != True:
+            raise ValueError("target is unreachable")
+        return tuple(res[1:7])
+
+    def _joints_to_pose(self, joints):
+        """
+        軸情報を座標情報に変換する
+
+        引数:
+            joints: 軸情報
+        戻り値:
+            pose: 座標情報(X, Y, Z, Rz, Ry, Rx, 姿勢情報)
+        """
+        res = self._kinematics.joint2pos(self._rblib, joints, self._modal.active_tool())
+        if res[0] != True:
+            raise ValueError("joints cannot be converted")
+        return tuple(res[1:8])
+
+    def _motion_time(self, model, start, target, exec_data):
+        """
+        補正前の動作時間を計算する
+
+        引数:
+            model: 速度プロファイルのモデル
+            start: 開始位置 PTP動作は軸情報、直線補間動作は座標情報
+            target: 目標位置 PTP動作は軸情報、直線補間動作は座標情報
+            exec_data: 動作コマンドの実行用データ JSON形式
+        戻り値:
+            time: 動作時間(秒)
+        """
+        acctime = exec_data.get("ATM", self._acctime)
+        dacctime = exec_data.get("DTM", self._dacctime)
+        if model == FSRoboRMotionEstimator.MODEL_PTP:
+            limits = self._joint_speed_limits(exec_data.get("SP", self._jnt_speed))
+            return self._estimator.ptp_time(start, target, limits, acctime, dacctime)
+        return self._estimator.line_time(start, target, exec_data.get("SP", self._lin_speed), acctime, dacctime)
+
+    def _record_motion(self, command_id, start, exec_data, elapsed, error_code):
+        """
+        同期動作の計測結果で動作時間の見積もりを補正し、移動後の位置を記録する
+        変換のためのrblib呼び出しを避けるため、開始位置と目標位置が同じ形式の場合のみ補正する
+
+        引数:
+            command_id: 実行した動作コマンドのID
+            start: 動作前に記録されていた位置(軸情報, 座標情報)
+            exec_data: 動作コマンドの実行用データ JSON形式
+            elapsed: 計測した動作時間(秒)
+            error_code: 動作コマンドの実行結果
+        """
+        if error_code != ErrorCode.SUCCESS:
+            self._estimator.invalidate()
+            return
+        joints, pose = self._motion_target(exec_data)
+        model = self._ESTIMATE_MODELS[command_id]
+        if model == FSRoboRMotionEstimator.MODEL_PTP and start[0] is not None and joints is not None:
+            self._estimator.calibrate(model, self._motion_time(model, start[0], joints, exec_data), elapsed)
+        elif model == FSRoboRMotionEstimator.MODEL_LINE and start[1] is not None and pose is not None:
+            self._estimator.calibrate(model, self._motion_time(model, start[1], pose, exec_data), elapsed)
+        self._estimator.set_position(joints, pose)
+
+    def _send_trajectory(self, joints, exec_data, ret_data):
+        """
+        軸情報のリストを順にjntmoveで送る
+
+        引数:
+            joints: 軸情報(J1～J6)のリスト
+            exec_data: コマンド実行用データ JSON形式
+                SP: 速度 ※省略時はクラスに設定されている値
+                ATM: 加速時間 ※省略時はクラスに設定されている値
+                DTM: 減速時間 ※省略時はクラスに設定されている値
+            ret_data: コマンド実行結果を返す変数 JSON形式 ※参照変数
+                N: 送った点の数
+        戻り値:
+            error_code: 関数の実行結果
+        """
+        acctime = exec_data.get("ATM", self._acctime)
+        dacctime = exec_data.get("DTM", self._dacctime)
+        speed = exec_data.get("SP", self._jnt_speed)
+
+        error_code = ErrorCode.SUCCESS
+        count = 0
+        for j1, j2, j3, j4, j5, j6 in joints:
+            res = self._rblib.jntmove(j1, j2, j3, j4, j5, j6, speed, acctime, dacctime)
+            error_code = self._create_error_code(res)
+            if error_code != ErrorCode.SUCCESS:
+                break
+            count += 1
+        ret_data["N"] = count
+        return error_code
+
+    def _unpack_points(self, spec):
+        """
+        パックされた座標情報または軸情報の配列を行のリストに変換
+
+        引数:
+            spec: 型d 形状[N, 6]のパックされた配列
+        戻り値:
+            points: 6要素のタプルのリスト
+        """
+        type_code, shape, data = fsrobo_r_packed.decode(spec)
+        if type_code != "d" or len(shape) != 2 or shape[1] != 6:
+            raise ValueError("point array must be float64 [N, 6]")
+        return fsrobo_r_packed.unpack_rows(type_code, shape, data)
+
+    def _unpack_postures(self, exec_data, count):
+        """
+        点ごとの姿勢情報を取得
+
+        引数:
+            exec_data: コマンド実行用データ JSON形式
+                P: 姿勢情報 ※省略時はクラスに設定されている値
+                    数値の場合は全点で共通、パックされた配列(型i 形状[N])の場合は点ごと
+                    -1の場合はクラスに設定されている値を使用
+            count: 点数
+        戻り値:
+            postures: 姿勢情報のリスト
+        """
+        posture = exec_data.get("P", self._POSTURE_NONE)
+        if isinstance(posture, dict):
+            type_code, shape, data = fsrobo_r_packed.decode(posture)
+            if type_code != "i" or shape != [count]:
+                raise ValueError("posture array must be int32 [N]")
+            postures = fsrobo_r_packed.unpack_values(type_code, shape, data)
+        else:
+            postures = [posture] * count
+        return [FSRoboRCCExecCommand._posture if p == self._POSTURE_NONE else p for p in postures]
+
+    def _pos2joint(self, x, y, z, rz, ry, rx, posture, coord=_RBCOORD_LINE, cc=_CC_NOT_USE):
+        """
+        座標情報を軸情報に変換
+        使用中のツールオフセットが分かる場合はキャッシュを使用する
+
+        引数:
+            x, y, z: 座標
+            rz, ry, rx: 角度
+            posture: 姿勢情報
+            coord: 座標系
+            cc: 多回転情報
+        戻り値:
+            res: r2j_mtの結果
+        """
+        tool = self._modal.active_tool()
+        if tool is None:
+            # プログラム実行後などツールオフセットが不明な場合はキャッシュしない
+            return self._rblib.r2j_mt(x, y, z, rz, ry, rx, posture, coord, cc, self._IK_SOLVER_OPTION_DEFAULT)
+
+        key = self._ik_cache.make_key(x, y, z, rz, ry, rx, posture, coord, cc, tool)
+        res = self._ik_cache.get(key)
+        if res is None:
+            res = self._rblib.r2j_mt(x, y, z, rz, ry, rx, posture, coord, cc, self._IK_SOLVER_OPTION_DEFAULT)
+            if res[0] == True:
+                self._ik_cache.put(key, res)
+        return res
 
     def _move_ptp(self, exec_data):
         """
@@ -772,7 +1777,7 @@ class FSRoboRCCExecCommand(object):
 
         acctime = exec_data.get("ATM", self._acctime)
         dacctime = exec_data.get("DTM", self._dacctime)
-        pos_cc = int(exec_data("CC", "FF000000"), 16)
+        pos_cc = int(exec_data.get("CC", "FF000000"), 16)
         speed = exec_data.get("SP", self._jnt_speed)
 
         # PTP動作でマニピュレータを操作
@@ -904,7 +1909,8 @@ class FSRoboRCCExecCommand(object):
 
         # 受信データから座標データを取得
         self._p("cpmove execution")
-        p = self._rblib.j2r_mt(pos_j1, pos_j2, pos_j3, pos_j4, pos_j5, pos_j6, self._RBCOORD_LINE)
+        p = self._kinematics.joint2pos(self._rblib, (pos_j1, pos_j2, pos_j3, pos_j4, pos_j5, pos_j6),
+                                       self._modal.active_tool())
         x, y, z, rz, ry, rx = p[1:7]
         posture = p[7]
         res = self._rblib.cpmove(x, y, z, rz, ry, rx, posture, self._RBCOORD_LINE, speed, acctime, dacctime)
@@ -34,9 +34,196 @@
 import subprocess
 import ErrorCode
 import rblib
+from fsrobo_r_modal_state import FSRoboRModalState
+from fsrobo_r_motion_estimator import FSRoboRMotionEstimator
+import fsrobo_r_program_runner
+import collections
+import threading
+import resource
+import fcntl
+import errno
+import tempfile
+import json
 import time
 import os
 
+# 子プロセス内でプログラムを実行するスクリプト
+_RUNNER_PATH = os.path.splitext(os.path.abspath(fsrobo_r_program_runner.__file__))[0] + ".py"
+
+# 数値配列を受け渡す共有メモリの作成先
+_SHARED_MEMORY_DIR = "/dev/shm"
+# 共有メモリ内の配列の配置単位(バイト)
+_ARRAY_ALIGNMENT = 8
+
+
+def _set_cloexec(fd):
+    """
+    ファイルディスクリプタを以降に起動する子プロセスに引き継がないようにする
+    """
+    fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+
+class _ProgramProcess(object):
+    """
+    プログラム実行用の子プロセス
+    起動後はジョブの受信待ちとなるため、前のプログラムの実行中に事前に起動しておける
+    """
+
+    def __init__(self):
+        """
+        子プロセスを起動する
+        """
+        job_r, self._job_w = os.pipe()
+        self._stats_r, stats_w = os.pipe()
+        _set_cloexec(self._job_w)
+        _set_cloexec(self._stats_r)
+        env = os.environ.copy()
+        env[fsrobo_r_program_runner.JOB_FD_ENV] = str(job_r)
+        env[fsrobo_r_program_runner.STATS_FD_ENV] = str(stats_w)
+        try:
+            self._proc = subprocess.Popen(["python", _RUNNER_PATH],
+                                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        finally:
+            os.close(job_r)
+            os.close(stats_w)
+        self._children_usage = None
+        self._array_file = None
+
+    def start(self, path, param, arrays=None):
+        """
+        プログラムの実行を開始する
+        パラメータはジョブ受信用のパイプ、数値配列は共有メモリで渡す
+
+        引数:
+            path: 実行するプログラムの絶対パス
+            param: プログラム実行時に使用するパラメータ JSON形式
+            arrays: 配列名ごとの(型, 形状, パックされたバイナリ) ※省略可
+        """
+        self._children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        header = {"PATH": path}
+        try:
+            if arrays:
+                header["FILE"], header["BIN"] = self._write_arrays(arrays)
+            job = json.dumps(header) + "\n" + param
+            if isinstance(job, unicode):
+                job = job.encode("utf-8")
+            self._send_job(job)
+        except Exception:
+            # 子プロセスに渡せなかった場合はwait()が呼ばれないため、ここで削除する
+            self._remove_arrays()
+            raise
+
+    def _write_arrays(self, arrays):
+        """
+        数値配列を共有メモリのファイルに書き込む
+        ファイルはプログラムの終了後に削除する
+
+        引数:
+            arrays: 配列名ごとの(型, 形状, パックされたバイナリ)
+        戻り値:
+            file_path: ファイルのパス
+            layout: 配列名ごとの[型, 形状, オフセット, バイトサイズ]
+        """
+        directory = _SHARED_MEMORY_DIR if os.path.isdir(_SHARED_MEMORY_DIR) else None
+        fd, self._array_file = tempfile.mkstemp(prefix="fsrobo_r_cc_", dir=directory)
+        layout = {}
+        offset = 0
+        with os.fdopen(fd, "wb") as f:
+            for name, (type_code, shape, data) in arrays.items():
+                padding = -offset % _ARRAY_ALIGNMENT
+                f.write("\0" * padding)
+                offset += padding
+                layout[name] = [type_code, shape, offset, len(data)]
+                f.write(data)
+                offset += len(data)
+            if offset == 0:
+                # 空のファイルは割り当てできないため1バイト書き込む
+                f.write("\0")
+        return self._array_file, layout
+
+    def cancel(self):
+        """
+        プログラムを実行せずに子プロセスを終了する
+        """
+        if self._job_w is None:
+            return
+        self._send_job("")
+        self._proc.communicate()
+        os.close(self._stats_r)
+
+    def wait(self):
+        """
+        プログラムの終了を待つ
+
+        戻り値:
+            error_message: プログラムの標準エラー出力
+        """
+        _, error_message = self._proc.communicate()
+        self._remove_arrays()
+        return error_message
+
+    def _remove_arrays(self):
+        """
+        数値配列を書き込んだ共有メモリのファイルを削除する
+        """
+        if self._array_file is not None:
+            os.remove(self._array_file)
+            self._array_file = None
+
+    @property
+    def returncode(self):
+        return self._proc.returncode
+
+    def _send_job(self, job):
+        """
+        ジョブを送信する
+        子プロセスが既に終了している場合はwait()で結果を確認する
+        """
+        try:
+            while len(job) > 0:
+                job = job[os.write(self._job_w, job):]
+        except OSError as e:
+            if e.errno != errno.EPIPE:
+                raise
+        finally:
+            os.close(self._job_w)
+            self._job_w = None
+
+    def read_stats(self):
+        """
+        子プロセスから通知された計測結果を読み込む
+        プログラムが起動した孫プロセスで待たされないよう、読み込める分だけ読む
+
+        戻り値:
+            stats: 計測結果
+        """
+        fcntl.fcntl(self._stats_r, fcntl.F_SETFL, fcntl.fcntl(self._stats_r, fcntl.F_GETFL) | os.O_NONBLOCK)
+        data = ""
+        try:
+            while True:
+                chunk = os.read(self._stats_r, 4096)
+                if len(chunk) == 0:
+                    break
+                data += chunk
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+        finally:
+            os.close(self._stats_r)
+
+        try:
+            return json.loads(data)
+        except ValueError:
+            # 子プロセスから通知が無い場合は子プロセス全体の差分で代用
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            return {
+                "CPU_U": usage.ru_utime - self._children_usage.ru_utime,
+                "CPU_S": usage.ru_stime - self._children_usage.ru_stime,
+                "RSS": None,
+                "CALLS": None
+            }
+
+
 class FSRoboRCCExecProgram(object):
     """
     プログラム実行クラス
@@ -53,44 +240,212 @@ class FSRoboRCCExecProgram(object):
     _DEFAULT_ZONE = 20
     _MDO_ALL = 255
 
-    def exec_program(self, path, param):
+    # プログラム終了後の待機時間(秒)
+    _POST_RUN_WAIT = 1
+
+    # 実行履歴の最大保持数
+    _HISTORY_MAX = 100
+
+    # 共通クラス変数
+    _history = collections.deque(maxlen=_HISTORY_MAX)
+    _history_lock = threading.Lock()
+
+    # 実行履歴の並び替えに使用できる項目
+    HISTORY_SORT_KEYS = ("WALL", "SETUP", "RUN", "WAIT", "CPU", "RSS", "CALLS")
+
+    def __init__(self):
+        """
+        初期化
+        """
+        # 初期化用のrblib 連続実行中は接続したままにする
+        self._reset_rb = None
+
+    def exec_program(self, path, param, arrays=None):
         """
         プログラムを実行
 
         引数:
             path: 実行するプログラムの絶対パス
             param: プログラム実行時に使用するパラメータ JSON形式
+            arrays: 配列名ごとの(型, 形状, パックされたバイナリ) ※省略可
         戻り値:
             error_code: 関数の実行結果
         """
         print "exec_program execution"
-        # マニピュレータの状態を初期化
-        rb = rblib.Robot(self._RBLIB_HOST, self._RBLIB_PORT)
-        rb.open()
-        rb.acq_permission()
-        rb.changetool(self._DEFAULT_TOOL_ID)
-        # 初期ではasyncmはOFFに設定する
-        rb.asyncm(self._DEFAULT_ASYNCM)
-        rb.passm(self._DEFAULT_PASS)
-        rb.overlap(self._DEFAULT_OVERLAP)
-        rb.zone(self._DEFAULT_ZONE)
-        rb.disable_mdo(self._MDO_ALL)
-        rb.rel_permission()
-        rb.close()
+        process = None
+        try:
+            # 子プロセスの起動とマニピュレータの初期化を並行して行う
+            process = _ProgramProcess()
+            record, process = self._run(process, path, param, arrays)
+        finally:
+            # ジョブを送信する前に失敗した場合は子プロセスを終了する
+            if process is not None:
+                process.cancel()
+            self._close_reset_robot()
+        return record["RE"]
+
+    def exec_queue(self, items, stop_on_error, results):
+        """
+        複数のプログラムを連続で実行
+        実行中に次のプログラム用の子プロセスを起動しておく
+
+        引数:
+            items: 実行するプログラムのリスト
+                PATH: 実行するプログラムの絶対パス
+                PAR: プログラム実行時に使用するパラメータ JSON形式
+                BIN: 配列名ごとの(型, 形状, パックされたバイナリ)
+            stop_on_error: エラー発生時に以降のプログラムを実行しないか
+            results: プログラムごとの実行結果を返す変数 ※参照変数
+                PATH: プログラムの絶対パス
+                RE: エラーコード 実行しなかった場合はNone
+                WALL: 所要時間
+        戻り値:
+            error_code: 最初に発生したエラーのエラーコード
+        """
+        print "exec_queue execution"
+        error_code = ErrorCode.SUCCESS
+        process = None
+        try:
+            process = _ProgramProcess()
+            for index, item in enumerate(items):
+                if error_code != ErrorCode.SUCCESS and stop_on_error:
+                    results.append({"PATH": item["PATH"], "RE": None, "WALL": None})
+                    continue
+
+                next_prepare = index + 1 < len(items)
+                record, process = self._run(process, item["PATH"], item["PAR"], item["BIN"], next_prepare)
+                results.append({"PATH": item["PATH"], "RE": record["RE"], "WALL": record["WALL"]})
+                if error_code == ErrorCode.SUCCESS:
+                    error_code = record["RE"]
+        finally:
+            if process is not None:
+                process.cancel()
+            self._close_reset_robot()
+        return error_code
+
+    def _run(self, process, path, param, arrays, next_prepare=False):
+        """
+        起動済みの子プロセスでプログラムを実行
+
+        引数:
+            process: プログラム実行用の子プロセス
+            path: 実行するプログラムの絶対パス
+            param: プログラム実行時に使用するパラメータ JSON形式
+            arrays: 配列名ごとの(型, 形状, パックされたバイナリ)
+            next_prepare: 実行中に次のプログラム用の子プロセスを起動するか
+        戻り値:
+            record: 実行履歴
+            next_process: 次のプログラム用の子プロセス
+        """
+        start_time = time.time()
+        modal = FSRoboRModalState.get_instance()
+        self._reset_robot(modal)
 
         # プログラムを実行
         error_code = ErrorCode.SUCCESS
-        # ファイルとPATHに分ける
-        sppath = path.rsplit("/", 1)
-        # 実行フォルダに移動
-        os.chdir(sppath[0])
-        # ファイル実行
-        proc = subprocess.Popen(["python", sppath[1], param], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        proc.wait()
-        error_message = proc.stderr.read()
+        run_time = time.time()
+        process.start(path, param, arrays)
+        next_process = None
+        if next_prepare:
+            next_process = _ProgramProcess()
+        try:
+            error_message = process.wait()
+        except Exception:
+            if next_process is not None:
+                next_process.cancel()
+            raise
+        wait_time = time.time()
+        # プログラムが設定を変更している可能性があるためシャドウを破棄
+        modal.invalidate()
+        FSRoboRMotionEstimator.get_instance().invalidate()
         if len(error_message) != 0:
             print error_message
             error_code = ErrorCode.PROGRAM_ERROR
         # FSRobo-R Python APIのcloseで非同期のabortmが実行されるためabortmの完了を待つ
-        time.sleep(1)
-        return error_code
\ No newline at end of file
+        time.sleep(self._POST_RUN_WAIT)
+        end_time = time.time()
+
+        stats = process.read_stats()
+        record = {
+            "PATH": path,
+            "ST": start_time,
+            "WALL": end_time - start_time,
+            "SETUP": run_time - start_time,
+            "RUN": wait_time - run_time,
+            "WAIT": end_time - wait_time,
+            "CPU": stats["CPU_U"] + stats["CPU_S"],
+            "CPU_U": stats["CPU_U"],
+            "CPU_S": stats["CPU_S"],
+            "RSS": stats["RSS"],
+            "CALLS": stats["CALLS"],
+            "EXIT": process.returncode,
+            "RE": error_code
+        }
+        self._add_history(record)
+        return record, next_process
+
+    def _reset_robot(self, modal):
+        """
+        マニピュレータの状態を初期化
+        全て初期値の場合は接続自体を省略する
+
+        引数:
+            modal: モーダル設定のシャドウ
+        """
+        # 初期ではasyncmはOFFに設定する
+        settings = [
+            (FSRoboRModalState.TOOL, self._DEFAULT_TOOL_ID),
+            (FSRoboRModalState.ASYNCM, self._DEFAULT_ASYNCM),
+            (FSRoboRModalState.PASSM, self._DEFAULT_PASS),
+            (FSRoboRModalState.OVERLAP, self._DEFAULT_OVERLAP),
+            (FSRoboRModalState.ZONE, self._DEFAULT_ZONE),
+            (FSRoboRModalState.MDO, self._MDO_ALL)
+        ]
+        if len(modal.changes(settings)) == 0:
+            return
+
+        if self._reset_rb is None:
+            self._reset_rb = rblib.Robot(self._RBLIB_HOST, self._RBLIB_PORT)
+            self._reset_rb.open()
+        self._reset_rb.acq_permission()
+        modal.apply(self._reset_rb, settings)
+        # プログラムが操作権を取得できるよう開放する
+        self._reset_rb.rel_permission()
+
+    def _close_reset_robot(self):
+        """
+        初期化用のrblibを閉じる
+        """
+        if self._reset_rb is not None:
+            self._reset_rb.close()
+            self._reset_rb = None
+
+    @classmethod
+    def _add_history(cls, record):
+        """
+        実行履歴を追加する
+        """
+        with cls._history_lock:
+            cls._history.append(record)
+
+    @classmethod
+    def get_history(cls, count=None, sort_key=None):
+        """
+        実行履歴を取得
+
+        引数:
+            count: 取得する最大件数 Noneの場合は全件
+            sort_key: 降順に並び替える項目 Noneの場合は新しい順
+        戻り値:
+            history: 実行履歴のリスト
+        """
+        with cls._history_lock:
+            history = list(cls._history)
+        history.reverse()
+        if sort_key is not None:
+            # 計測できなかった項目は末尾にする
+            history.sort(key=lambda record: record[sort_key] if record[sort_key] is not None else -1,
+                         reverse=True)
+        if count is not None:
+            history = history[:count]
+        return history
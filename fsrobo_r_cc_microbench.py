@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+CCサーバーの要求処理のCPU負荷を計測するマイクロベンチマーク
+ロボットやシミュレータとの通信を行わず、以下の処理を単体で計測する
+    codec: 受信データの判定と解析、応答データの作成(ServiceThread)
+    dispatch: コマンドの振り分け(FSRoboRCCExecCommand.exec_command)
+    io: I/Oのビット列操作(IO.dout, IO.din, IO.replace, IO.make_data)
+
+使い方:
+    python fsrobo_r_cc_microbench.py                              # 全項目を計測
+    python fsrobo_r_cc_microbench.py codec io --repeat 7          # 項目の先頭一致で絞り込み
+    python fsrobo_r_cc_microbench.py --save baseline.json         # 基準値を保存
+    python fsrobo_r_cc_microbench.py --compare baseline.json --threshold 0.1
+        基準値より10%以上遅くなった項目がある場合は終了コード1を返す
+
+計測結果:
+    ns/op: 1回あたりの処理時間(繰り返しの最小値)
+    objs/op: 1回あたりに残ったGC追跡オブジェクト数(GC停止中の増減)
+    bytes/op, blocks/op: 1回あたりのメモリ割り当て量と割り当て回数 ※tracemallocが使用できる場合のみ
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import timeit
+
+import fsrobo_r_rblib_sim
+# コマンド実行クラスがrblibを読み込むため、先にシミュレータに置き換える
+fsrobo_r_rblib_sim.install()
+import CommandID
+import ErrorCode
+import fsrobo_r_cc_codec
+from fsrobo_r_cc_server import ServiceThread
+from fsrobo_r_io import IO
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# 1回の計測の最短時間(秒)
+_MIN_TIME = 0.2
+# 計測の繰り返し回数の既定値
+_REPEAT_DEFAULT = 5
+# 回帰と判断する処理時間の増加率の既定値
+_THRESHOLD_DEFAULT = 0.2
+
+
+class _NullRobot(object):
+    """
+    rblibの呼び出しを即座に成功させるRobot
+    ioctrlは全ビットが1のI/O状態、位置の取得は原点を返す
+    """
+
+    _RESULT_DEFAULT = (True, 0xFFFFFFFF, 0xFFFFFFFF)
+    _RESULTS = {
+        "jmark": (True, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0),
+        "mark": (True, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 7)
+    }
+
+    def __getattr__(self, name):
+        result = self._RESULTS.get(name, self._RESULT_DEFAULT)
+        return lambda *args: result
+
+
+class _NullSocket(object):
+    """
+    送信したデータを破棄するソケット
+    """
+
+    def setsockopt(self, *args):
+        pass
+
+    def sendall(self, data):
+        pass
+
+
+class _Silence(object):
+    """
+    計測中の標準出力を破棄する
+    コマンド実行クラスのログ出力を端末の描画時間に左右されないようにする
+    """
+
+    def __enter__(self):
+        self._stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self._stdout
+
+
+def _message(cmd_id, data_type, data):
+    """
+    クライアントが送信する要求データを作成
+    """
+    return fsrobo_r_cc_codec.encode_request(cmd_id, data, data_type)
+
+
+def _service_thread():
+    """
+    ロボットに接続しないServiceThreadを作成
+    """
+    with _Silence():
+        service = ServiceThread(_NullSocket(), _NullRobot(), None)
+        service._exec_command.update_operation_permission(True)
+    service._exec_command._io._io._rb = _NullRobot()
+    return service
+
+
+def _io():
+    """
+    ロボットに接続しないIOを作成
+    """
+    io = IO()
+    io._rb = _NullRobot()
+    return io
+
+
+def _cases():
+    """
+    計測項目の一覧を作成
+
+    戻り値:
+        cases: (項目名, 計測する関数)のリスト
+    """
+    service = _service_thread()
+    exec_command = service._exec_command
+    io = _io()
+
+    jmark = _message(CommandID.JMARK, ServiceThread._DATA_TYPE_CMD, {})
+    setio = _message(CommandID.SETIO, ServiceThread._DATA_TYPE_CMD, {"AD": 5, "SL": "1*0*1"})
+    connect = _message(CommandID.NOCOMMAND, ServiceThread._DATA_TYPE_CONNECT_CHECK, {})
+    qjmove = _message(CommandID.QJMOVE_PTP, ServiceThread._DATA_TYPE_CMD,
+                      {"J1": 10.5, "J2": -20.25, "J3": 30.0, "J4": 0.0, "J5": 45.125, "J6": -90.0})
+    jmark_ret = {"J1": 10.5, "J2": -20.25, "J3": 30.0, "J4": 0.0, "J5": 45.125, "J6": -90.0}
+    syssts = {"TYPE": 0}
+    getio = {"SA": 0, "EA": 31}
+    jmark_reply = fsrobo_r_cc_codec.encode_reply(CommandID.JMARK, ErrorCode.SUCCESS, jmark_ret)
+
+    return [
+        ("codec.splitter.complete", lambda: fsrobo_r_cc_codec.MessageSplitter().feed(qjmove)),
+        ("codec.splitter.partial", lambda: fsrobo_r_cc_codec.MessageSplitter().feed(qjmove[:len(qjmove) // 2])),
+        ("codec.exec_recv.connect_check", lambda: service._exec_recv_cmd(connect)),
+        ("codec.exec_recv.jmark", lambda: service._exec_recv_cmd(jmark)),
+        ("codec.exec_recv.setio", lambda: service._exec_recv_cmd(setio)),
+        ("codec.create_return.empty", lambda: service._create_return_data(CommandID.SETIO, ErrorCode.SUCCESS, {})),
+        ("codec.create_return.joints", lambda: service._create_return_data(CommandID.JMARK, ErrorCode.SUCCESS,
+                                                                            jmark_ret)),
+        ("io.send.reply", lambda: service._send(jmark_reply)),
+        ("dispatch.syssts", lambda: exec_command.exec_command(CommandID.SYSSTS, syssts, {})),
+        ("dispatch.getio", lambda: exec_command.exec_command(CommandID.GETIO, getio, {})),
+        ("dispatch.unknown", lambda: exec_command.exec_command(CommandID.NOCOMMAND, {}, {})),
+        ("io.dout", lambda: io.dout(37, "1*0*1")),
+        ("io.din.single", lambda: io.din(37)),
+        ("io.din.range", lambda: io.din(32, 63)),
+        ("io.replace", lambda: IO.replace("0" * 64, "10101", 37)),
+        ("io.make_data", lambda: io.make_data("1*0*1"))
+    ]
+
+
+def _calibrate(func):
+    """
+    1回の計測が最短時間以上になる実行回数を求める
+    """
+    number = 1
+    while True:
+        elapsed = timeit.Timer(func).timeit(number)
+        if elapsed >= _MIN_TIME:
+            return number
+        # 計測時間から必要な回数を見積もる(短すぎて見積もれない場合は10倍にする)
+        number = max(number * 2, int(number * _MIN_TIME * 1.2 / elapsed)) if elapsed > 1e-3 else number * 10
+
+
+def _allocations(func, number):
+    """
+    1回あたりのメモリ割り当てを計測する
+
+    戻り値:
+        objs: GC追跡オブジェクトの増減
+        size: 割り当てたバイト数 tracemallocが使用できない場合はNone
+        blocks: 割り当て回数 tracemallocが使用できない場合はNone
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.get_count()[0]
+        for _ in range(number):
+            func()
+        objs = float(gc.get_count()[0] - before) / number
+    finally:
+        gc.enable()
+
+    if tracemalloc is None:
+        return objs, None, None
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for _ in range(number):
+            func()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    size = float(sum(max(stat.size_diff, 0) for stat in stats)) / number
+    blocks = float(sum(max(stat.count_diff, 0) for stat in stats)) / number
+    return objs, size, blocks
+
+
+def measure(func, repeat):
+    """
+    1つの項目を計測する
+
+    引数:
+        func: 計測する関数
+        repeat: 計測の繰り返し回数
+    戻り値:
+        result: ns_per_op, objs_per_op, bytes_per_op, blocks_per_op
+    """
+    with _Silence():
+        number = _calibrate(func)
+        times = timeit.Timer(func).repeat(repeat, number)
+        objs, size, blocks = _allocations(func, min(number, 1000))
+    return {
+        "ns_per_op": min(times) / number * 1e9,
+        "objs_per_op": objs,
+        "bytes_per_op": size,
+        "blocks_per_op": blocks
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    基準値と比較し、処理時間が増加した項目を抽出する
+
+    引数:
+        results: 計測結果 項目名ごとのmeasure()の結果
+        baseline: 基準値 項目名ごとのmeasure()の結果
+        threshold: 回帰と判断する増加率
+    戻り値:
+        regressions: (項目名, 基準値のns/op, 計測値のns/op)のリスト
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["ns_per_op"] > base["ns_per_op"] * (1.0 + threshold):
+            regressions.append((name, base["ns_per_op"], result["ns_per_op"]))
+    return regressions
+
+
+def _format(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def main():
+    """
+    main関数
+    """
+    parser = argparse.ArgumentParser(description="FSRobo-R CC server microbenchmarks")
+    parser.add_argument("filters", nargs="*", help="run only cases whose name starts with one of these")
+    parser.add_argument("--repeat", type=int, default=_REPEAT_DEFAULT)
+    parser.add_argument("--save", help="write results as a JSON baseline to this file")
+    parser.add_argument("--compare", help="compare against a JSON baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=_THRESHOLD_DEFAULT,
+                        help="allowed slowdown ratio against the baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in _cases():
+        if args.filters and not any(name.startswith(prefix) for prefix in args.filters):
+            continue
+        result = measure(func, args.repeat)
+        results[name] = result
+        print("{:<32} {:>12} ns/op {:>8} objs/op {:>10} B/op {:>8} blocks/op".format(
+            name, _format(result["ns_per_op"], ".1f"), _format(result["objs_per_op"], ".2f"),
+            _format(result["bytes_per_op"], ".1f"), _format(result["blocks_per_op"], ".2f")))
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cases": results
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["cases"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, current in regressions:
+            print("REGRESSION {}: {:.1f} -> {:.1f} ns/op ({:+.1f}%)".format(
+                name, base, current, (current / base - 1.0) * 100.0))
+        if regressions:
+            sys.exit(1)
+        print("no regressions against {} (threshold {:.0f}%)".format(args.compare, args.threshold * 100.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+記録した通信(fsrobo_r_trafficのログ)をCCサーバーに再生するツール
+rblibのシミュレータとCCサーバーを起動し、記録時と同じ要求をセッションごとに送信して
+応答の一致と処理時間の差を報告する
+
+使い方:
+    FSROBO_R_CC_RECORD=/tmp/cc.rec python fsrobo_r_cc_server.py     # 記録
+    python fsrobo_r_cc_replay.py /tmp/cc.rec                         # 記録時の間隔で再生
+    python fsrobo_r_cc_replay.py /tmp/cc.rec --fast --time-scale 0   # 待たずに再生
+    python fsrobo_r_cc_replay.py /tmp/cc.rec --no-spawn --host 192.168.0.23
+
+比較:
+    応答のCD、REが異なる場合は不一致、DAのみ異なる場合はデータ差分として数える
+    処理時間はサーバーが受信してから応答を送信するまでの時間を比較する
+    --no-spawnの場合は再生側の処理時間にクライアントから見た通信時間が含まれる
+    記録時の間隔で再生する場合のみ、セッション間の要求の順序が記録時と一致する
+    不一致または応答の欠落がある場合は終了コード1を返す
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import fsrobo_r_rblib_sim
+# CCサーバーの設定を参照するため、rblibの代わりにシミュレータを読み込む
+fsrobo_r_rblib_sim.install()
+import CommandID
+import fsrobo_r_cc_codec
+import fsrobo_r_traffic
+import fsrobo_r_metrics
+from fsrobo_r_cc_bench import percentile, start_servers, stop_servers
+from fsrobo_r_cc_server import FSRoboRCCServer, ServiceThread
+
+# コマンドIDの名前
+_COMMAND_NAMES = fsrobo_r_metrics.constant_names(CommandID)
+# 応答待ちのタイムアウトの既定値(秒)
+_TIMEOUT_DEFAULT = 60.0
+# 表示する不一致の件数
+_MISMATCH_PRINT_MAX = 20
+
+
+def load_sessions(records):
+    """
+    ログのレコードをセッションごとの要求と応答にまとめる
+
+    引数:
+        records: fsrobo_r_traffic.read_log()のレコード
+    戻り値:
+        sessions: 接続順のセッションのリスト 要求の無いセッションは除く
+            id: セッション番号
+            open: 接続時刻
+            observer: 観測セッションか
+            steps: 要求ごとの(受信時刻, 受信データ, [(送信時刻, 送信データ)...])のリスト
+    """
+    sessions = {}
+    order = []
+    for kind, session_id, timestamp, data in records:
+        session = sessions.get(session_id)
+        if session is None:
+            session = {"id": session_id, "open": timestamp, "observer": False, "steps": []}
+            sessions[session_id] = session
+            order.append(session_id)
+        if kind == fsrobo_r_traffic.KIND_OPEN:
+            session["observer"] = json.loads(data).get("OBS", 0) == 1
+        elif kind == fsrobo_r_traffic.KIND_IN:
+            session["steps"].append((timestamp, data, []))
+        elif kind == fsrobo_r_traffic.KIND_OUT:
+            if session["steps"]:
+                session["steps"][-1][2].append((timestamp, data))
+    return [sessions[session_id] for session_id in order if sessions[session_id]["steps"]]
+
+
+def _command_name(message):
+    """
+    要求または応答のコマンド名を取得
+    """
+    try:
+        cmd_id = json.loads(message)[ServiceThread._JSON_TAG_COMMAND]
+    except (ValueError, KeyError, TypeError):
+        return "?"
+    return _COMMAND_NAMES.get(cmd_id, str(cmd_id))
+
+
+def server_latencies(sessions):
+    """
+    サーバー側の処理時間をコマンドごとに集計する
+    要求ごとの最後の応答までの時間を、要求のコマンド名で数える
+
+    戻り値:
+        latencies: コマンド名ごとの処理時間(秒)のリスト
+    """
+    latencies = {}
+    for session in sessions:
+        for received, message, replies in session["steps"]:
+            if replies:
+                latencies.setdefault(_command_name(message), []).append(replies[-1][0] - received)
+    return latencies
+
+
+class _SessionPlayer(threading.Thread):
+    """
+    1セッション分の要求を送信し、応答を受信する
+    """
+
+    def __init__(self, session, host, port, schedule, timeout):
+        """
+        初期化
+
+        引数:
+            session: load_sessions()のセッション
+            host, port: CCサーバーの接続先
+            schedule: 記録時刻から送信時刻(time.time())への変換関数 Noneの場合は待たない
+            timeout: 応答待ちのタイムアウト(秒)
+        """
+        super(_SessionPlayer, self).__init__()
+        self.daemon = True
+        self._session = session
+        self._host = host
+        self._port = port
+        self._schedule = schedule
+        self._timeout = timeout
+        # 記録した応答と同じ順の(応答, 送信から受信までの時間) 受信できなかった応答はNone
+        self.replies = []
+        self.latencies = {}
+        self.error = None
+
+    def _wait_until(self, timestamp):
+        if self._schedule is not None:
+            delay = self._schedule(timestamp) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def run(self):
+        expected = sum(len(replies) for _, _, replies in self._session["steps"])
+        try:
+            self._wait_until(self._session["open"])
+            sock = socket.create_connection((self._host, self._port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(self._timeout)
+            try:
+                self._play(sock)
+            finally:
+                sock.close()
+        except (socket.error, IOError) as e:
+            self.error = str(e)
+        # 受信できなかった応答は欠落とする
+        self.replies.extend([None] * (expected - len(self.replies)))
+
+    def _play(self, sock):
+        reader = fsrobo_r_cc_codec.MessageReader()
+        received_replies = []
+        waiting = 0
+        for received, message, replies in self._session["steps"]:
+            self._wait_until(received)
+            sent = time.time()
+            sock.sendall(message)
+            # 記録時にこの要求までに送信された応答数を受信するまで待つ
+            waiting += len(replies)
+            while len(self.replies) < waiting:
+                if not received_replies:
+                    chunk = sock.recv(65536)
+                    if len(chunk) == 0:
+                        raise IOError("connection closed by server")
+                    received_replies.extend(reader.feed(chunk))
+                    continue
+                latency = time.time() - sent
+                self.replies.append(received_replies.pop(0))
+                self.latencies.setdefault(_command_name(message), []).append(latency)
+
+
+def compare(sessions, players):
+    """
+    記録時と再生時の応答を比較する
+
+    戻り値:
+        summary: missing: 欠落した応答数 mismatch: 不一致の一覧 data_diff: DAのみ異なる応答数
+    """
+    missing = 0
+    data_diff = 0
+    mismatches = []
+    for session, player in zip(sessions, players):
+        recorded = [json.loads(data) for _, _, replies in session["steps"] for _, data in replies]
+        for index, (expected, actual) in enumerate(zip(recorded, player.replies)):
+            if actual is None:
+                missing += 1
+                continue
+            keys = (ServiceThread._JSON_TAG_COMMAND, ServiceThread._JSON_TAG_REPLY)
+            if any(expected.get(key) != actual.get(key) for key in keys):
+                mismatches.append({
+                    "session": session["id"], "index": index,
+                    "command": _COMMAND_NAMES.get(expected.get(ServiceThread._JSON_TAG_COMMAND), "?"),
+                    "recorded": expected.get(ServiceThread._JSON_TAG_REPLY),
+                    "replayed": actual.get(ServiceThread._JSON_TAG_REPLY)
+                })
+            elif expected.get(ServiceThread._JSON_TAG_DATA) != actual.get(ServiceThread._JSON_TAG_DATA):
+                data_diff += 1
+    return {"missing": missing, "data_diff": data_diff, "mismatch": mismatches}
+
+
+def _summarize(recorded, replayed):
+    """
+    コマンドごとの処理時間を比較する
+    """
+    commands = {}
+    for name in sorted(set(recorded) | set(replayed)):
+        result = {}
+        for label, latencies in (("recorded", recorded.get(name)), ("replayed", replayed.get(name))):
+            if latencies:
+                values = sorted(latencies)
+                result[label] = {
+                    "count": len(values),
+                    "p50_ms": percentile(values, 0.50) * 1000.0,
+                    "p95_ms": percentile(values, 0.95) * 1000.0,
+                    "max_ms": values[-1] * 1000.0
+                }
+        if "recorded" in result and "replayed" in result:
+            result["delta_p50_ms"] = result["replayed"]["p50_ms"] - result["recorded"]["p50_ms"]
+            result["delta_p95_ms"] = result["replayed"]["p95_ms"] - result["recorded"]["p95_ms"]
+        commands[name] = result
+    return commands
+
+
+def replay(sessions, host, port, fast, speed, timeout, observer_port=FSRoboRCCServer._OBSERVER_PORT_NUMBER):
+    """
+    セッションを再生する
+
+    引数:
+        sessions: load_sessions()のセッション
+        host, port: CCサーバーの接続先
+        fast: Trueの場合は記録時の間隔を待たずに送信する
+        speed: 記録時の間隔に対する再生速度の倍率
+        timeout: 応答待ちのタイムアウト(秒)
+        observer_port: 観測セッションの接続先のポート番号
+    戻り値:
+        players: セッションごとの再生結果
+    """
+    schedule = None
+    if not fast:
+        origin = min(session["open"] for session in sessions)
+        start = time.time()
+        schedule = lambda timestamp: start + (timestamp - origin) / speed
+    players = [_SessionPlayer(session, host, observer_port if session["observer"] else port, schedule, timeout)
+               for session in sessions]
+    for player in players:
+        player.start()
+        if fast:
+            # 接続順を記録時と合わせる
+            time.sleep(0.01)
+    for player in players:
+        player.join()
+    return players
+
+
+def _format_code(code):
+    return "0x{:04X}".format(code) if isinstance(code, int) else str(code)
+
+
+def main():
+    """
+    main関数
+    """
+    parser = argparse.ArgumentParser(description="Replay recorded FSRobo-R CC traffic")
+    parser.add_argument("log", help="traffic log recorded with {}".format(fsrobo_r_traffic.RECORD_ENV))
+    parser.add_argument("--session", type=int, nargs="+", help="replay only these session numbers")
+    parser.add_argument("--fast", action="store_true", help="send as fast as possible")
+    parser.add_argument("--speed", type=float, default=1.0, help="timing multiplier when not --fast")
+    parser.add_argument("--timeout", type=float, default=_TIMEOUT_DEFAULT, help="reply timeout in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated rblib latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated rblib jitter in seconds")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="simulated motion time scale")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=FSRoboRCCServer._SOCKET_PORT_NUMBER)
+    parser.add_argument("--observer-port", type=int, default=FSRoboRCCServer._OBSERVER_PORT_NUMBER)
+    parser.add_argument("--no-spawn", action="store_true", help="replay against an already running server")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("speed must be positive")
+
+    _, records = fsrobo_r_traffic.read_log(args.log)
+    sessions = load_sessions(records)
+    if args.session:
+        sessions = [session for session in sessions if session["id"] in args.session]
+    if not sessions:
+        parser.error("no sessions with requests in {}".format(args.log))
+
+    work_dir = tempfile.mkdtemp(prefix="fsrobo_r_cc_replay")
+    replay_log = os.path.join(work_dir, "replay.rec")
+    processes = []
+    log = open(os.path.join(work_dir, "servers.log"), "w")
+    try:
+        if not args.no_spawn:
+            processes = start_servers(args.latency, args.jitter, args.time_scale, args.port, log,
+                                      record=replay_log)
+        players = replay(sessions, args.host, args.port, args.fast, args.speed, args.timeout,
+                         args.observer_port)
+        if args.no_spawn:
+            replayed = {}
+            for player in players:
+                for name, values in player.latencies.items():
+                    replayed.setdefault(name, []).extend(values)
+        else:
+            stop_servers(processes)
+            processes = []
+            replayed = server_latencies(load_sessions(fsrobo_r_traffic.read_log(replay_log)[1]))
+    finally:
+        stop_servers(processes)
+        log.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = compare(sessions, players)
+    commands = _summarize(server_latencies(sessions), replayed)
+
+    print("sessions={} requests={} replies={} missing={} mismatch={} data_diff={}".format(
+        len(sessions), sum(len(session["steps"]) for session in sessions),
+        sum(len(player.replies) for player in players), summary["missing"],
+        len(summary["mismatch"]), summary["data_diff"]))
+    for player in players:
+        if player.error is not None:
+            print("  session {}: {}".format(player._session["id"], player.error))
+    for name, result in sorted(commands.items()):
+        recorded = result.get("recorded", {})
+        replayed_result = result.get("replayed", {})
+        print("  {:<16} n={:<6} recorded p50 {:>8} ms p95 {:>8} ms  replayed p50 {:>8} ms p95 {:>8} ms".format(
+            name, recorded.get("count", replayed_result.get("count", 0)),
+            *["{:.2f}".format(value) if value is not None else "-" for value in (
+                recorded.get("p50_ms"), recorded.get("p95_ms"),
+                replayed_result.get("p50_ms"), replayed_result.get("p95_ms"))]))
+    for mismatch in summary["mismatch"][:_MISMATCH_PRINT_MAX]:
+        print("  MISMATCH session {} #{} {}: RE {} -> {}".format(
+            mismatch["session"], mismatch["index"], mismatch["command"],
+            _format_code(mismatch["recorded"]), _format_code(mismatch["replayed"])))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"log": args.log, "fast": args.fast, "speed": args.speed,
+                       "summary": summary, "commands": commands}, f, indent=2, sort_keys=True)
+    if summary["missing"] or summary["mismatch"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -33,21 +33,43 @@ FSRobo-R CCのサーバーモジュール
 """
 
 import socket
+import select
 import json
 
 from struct import pack, unpack
 import os
 import sys
+# 環境変数(fsrobo_r_rblib_sim.SIM_ENV)が設定されている場合はrblibの代わりにシミュレータを使用する
+# シミュレータはNumPyや運動学を読み込むため、使用しない場合は読み込まない
+if os.environ.get("FSROBO_R_RBLIB_SIM"):
+    import fsrobo_r_rblib_sim
+    fsrobo_r_rblib_sim.install_from_env()
+import fsrobo_r_cc_codec
 import fsrobo_r_cc_exec_command
 import fsrobo_r_cc_exec_program
+from fsrobo_r_modal_state import FSRoboRModalState
+from fsrobo_r_motion_estimator import FSRoboRMotionEstimator
+import fsrobo_r_metrics
+import fsrobo_r_trace
+from fsrobo_r_metrics import FSRoboRMetrics, MeteredRobot
+from fsrobo_r_trace import FSRoboRTracer
+from fsrobo_r_traffic import FSRoboRTrafficRecorder
 import shutil
+import tempfile
 import CommandID
 import ErrorCode
+import fsrobo_r_packed
 
 import traceback
 import threading
+import time
+import collections
 import rblib
 
+# 計測結果に記録するコマンドとエラーコードの名前
+_COMMAND_NAMES = fsrobo_r_metrics.constant_names(CommandID)
+_ERROR_NAMES = fsrobo_r_metrics.constant_names(ErrorCode)
+
 
 class FSRoboRCCServer(object):
     """
@@ -59,21 +81,43 @@ class FSRoboRCCServer(object):
     #_SOCKET_IP_ADDRESS = "192.168.0.23"
     _SOCKET_IP_ADDRESS = "0.0.0.0"
     _SOCKET_PORT_NUMBER = 5500
+    # 観測セッション(読み込み専用)の待ち受けポート
+    _OBSERVER_PORT_NUMBER = 5501
     _SOCKET_BACKLOG = 1
+    # 同時に接続できるセッション数
     _CONNECT_DEVICE_MAX = 3
+    _OBSERVER_MAX = 8
+    # セッション数を変更する環境変数名
+    _CONNECT_DEVICE_MAX_ENV = "FSROBO_R_CC_CONTROL_MAX"
+    _OBSERVER_MAX_ENV = "FSROBO_R_CC_OBSERVER_MAX"
+    # 拒否した接続にエラーを送信する際のタイムアウト(秒)
+    _REJECT_SEND_TIMEOUT = 1.0
 
     # Nativeとの通信
     _RBLIB_HOST = "127.0.0.1"
     _RBLIB_PORT = 12345
     
-    def __init__(self):
+    def __init__(self, control_max=None, observer_max=None):
         """
         初期化
+
+        引数:
+            control_max: 操作セッションの同時接続数 ※省略時は環境変数または_CONNECT_DEVICE_MAX
+            observer_max: 観測セッションの同時接続数 0の場合は観測用のポートを開かない
+                ※省略時は環境変数または_OBSERVER_MAX
         """
         print "CCServer initalize"
-        self._connection_thread = [None, None, None]
+        if control_max is None:
+            control_max = int(os.environ.get(self._CONNECT_DEVICE_MAX_ENV, self._CONNECT_DEVICE_MAX))
+        if observer_max is None:
+            observer_max = int(os.environ.get(self._OBSERVER_MAX_ENV, self._OBSERVER_MAX))
+        self._connection_thread = [None] * control_max
+        self._observer_thread = [None] * observer_max
         self._rb = None
         self._rb_use_count = 0
+        # 全観測セッションで共有するコマンド実行クラス
+        self._observer_command = None
+        self._observer_use_count = 0
         self._lock = threading.Lock()
 
     def start(self):
@@ -83,39 +127,25 @@ class FSRoboRCCServer(object):
         print "CCServer.start()"
 
         os.umask(0)
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind((self._SOCKET_IP_ADDRESS, self._SOCKET_PORT_NUMBER))
-        sock.listen(self._SOCKET_BACKLOG)
+        if FSRoboRTrafficRecorder.get_instance().enabled:
+            print "recording traffic"
+        # 操作用のポートに接続できれば観測用のポートも待ち受け中となるよう、先に開く
+        listeners = []
+        observer_sock = None
+        if len(self._observer_thread) > 0:
+            observer_sock = self._listen(self._OBSERVER_PORT_NUMBER)
+            listeners.append(observer_sock)
+        listeners.append(self._listen(self._SOCKET_PORT_NUMBER))
 
         while True:
 
             try:
                 print "accept execution"
-                connection, _ = sock.accept()
-                print "accept success"
-                connect_permission = False
-                index = 0
-                while index < self._CONNECT_DEVICE_MAX and connect_permission == False:
-                    # 空いているソケットが存在するかを確認
-                    if self._connection_thread[index] is None:
-                        print "can connect, because socket is none"
-                        connect_permission = True
-                    else:
-                        if self._connection_thread[index].isAlive() == False:
-                            print "can connect, because socket is not alive"
-                            connect_permission = True
-                    
-                    if connect_permission == False:
-                        index+=1
-
-                rb = self._get_robot()
-                service = ServiceThread(connection, connect_permission, rb, self._thread_terminates)
-                service.daemon = True
-                service.start()
-                if connect_permission == True:
-                    print "give connect permission"
-                    self._connection_thread[index] = service
+                readable, _, _ = select.select(listeners, [], [])
+                for listener in readable:
+                    connection, _ = listener.accept()
+                    print "accept success"
+                    self._admit(connection, listener is observer_sock)
 
             except Exception:
                 print "catch Exception. go out from while loop"
@@ -123,16 +153,111 @@ class FSRoboRCCServer(object):
                 break
 
         print "break while"
-        sock.close()
+        for listener in listeners:
+            listener.close()
         sys.exit(0)
 
+    def _listen(self, port):
+        """
+        接続の待ち受けを開始する
+
+        引数:
+            port: 待ち受けるポート番号
+        戻り値:
+            sock: 待ち受け中のソケット
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self._SOCKET_IP_ADDRESS, port))
+        sock.listen(self._SOCKET_BACKLOG)
+        return sock
+
+    def _admit(self, connection, observer):
+        """
+        接続数の上限を確認し、セッションを開始する
+        上限を超えた接続にはrblibの接続やスレッドを割り当てず、エラーを送信して切断する
+
+        引数:
+            connection: クライアントとのソケット
+            observer: 観測セッションか
+        """
+        threads = self._observer_thread if observer else self._connection_thread
+        index = self._find_free_slot(threads)
+        if observer:
+            name = fsrobo_r_metrics.CONNECTION_OBSERVER_ACCEPT if index >= 0 \
+                else fsrobo_r_metrics.CONNECTION_OBSERVER_REJECT
+        else:
+            name = fsrobo_r_metrics.CONNECTION_ACCEPT if index >= 0 else fsrobo_r_metrics.CONNECTION_REJECT
+        FSRoboRMetrics.get_instance().count(fsrobo_r_metrics.GROUP_CONNECTION, name)
+
+        if index < 0:
+            print "reject connection, because all sockets are in use"
+            self._reject(connection)
+            return
+
+        print "give connect permission"
+        rb = self._get_robot()
+        if observer:
+            try:
+                observer_command = self._get_observer_command(rb)
+            except Exception:
+                self._release_robot()
+                raise
+            service = ServiceThread(connection, rb, self._observer_terminates, observer_command)
+        else:
+            service = ServiceThread(connection, rb, self._thread_terminates)
+        service.daemon = True
+        service.start()
+        threads[index] = service
+
+    def _find_free_slot(self, threads):
+        """
+        空いているセッションの枠を探す
+
+        引数:
+            threads: セッションのスレッドのリスト
+        戻り値:
+            index: 空いている枠の番号 空きが無い場合は-1
+        """
+        for index, thread in enumerate(threads):
+            # 未使用か、スレッドが終了している枠を使用する
+            if thread is None or thread.isAlive() == False:
+                return index
+        return -1
+
+    def _reject(self, connection):
+        """
+        接続を拒否する
+        クライアントが要求を送信する前に接続権限エラーを送信して切断する
+
+        引数:
+            connection: クライアントとのソケット
+        """
+        recorder = FSRoboRTrafficRecorder.get_instance()
+        session = recorder.open_session(connection, False)
+        FSRoboRMetrics.get_instance().count(fsrobo_r_metrics.GROUP_ERROR, _ERROR_NAMES[ErrorCode.PROCESS_ERROR])
+        send_msg = fsrobo_r_cc_codec.encode_reply(CommandID.NOCOMMAND, ErrorCode.PROCESS_ERROR, {})
+        try:
+            recorder.outbound(session, send_msg)
+            # 受信しないクライアントで待ち受けが止まらないようにする
+            connection.settimeout(self._REJECT_SEND_TIMEOUT)
+            connection.sendall(send_msg)
+        except socket.error:
+            print "reject send error"
+        finally:
+            connection.close()
+            recorder.close_session(session)
+
     def _get_robot(self):
         with self._lock:
             if self._rb is None:
                 print('open connection to robot')
-                self._rb = rblib.Robot(self._RBLIB_HOST, self._RBLIB_PORT)
+                self._rb = MeteredRobot(rblib.Robot(self._RBLIB_HOST, self._RBLIB_PORT))
                 self._rb.open()
                 self._rb.acq_permission()
+                # 再接続時はコントローラの設定が不明なためシャドウを破棄
+                FSRoboRModalState.get_instance().invalidate()
+                FSRoboRMotionEstimator.get_instance().invalidate()
 
             self._rb_use_count += 1
 
@@ -148,10 +273,115 @@ class FSRoboRCCServer(object):
                 self._rb = None
 
 
+    def _get_observer_command(self, rb):
+        """
+        観測セッションで共有するコマンド実行クラスを取得
+        最初の観測セッションでのみI/O用のrblibの接続を開く
+        """
+        with self._lock:
+            if self._observer_command is None:
+                self._observer_command = fsrobo_r_cc_exec_command.FSRoboRCCExecCommand(rb)
+            self._observer_use_count += 1
+
+            return self._observer_command
+
+    def _release_observer_command(self):
+        with self._lock:
+            self._observer_use_count -= 1
+
+            if self._observer_use_count == 0:
+                self._observer_command.close()
+                self._observer_command = None
+
     def _thread_terminates(self):
         print('thread terminated')
         self._release_robot()
 
+    def _observer_terminates(self):
+        print('observer thread terminated')
+        self._release_observer_command()
+        self._release_robot()
+
+class ReplyWriter(object):
+    """
+    クライアントへの送信キュー
+    他のスレッドが送信中の場合はキューに追加して戻り、送信中のスレッドがまとめて送信する
+    応答を読まないクライアントに対しては、キューの保持量が上限を超えると追加を待たせる
+    """
+
+    def __init__(self, connection, limit):
+        """
+        初期化
+
+        引数:
+            connection: クライアントとのソケット
+            limit: キューに保持する最大バイト数
+        """
+        self._connection = connection
+        self._limit = limit
+        self._queue = collections.deque()
+        self._size = 0
+        self._writing = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def put(self, data):
+        """
+        送信するデータをキューに追加する
+
+        引数:
+            data: 送信するバイト列
+        戻り値:
+            True: 呼び出し元がflush()で送信する
+            False: 他のスレッドが送信中のため、そのスレッドが送信する
+        例外:
+            socket.error: 送信に失敗していた場合
+        """
+        with self._cond:
+            while self._error is None and self._writing and self._size >= self._limit:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            self._queue.append(data)
+            self._size += len(data)
+            if self._writing:
+                return False
+            self._writing = True
+            return True
+
+    def flush(self):
+        """
+        キューが空になるまで送信する put()がTrueを返した場合のみ呼び出す
+
+        例外:
+            socket.error: 送信に失敗した場合 以降の送信も同じ例外で失敗する
+        """
+        while True:
+            with self._cond:
+                if len(self._queue) == 0:
+                    self._writing = False
+                    return
+                if len(self._queue) == 1:
+                    data = self._queue.popleft()
+                else:
+                    # 送信中に溜まった応答は1回で送信する
+                    data = "".join(self._queue)
+                    self._queue.clear()
+                self._size = 0
+                self._cond.notify_all()
+            try:
+                # 一部のみ送信された場合も残りを送信する
+                self._connection.sendall(data)
+            except socket.error as e:
+                with self._cond:
+                    self._error = e
+                    self._writing = False
+                    self._queue.clear()
+                    self._size = 0
+                    self._cond.notify_all()
+                raise
+
+
 class ServiceThread(threading.Thread):
     """
     CC サービススレッド
@@ -162,40 +392,85 @@ class ServiceThread(threading.Thread):
     # ソケットのタイムアウト
     _SOCKET_RECV_TIMEOUT = 10
     _SOCKET_RECV_TIMEOUT_WAIT = None
+    # 送信のタイムアウト(秒) 応答を読まないクライアントは切断する
+    _SOCKET_SEND_TIMEOUT = 30
+    # 送信キューに保持する最大バイト数
+    _SEND_QUEUE_LIMIT = 1024 * 1024
 
     # データの種別
-    _DATA_TYPE_CMD = 0x00
-    _DATA_TYPE_PROGRAM = 0x01
-    _DATA_TYPE_CONNECT_CHECK = 0x02
-    _DATA_TYPE_OPERATION_GET = 0x03
+    _DATA_TYPE_CMD = fsrobo_r_cc_codec.DATA_TYPE_CMD
+    _DATA_TYPE_PROGRAM = fsrobo_r_cc_codec.DATA_TYPE_PROGRAM
+    _DATA_TYPE_CONNECT_CHECK = fsrobo_r_cc_codec.DATA_TYPE_CONNECT_CHECK
+    _DATA_TYPE_OPERATION_GET = fsrobo_r_cc_codec.DATA_TYPE_OPERATION_GET
+    _DATA_TYPE_METRICS = fsrobo_r_cc_codec.DATA_TYPE_METRICS
+    _DATA_TYPE_TRACE = fsrobo_r_cc_codec.DATA_TYPE_TRACE
 
     # jsonタグ
-    _JSON_TAG_COMMAND = "CD"
-    _JSON_TAG_PROCESS = "PR"
-    _JSON_TAG_DATATYPE = "DT"
-    _JSON_TAG_DATA = "DA"
-    _JSON_TAG_REPLY = "RE"
+    _JSON_TAG_COMMAND = fsrobo_r_cc_codec.TAG_COMMAND
+    _JSON_TAG_PROCESS = fsrobo_r_cc_codec.TAG_PROCESS
+    _JSON_TAG_DATATYPE = fsrobo_r_cc_codec.TAG_DATATYPE
+    _JSON_TAG_DATA = fsrobo_r_cc_codec.TAG_DATA
+    _JSON_TAG_REPLY = fsrobo_r_cc_codec.TAG_REPLY
 
     # ファイル削除のフラグ
     _FILE_DELETE_TRUE = 1
+    # 実行後に削除できるプログラムの格納先を変更する環境変数名
+    # クライアントはプログラムごとのフォルダをこの直下に転送する
+    _PROGRAM_DIR_ENV = "FSROBO_R_CC_PROGRAM_DIR"
+    _PROGRAM_DIR = os.path.realpath(os.environ.get(_PROGRAM_DIR_ENV, tempfile.gettempdir()))
+
+    # 連続実行時にエラーで停止するかのフラグ
+    _QUEUE_STOP_TRUE = 1
+
+    # プログラムを非同期で実行するかのフラグ
+    _PROGRAM_ASYNC_TRUE = 1
+
+    # トレースの記録を有効にするフラグ
+    _TRACE_ENABLE_TRUE = 1
+    # トレースのバッファを破棄するフラグ
+    _TRACE_CLEAR_TRUE = 1
+    # トレースの出力先を変更する環境変数名
+    # クライアントはこの直下のファイルのみ出力先に指定できる
+    _TRACE_DIR_ENV = "FSROBO_R_CC_TRACE_DIR"
+    _TRACE_DIR = os.path.realpath(os.environ.get(_TRACE_DIR_ENV, tempfile.gettempdir()))
 
 
     # コンストラクタ
-    def __init__(self, connection, connect_permission, robot, terminate_callback):
+    def __init__(self, connection, robot, terminate_callback, observer_command=None):
         """
         初期化
+
+        引数:
+            connection: クライアントとのソケット
+            robot: rblibのRobotオブジェクト
+            terminate_callback: スレッド終了時に呼び出す関数
+            observer_command: 観測セッションの場合は共有するコマンド実行クラス
+                ※省略時は操作セッションとしてコマンド実行クラスを作成する
         """
         super(ServiceThread, self).__init__()
         print "ServiceThread initialize"
         self._connection = connection
-        self._connect_permission = connect_permission
+        # 受信データをメッセージごとに分割し、受信途中のデータを保持する
+        self._splitter = fsrobo_r_cc_codec.MessageSplitter()
+        self._send_lock = threading.Lock()
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, pack("ll", self._SOCKET_SEND_TIMEOUT, 0))
+        self._writer = ReplyWriter(connection, self._SEND_QUEUE_LIMIT)
+        self._program_thread = None
+        self._observer = observer_command is not None
         self._operation_permission = False
         self._terminate_callback = terminate_callback
+        self._metrics = FSRoboRMetrics.get_instance()
+        self._tracer = FSRoboRTracer.get_instance()
+        self._recorder = FSRoboRTrafficRecorder.get_instance()
+        self._session = self._recorder.open_session(connection, True, self._observer)
         # rblibクラスを開く
         self._rblib = robot
 
         # コマンド実行クラスを初期化
-        self._exec_command = fsrobo_r_cc_exec_command.FSRoboRCCExecCommand(self._rblib)
+        if self._observer:
+            self._exec_command = observer_command
+        else:
+            self._exec_command = fsrobo_r_cc_exec_command.FSRoboRCCExecCommand(self._rblib)
 
     def _p(self, s, *args):
         if False:
@@ -209,94 +484,130 @@ class ServiceThread(threading.Thread):
         # Teachモジュールからのコマンドを受信する
         while True:
             try:
-                rec_msg = self._socket_receive(self._connection)
+                rec_msgs = self._socket_receive(self._connection)
             except Exception:
                 # エラー出力
                 self._p("receive error")
                 self._p(traceback.print_exc())
                 break
 
-            if len(rec_msg) > 0:
-                self._p("rec_msg:")
-                self._p(rec_msg)
-                send_msg = self._exec_recv_cmd(rec_msg)
-                try:
-                    self._connection.send(send_msg)
-                except Exception:
-                    # エラー出力
-                    self._p("send error")
-                    self._p(traceback.print_exc())
+            if len(rec_msgs) > 0:
+                if not self._handle_messages(rec_msgs):
                     break
             else:
                 self._p("socket close")
-                self._p( "rec_msg: {}", rec_msg)
+                self._p( "rec_msgs: {}", rec_msgs)
                 break
 
         # ソケット通信終了
-        # コマンド実行クラスを閉じる
-        self._exec_command.close()
+        # 実行中のプログラムの終了を待つ
+        if self._program_thread is not None:
+            self._program_thread.join()
+        # コマンド実行クラスを閉じる 観測セッションの共有クラスはサーバーが閉じる
+        if not self._observer:
+            self._exec_command.close()
         # ソケットを閉じる
         self._connection.close()
+        self._recorder.close_session(self._session)
 
         # rblibクラスを閉じる
         #self._rblib.close()
         
         self._terminate_callback()
 
+    def _handle_messages(self, rec_msgs):
+        """
+        受信したメッセージを順に実行し、結果を送信する
+
+        引数:
+            rec_msgs: 受信メッセージのリスト
+        戻り値:
+            True: 継続
+            False: 送信エラーのため切断する
+        """
+        for rec_msg in rec_msgs:
+            self._recorder.inbound(self._session, rec_msg)
+            self._p("rec_msg:")
+            self._p(rec_msg)
+            with self._tracer.span("handle"):
+                send_msg = self._exec_recv_cmd(rec_msg)
+            if send_msg is None:
+                # 非同期実行の結果は実行終了時に送信する
+                continue
+            try:
+                with self._tracer.span("send"):
+                    self._send(send_msg)
+            except Exception:
+                # エラー出力
+                self._p("send error")
+                self._p(traceback.print_exc())
+                return False
+        return True
+
+    def _send(self, send_msg):
+        """
+        クライアントに実行結果を送信
+        非同期実行したプログラムの結果と混ざらないよう、記録とキューへの追加を排他制御する
+        他のスレッドが送信中の場合は送信を任せて戻る
+
+        引数:
+            send_msg: 送信するデータ
+        """
+        with self._send_lock:
+            self._recorder.outbound(self._session, send_msg)
+            flush = self._writer.put(send_msg)
+        if flush:
+            self._writer.flush()
+
     def _socket_receive(self, socket_obj):
         """
         ソケット通信の受信データ取得処理
+        1回の受信に複数のメッセージが含まれる場合(パイプライン送信)は全て返し、
+        末尾の受信途中のデータは次回の受信データと結合する
 
         引数:
             socket_obj: ソケット通信のオブジェクト
         戻り値:
-            rec_msgs: クライアントからの受信データ
+            rec_msgs: クライアントからの受信メッセージのリスト 切断された場合は空
         """
         # 受信データを取得
         self._p("_socket_receive function")
-        rec_msgs = socket_obj.recv(self._SOCKET_RECV_BUFF_SIZE)
-        if len(rec_msgs) > 0:
-            self._p("rec_msgs length: {}", len(rec_msgs))
-            # 受信データを全て受信するまでループ
-            while self._check_recv_message(rec_msgs) == False:
-                self._p("_check_recv_message Result False")
-                # 無限ループ回避の為、タイムアウト時間を指定
+        rec_data = socket_obj.recv(self._SOCKET_RECV_BUFF_SIZE)
+        if len(rec_data) == 0:
+            return []
+        # 要求待ちの時間を含めないよう、最初のデータを受信してから計測する
+        start = time.time() if self._tracer.enabled else None
+        self._p("rec_data length: {}", len(rec_data))
+        rec_msgs = self._splitter.feed(rec_data)
+        # メッセージを1つ以上受信するまでループ
+        while len(rec_msgs) == 0:
+            self._p("message is not complete")
+            # 受信途中のメッセージがある場合は、無限ループ回避の為、タイムアウト時間を指定
+            # メッセージ間の空白のみを受信した場合は次のメッセージを待機する
+            if self._splitter.pending():
                 socket_obj.settimeout(self._SOCKET_RECV_TIMEOUT)
-                try:
-                    rec_msg = socket_obj.recv(self._SOCKET_RECV_BUFF_SIZE)
-                except socket.timeout:
-                    # クライアントに内部データエラーを返す
-                    self._p("socket time out")
-                    break
-                # 受信データのサイズが0の場合、エラーが発生したと見なす
-                if len(rec_msg) == 0:
-                    raise Exception
-                rec_msgs = rec_msgs + rec_msg
+            else:
+                socket_obj.settimeout(self._SOCKET_RECV_TIMEOUT_WAIT)
+            try:
+                rec_data = socket_obj.recv(self._SOCKET_RECV_BUFF_SIZE)
+            except socket.timeout:
+                # 受信途中のデータを破棄して実行し、クライアントに内部データエラーを返す
+                self._p("socket time out")
+                rec_msgs = [self._splitter.take_pending()]
+                break
+            # 受信データのサイズが0の場合、エラーが発生したと見なす
+            if len(rec_data) == 0:
+                raise Exception
+            rec_msgs = self._splitter.feed(rec_data)
 
-            # タイムアウトの設定を待機状態にする
-            socket_obj.settimeout(self._SOCKET_RECV_TIMEOUT_WAIT)
+        # タイムアウトの設定を待機状態にする
+        socket_obj.settimeout(self._SOCKET_RECV_TIMEOUT_WAIT)
 
+        if start is not None:
+            self._tracer.complete("receive", fsrobo_r_trace.CATEGORY_SERVER, start, time.time(),
+                                  {"N": len(rec_msgs)})
         return rec_msgs
 
-    def _check_recv_message(self, rec_msg):
-        """
-        クライアントから受信したデータを全て受信しているかを判断
-
-        引数:
-            rec_msg: クライアントから受信したデータ
-        戻り値:
-            True: 受信完了
-            False: 受信途中
-        """
-        self._p("_check_recv_message function")
-        decoder = json.JSONDecoder()
-        try:
-            decoder.raw_decode(rec_msg)
-        except ValueError:
-            self._p("JSON Decode Error")
-            return False
-        return True
-
     def _exec_recv_cmd(self, rec_msg):
         """
         クライアントから受信した命令を実行
@@ -304,7 +615,7 @@ class ServiceThread(threading.Thread):
         引数：
             rec_msg: クライアント側から受信したデータ
         戻り値:
-            res_buf: 実行結果のデータ
+            res_buf: 実行結果のデータ 結果を非同期で送信する場合はNone
         """
         self._p("function _exec_recv_cmd execution")
         ret_data = {}
@@ -312,13 +623,8 @@ class ServiceThread(threading.Thread):
 
         # 受信データを各変数に切り分け
         try:
-            json_data = json.loads(rec_msg)
-            self._p("json_data:")
-            self._p(json_data)
-            cmd_id = json_data[self._JSON_TAG_COMMAND]
-            sender_process = json_data[self._JSON_TAG_PROCESS]
-            data_type = json_data[self._JSON_TAG_DATATYPE]
-            exec_data = json.loads(json_data[self._JSON_TAG_DATA])
+            with self._tracer.span("decode"):
+                cmd_id, sender_process, data_type, exec_data = fsrobo_r_cc_codec.decode_request(rec_msg)
         except (KeyError, ValueError):
             # 受信データが異常な場合
             # クライアント側に排他制御中のエラーコードを返す
@@ -335,29 +641,25 @@ class ServiceThread(threading.Thread):
         self._p("data_type: {}", data_type)
         self._p("exec_data: {}", exec_data)
 
-        self._p("Check connect permission")
-        # 受信データが接続中のプロセスのものかを確認
-        if self._connect_permission == False:
-            # 接続権限が無い場合
-            # クライアント側に排他制御中のエラーコードを返す
-            print "Disable Connect Process"
-            error_code = ErrorCode.PROCESS_ERROR
-            # 送信する実行結果を作成
-            res_buf = self._create_return_data(cmd_id, error_code, ret_data)
-            # 実行結果を送信
-            return res_buf
-
         self._p("Check Data")
         # 受信したデータを判断
-        if data_type == self._DATA_TYPE_PROGRAM and cmd_id == CommandID.PROGRAM:
+        if data_type == self._DATA_TYPE_PROGRAM and self._observer:
+            # 観測セッションはプログラムを実行できない 受信データは解析せず、ファイルも削除しない
+            self._p("Observer can not execute program")
+            error_code = ErrorCode.OPERATION_NONE_ERROR
+
+        elif data_type == self._DATA_TYPE_PROGRAM and cmd_id in (CommandID.PROGRAM, CommandID.PROGRAM_QUEUE):
             # プログラムの場合
             try:
-                path = exec_data["PATH"]
-                del_flg = exec_data["DEL"]
-                param = "{}"
-                if exec_data.has_key("PAR"):
-                    param = exec_data["PAR"]
-            except KeyError:
+                stop_on_error = False
+                async_flg = exec_data.get("ASYNC", 0) == self._PROGRAM_ASYNC_TRUE
+                if cmd_id == CommandID.PROGRAM:
+                    items = [self._get_program_item(exec_data)]
+                else:
+                    # 連続実行の場合
+                    items = [self._get_program_item(item) for item in exec_data["ITEMS"]]
+                    stop_on_error = exec_data.get("STOP", self._QUEUE_STOP_TRUE) == self._QUEUE_STOP_TRUE
+            except (KeyError, TypeError, ValueError):
                 # クライアント側に内部データ異常のエラーコードを返す
                 self._p("Key Error")
                 error_code = ErrorCode.DATA_ERROR
@@ -367,35 +669,38 @@ class ServiceThread(threading.Thread):
                 return res_buf
 
             # 操作権の確認
-            if self._operation_permission == True:
-                # プログラムを実行
-                self._p("Program Data")
-                fsrobo_r_cc_exec_command.FSRoboRCCExecCommand._last_motion_id = None
-                exec_program = fsrobo_r_cc_exec_program.FSRoboRCCExecProgram()
-
-                # 実行するプログラムに操作権を渡す必要があるので一時的に操作権開放
-                self._rblib.rel_permission()
-                # プログラムを実行
-                error_code = exec_program.exec_program(path, param)
-                # 操作権を再取得
-                result = self._rblib.acq_permission()
-                if result[0] == False:
-                    # 操作権の取得に失敗した場合、操作権フラグをFalseに設定
-                    self._p("operation get error")
-                    self._operation_permission = False
-                    self._exec_command.update_operation_permission(self._operation_permission)
-            else:
+            if self._operation_permission == False:
                 self._p("Not operation permission")
                 error_code = ErrorCode.OPERATION_NONE_ERROR
-
-            if del_flg == self._FILE_DELETE_TRUE:
-                    # 実行したプログラムを削除
-                    self._delete_program_file(path)
+                self._delete_program_files(items)
+            elif fsrobo_r_cc_exec_command.FSRoboRCCExecCommand.begin_program() == False:
+                self._p("Program is running")
+                error_code = ErrorCode.PROGRAM_RUNNING_ERROR
+                self._delete_program_files(items)
+            elif async_flg:
+                # 実行中も読み込み専用コマンドを受け付けるため、別スレッドで実行する
+                self._p("Program Data (async)")
+                self._program_thread = threading.Thread(target=self._exec_program_async,
+                                                        args=(cmd_id, items, stop_on_error))
+                self._program_thread.daemon = True
+                self._program_thread.start()
+                return None
+            else:
+                self._p("Program Data")
+                error_code = self._exec_program(cmd_id, items, stop_on_error, ret_data)
 
         elif data_type == self._DATA_TYPE_CMD:
             # コマンドの場合
             self._p("Command Data")
-            error_code = self._exec_command.exec_command(cmd_id, exec_data, ret_data)
+            cmd_name = _COMMAND_NAMES.get(cmd_id, str(cmd_id))
+            start = time.time()
+            with self._tracer.span(cmd_name):
+                if self._observer:
+                    error_code = self._exec_command.exec_observer_command(cmd_id, exec_data, ret_data)
+                else:
+                    error_code = self._exec_command.exec_command(cmd_id, exec_data, ret_data)
+            self._metrics.observe(fsrobo_r_metrics.GROUP_COMMAND, cmd_name,
+                                  time.time() - start, error_code != ErrorCode.SUCCESS)
 
         elif data_type == self._DATA_TYPE_CONNECT_CHECK:
             # 接続確認の場合
@@ -405,9 +710,28 @@ class ServiceThread(threading.Thread):
         elif data_type == self._DATA_TYPE_OPERATION_GET:
             # 操作権限取得の場合
             self._p("Operation get data")
-            self._operation_permission = True
-            self._exec_command.update_operation_permission(self._operation_permission)
+            if self._observer:
+                # 観測セッションは操作権を取得できない
+                error_code = ErrorCode.OPERATION_GET_ERROR
+            else:
+                self._operation_permission = True
+                self._exec_command.update_operation_permission(self._operation_permission)
+                error_code = ErrorCode.SUCCESS
+
+        elif data_type == self._DATA_TYPE_METRICS:
+            # 稼働状況の取得の場合
+            self._p("Metrics data")
+            ret_data.update(self._metrics.snapshot())
             error_code = ErrorCode.SUCCESS
+
+        elif data_type == self._DATA_TYPE_TRACE:
+            # トレースの操作の場合
+            self._p("Trace data")
+            if self._observer:
+                # ファイル出力と記録の切り替えは操作セッションのみ行える
+                error_code = ErrorCode.OPERATION_NONE_ERROR
+            else:
+                error_code = self._control_trace(exec_data, ret_data)
         else:
             self._p("ErrorData")
             # データ種別の値が異常な場合
@@ -419,6 +743,113 @@ class ServiceThread(threading.Thread):
         # 実行結果を送信
         return res_buf
 
+    def _exec_program(self, cmd_id, items, stop_on_error, ret_data):
+        """
+        プログラムを実行
+        begin_program()で実行開始を登録してから呼び出す
+
+        引数:
+            cmd_id: PROGRAM または PROGRAM_QUEUE
+            items: 実行するプログラムのリスト
+            stop_on_error: 連続実行時にエラーで停止するか
+            ret_data: 実行結果を返す変数 ※参照変数
+                RESULTS: 連続実行時のプログラムごとの実行結果
+        戻り値:
+            error_code: 実行結果
+        """
+        start = time.time()
+        error_code = ErrorCode.PROGRAM_ERROR
+        try:
+            fsrobo_r_cc_exec_command.FSRoboRCCExecCommand._last_motion_mode = None
+            exec_program = fsrobo_r_cc_exec_program.FSRoboRCCExecProgram()
+
+            # 実行するプログラムに操作権を渡す必要があるので一時的に操作権開放
+            self._rblib.rel_permission()
+            # プログラムを実行
+            if cmd_id == CommandID.PROGRAM:
+                error_code = exec_program.exec_program(items[0]["PATH"], items[0]["PAR"], items[0]["BIN"])
+            else:
+                ret_data["RESULTS"] = []
+                error_code = exec_program.exec_queue(items, stop_on_error, ret_data["RESULTS"])
+            # 操作権を再取得
+            result = self._rblib.acq_permission()
+            if result[0] == False:
+                # 操作権の取得に失敗した場合、操作権フラグをFalseに設定
+                self._p("operation get error")
+                self._operation_permission = False
+                self._exec_command.update_operation_permission(self._operation_permission)
+        finally:
+            fsrobo_r_cc_exec_command.FSRoboRCCExecCommand.end_program()
+            self._delete_program_files(items)
+            self._metrics.observe(fsrobo_r_metrics.GROUP_PROGRAM, _COMMAND_NAMES[cmd_id],
+                                  time.time() - start, error_code != ErrorCode.SUCCESS)
+
+        return error_code
+
+    def _exec_program_async(self, cmd_id, items, stop_on_error):
+        """
+        プログラムを実行し、終了時に実行結果を送信する
+        実行中に受信した読み込み専用コマンドの結果が先に送信されるため、
+        クライアントはCDで結果を区別する
+
+        引数:
+            cmd_id: PROGRAM または PROGRAM_QUEUE
+            items: 実行するプログラムのリスト
+            stop_on_error: 連続実行時にエラーで停止するか
+        """
+        ret_data = {}
+        try:
+            error_code = self._exec_program(cmd_id, items, stop_on_error, ret_data)
+        except Exception:
+            self._p(traceback.print_exc())
+            error_code = ErrorCode.PROGRAM_ERROR
+        try:
+            self._send(self._create_return_data(cmd_id, error_code, ret_data))
+        except Exception:
+            # 送信エラーは受信側のスレッドで検出する
+            self._p("send error")
+            self._p(traceback.print_exc())
+
+    def _delete_program_files(self, items):
+        """
+        削除フラグが設定されたプログラムファイルを削除
+
+        引数:
+            items: プログラムのリスト
+        """
+        for item in items:
+            if item["DEL"] == self._FILE_DELETE_TRUE:
+                # 実行したプログラムを削除
+                self._delete_program_file(item["PATH"])
+
+    def _get_program_item(self, exec_data):
+        """
+        受信データから実行するプログラムの情報を取得
+
+        引数:
+            exec_data: 受信データ
+                PATH: 実行するプログラムの絶対パス
+                DEL: 実行後にプログラムを削除するか
+                PAR: プログラム実行時に使用するパラメータ JSON形式の文字列またはオブジェクト ※省略可
+                BIN: 配列名ごとのパックされた数値配列 ※省略可
+                    T: 型(structの書式文字)
+                    S: 形状
+                    D: リトルエンディアンでパックしたバイナリのbase64文字列
+        戻り値:
+            item: PATH, DEL, PAR, BINを持つプログラムの情報
+        """
+        param = exec_data.get("PAR", "{}")
+        if not isinstance(param, basestring):
+            param = json.dumps(param)
+        arrays = dict((str(name), fsrobo_r_packed.decode(spec))
+                      for name, spec in exec_data.get("BIN", {}).items())
+        return {
+            "PATH": exec_data["PATH"],
+            "DEL": exec_data["DEL"],
+            "PAR": param,
+            "BIN": arrays
+        }
+
     def _create_return_data(self, cmd_id, error_code, ret_data):
         """
         クライアント側に実行結果を返すためのデータを作成
@@ -431,28 +862,64 @@ class ServiceThread(threading.Thread):
             res_buf: 実行結果のデータ
         """
         self._p("_create_return_data execution")
-        send_json = {
-            self._JSON_TAG_COMMAND: cmd_id,
-            self._JSON_TAG_REPLY: error_code,
-            self._JSON_TAG_DATA: json.dumps(ret_data)
-        }
-        send_data = json.dumps(send_json)
-        pack_format = str(len(send_data)) + "s"
-        res_buf = pack(pack_format, send_data)
+        self._metrics.count(fsrobo_r_metrics.GROUP_ERROR, _ERROR_NAMES.get(error_code, str(error_code)))
+        with self._tracer.span("encode"):
+            res_buf = fsrobo_r_cc_codec.encode_reply(cmd_id, error_code, ret_data)
         return res_buf
 
+    def _control_trace(self, exec_data, ret_data):
+        """
+        トレースの記録を切り替え、記録したイベントをファイルに出力する
+        出力、破棄、切り替えの順に行う
+
+        引数:
+            exec_data: 受信データ
+                PATH: イベントを出力するファイルの絶対パス トレースの出力先の直下のみ ※省略時は出力しない
+                CLR: 1: バッファ内のイベントを破棄する ※省略可
+                EN: 1: 記録を有効にする 0: 記録を無効にする ※省略時は変更しない
+            ret_data: 実行結果を返す変数 ※参照変数
+                EN: 記録の有効/無効
+                N: バッファ内のイベント数
+                DN: ファイルに出力したイベント数 ※PATH指定時のみ
+        戻り値:
+            error_code: 実行結果
+        """
+        if "PATH" in exec_data:
+            # シンボリックリンクや相対パスで出力先の外を指定されないよう、実際のパスで判断する
+            path = os.path.realpath(exec_data["PATH"])
+            if os.path.dirname(path) != self._TRACE_DIR:
+                self._p("not in trace directory: {}", exec_data["PATH"])
+                return ErrorCode.DATA_ERROR
+        try:
+            if "PATH" in exec_data:
+                ret_data["DN"] = self._tracer.dump(path)
+        except (IOError, OSError):
+            self._p(traceback.print_exc())
+            return ErrorCode.PROCESS_ERROR
+        if exec_data.get("CLR", 0) == self._TRACE_CLEAR_TRUE:
+            self._tracer.clear()
+        if "EN" in exec_data:
+            self._tracer.enable(exec_data["EN"] == self._TRACE_ENABLE_TRUE)
+        ret_data["EN"] = 1 if self._tracer.enabled else 0
+        ret_data["N"] = self._tracer.size()
+        return ErrorCode.SUCCESS
+
     def _delete_program_file(self, path):
         """
         クライアント側から受信したプログラムファイルの削除
+        プログラムの格納先の直下にあるプログラムごとのフォルダのみ削除する
 
         引数：
             path： 削除するファイルのパス
         """
         self._p("_delete_program_file execution")
-        if os.path.exists(path):
+        # シンボリックリンクや相対パスで格納先の外を指定されないよう、実際のパスで判断する
+        folder_path = os.path.dirname(os.path.realpath(path))
+        if os.path.dirname(folder_path) != self._PROGRAM_DIR:
+            self._p("not in program directory: {}", path)
+            return
+        if os.path.isfile(path):
             self._p("exist path")
-            name_index = path.rfind("/")
-            folder_path = path[0:name_index]
             shutil.rmtree(folder_path)
 
 if __name__ == "__main__":
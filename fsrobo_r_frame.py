@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+座標情報の座標系を変換するモジュール
+角度はRz, Ry, Rxの順に回転するオイラー角(deg)とする
+"""
+
+import math
+
+
+def pose_matrix(rz, ry, rx):
+    """
+    オイラー角から回転行列を求める
+
+    引数:
+        rz: Z軸周りの角度(deg)
+        ry: Y軸周りの角度(deg)
+        rx: X軸周りの角度(deg)
+    戻り値:
+        matrix: 3x3の回転行列(リストのリスト)
+    """
+    cz, sz = math.cos(math.radians(rz)), math.sin(math.radians(rz))
+    cy, sy = math.cos(math.radians(ry)), math.sin(math.radians(ry))
+    cx, sx = math.cos(math.radians(rx)), math.sin(math.radians(rx))
+    return [
+        [cz * cy, cz * sy * sx - sz * cx, cz * sy * cx + sz * sx],
+        [sz * cy, sz * sy * sx + cz * cx, sz * sy * cx - cz * sx],
+        [-sy, cy * sx, cy * cx]
+    ]
+
+
+def matrix_angles(matrix):
+    """
+    回転行列からオイラー角を求める
+
+    引数:
+        matrix: 3x3の回転行列
+    戻り値:
+        angles: (Rz, Ry, Rx)(deg)
+    """
+    rz = math.degrees(math.atan2(matrix[1][0], matrix[0][0]))
+    ry = math.degrees(math.atan2(-matrix[2][0], math.hypot(matrix[0][0], matrix[1][0])))
+    rx = math.degrees(math.atan2(matrix[2][1], matrix[2][2]))
+    return rz, ry, rx
+
+
+def multiply(a, b):
+    """
+    3x3の行列の積を求める
+    """
+    return [[sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)] for i in range(3)]
+
+
+def rotate(matrix, vector):
+    """
+    ベクトルを回転する
+    """
+    return [sum(matrix[i][k] * vector[k] for k in range(3)) for i in range(3)]
+
+
+def offset_pose(pose, offset, tool_frame):
+    """
+    座標情報に相対移動量を加える
+
+    引数:
+        pose: 現在の座標情報(X, Y, Z, Rz, Ry, Rx)
+        offset: 相対移動量(dX, dY, dZ, dRz, dRy, dRx)
+        tool_frame: True: ツール座標系で移動する False: ベース座標系で移動する
+    戻り値:
+        pose: 移動後の座標情報(X, Y, Z, Rz, Ry, Rx)
+    """
+    current = pose_matrix(pose[3], pose[4], pose[5])
+    if tool_frame:
+        translation = rotate(current, offset[:3])
+    else:
+        translation = list(offset[:3])
+    position = tuple(pose[i] + translation[i] for i in range(3))
+
+    # 回転しない場合は角度の表現を変えないように現在の値をそのまま使用する
+    if offset[3] == 0 and offset[4] == 0 and offset[5] == 0:
+        return position + tuple(pose[3:6])
+    delta = pose_matrix(offset[3], offset[4], offset[5])
+    if tool_frame:
+        target = multiply(current, delta)
+    else:
+        target = multiply(delta, current)
+    return position + matrix_angles(target)
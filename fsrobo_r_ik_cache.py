@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+逆運動学(r2j_mt)の結果をキャッシュするモジュール
+"""
+
+import collections
+import threading
+
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+
+
+class FSRoboRIKCache(FSRoboRSharedInstance):
+    """
+    逆運動学キャッシュクラス
+    量子化した座標、姿勢情報、座標系、多回転情報、ツールオフセットをキーとして
+    r2j_mtの結果を保持し、最大件数を超えた場合は最も古く使用された結果から破棄する
+    """
+
+    # 最大保持件数
+    _CAPACITY_DEFAULT = 4096
+
+    # 量子化の分解能
+    _POSITION_RESOLUTION = 0.001                            # mm
+    _ANGLE_RESOLUTION = 0.0001                              # deg
+
+    def __init__(self, capacity=_CAPACITY_DEFAULT):
+        """
+        初期化
+
+        引数:
+            capacity: 最大保持件数
+        """
+        self._lock = threading.Lock()
+        self._capacity = capacity
+        self._entries = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._clears = 0
+
+    def make_key(self, x, y, z, rz, ry, rx, posture, coord, cc, tool):
+        """
+        キャッシュのキーを作成
+
+        引数:
+            x, y, z: 座標
+            rz, ry, rx: 角度
+            posture: 姿勢情報
+            coord: 座標系
+            cc: 多回転情報
+            tool: 使用中のツールオフセット
+        戻り値:
+            key: キャッシュのキー
+        """
+        pos_res = self._POSITION_RESOLUTION
+        ang_res = self._ANGLE_RESOLUTION
+        return (int(round(x / pos_res)), int(round(y / pos_res)), int(round(z / pos_res)),
+                int(round(rz / ang_res)), int(round(ry / ang_res)), int(round(rx / ang_res)),
+                posture, coord, cc, tool)
+
+    def get(self, key):
+        """
+        キャッシュされた結果を取得
+
+        引数:
+            key: キャッシュのキー
+        戻り値:
+            result: r2j_mtの結果 キャッシュされていない場合はNone
+        """
+        with self._lock:
+            result = self._entries.pop(key, None)
+            if result is None:
+                self._misses += 1
+                return None
+            # 最も新しく使用された結果にする
+            self._entries[key] = result
+            self._hits += 1
+            return result
+
+    def put(self, key, result):
+        """
+        結果をキャッシュする
+
+        引数:
+            key: キャッシュのキー
+            result: r2j_mtの結果
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = result
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        キャッシュを全て破棄する
+        ツールオフセットが変更された場合に使用
+        """
+        with self._lock:
+            self._entries.clear()
+            self._clears += 1
+
+    def stats(self):
+        """
+        キャッシュの統計情報を取得
+
+        戻り値:
+            stats: 統計情報
+                HIT: ヒット数
+                MISS: ミス数
+                SIZE: 保持件数
+                CAP: 最大保持件数
+                CLEAR: 破棄回数
+        """
+        with self._lock:
+            return {
+                "HIT": self._hits,
+                "MISS": self._misses,
+                "SIZE": len(self._entries),
+                "CAP": self._capacity,
+                "CLEAR": self._clears
+            }
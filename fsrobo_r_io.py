@@ -30,6 +30,7 @@
 import threading
 import rblib
 import re
+from fsrobo_r_metrics import MeteredRobot
 
 
 class FSRoboRIO(object):
@@ -77,7 +78,7 @@ class IO(object):
             self._initialized = False
 
     def init(self):
-        self._rb = rblib.Robot('127.0.0.1', 12345)
+        self._rb = MeteredRobot(rblib.Robot('127.0.0.1', 12345))
         self._rb.open()
         self._initialized = True
 
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+マニピュレータの軸の仕様を管理するモジュール
+"""
+
+import json
+import os
+
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+
+# 軸の仕様のファイルを指定する環境変数名
+SPEC_FILE_ENV = "FSROBO_R_JOINT_SPEC"
+
+# 仕様の取得元
+SOURCE_DEFAULT = "DEFAULT"
+SOURCE_FILE = "FILE"
+
+
+class FSRoboRJointSpec(FSRoboRSharedInstance):
+    """
+    軸の仕様クラス
+    既定値は標準の設定 実機の設定と異なる場合は_SPEC_FILEまたはSPEC_FILE_ENVで指定したファイルで上書きする
+    ファイルはJSON形式で、LIMITSに軸ごとの[下限, 上限](deg)、SPEED_MAXに速度100%での軸ごとの最大速度(deg/s)を指定する
+    CCサーバーとシミュレータは同じ仕様を使用する
+    """
+
+    # 軸の可動範囲(deg) コントローラのソフトリミットの標準設定
+    _JOINT_LIMITS = [
+        (-170.0, 170.0),
+        (-120.0, 120.0),
+        (-150.0, 150.0),
+        (-190.0, 190.0),
+        (-120.0, 120.0),
+        (-360.0, 360.0)
+    ]
+    # 速度100%での軸の最大速度(deg/s) コントローラの標準設定
+    _JOINT_SPEED_MAX = [230.0, 230.0, 230.0, 430.0, 430.0, 630.0]
+    # PTP動作の速度の最大値(%)
+    _SPEED_MAX = 100.0
+
+    _SPEC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fsrobo_r_joint_spec.json")
+
+    @classmethod
+    def _create_instance(cls):
+        """
+        共有インスタンスを生成する
+        環境変数SPEC_FILE_ENVが設定されている場合はそのファイルを読み込む
+        """
+        return cls(os.environ.get(SPEC_FILE_ENV, cls._SPEC_FILE))
+
+    def __init__(self, path=None):
+        """
+        初期化
+
+        引数:
+            path: 仕様のファイル 存在しない場合は既定値を使用する
+        """
+        spec = {}
+        self._source = SOURCE_DEFAULT
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                spec = json.load(f)
+            self._source = SOURCE_FILE
+        self._limits = [tuple(limit) for limit in spec.get("LIMITS", self._JOINT_LIMITS)]
+        self._speed_max = [float(limit) for limit in spec.get("SPEED_MAX", self._JOINT_SPEED_MAX)]
+        if len(self._limits) != 6 or len(self._speed_max) != 6:
+            raise ValueError("LIMITS and SPEED_MAX must have 6 joints: {}".format(path))
+
+    def limits(self):
+        """
+        軸の可動範囲を取得
+
+        戻り値:
+            limits: 軸ごとの(下限, 上限)(deg)
+        """
+        return self._limits
+
+    def speed_limits(self, speed):
+        """
+        PTP動作の速度から軸ごとの最高速度を求める
+
+        引数:
+            speed: PTP動作の速度(%)
+        戻り値:
+            limits: 軸ごとの最高速度(deg/s)のリスト
+        """
+        return [limit * speed / self._SPEED_MAX for limit in self._speed_max]
+
+    def source(self):
+        """
+        仕様の取得元を取得
+
+        戻り値:
+            source: SOURCE_FILE: ファイル SOURCE_DEFAULT: 既定値
+        """
+        return self._source
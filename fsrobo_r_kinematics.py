@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+FSRobo-Rの順運動学をサーバー内で計算するモジュール
+j2r_mtの結果と照合して一致している間だけ使用し、不一致の場合はj2r_mtに戻す
+NumPyが無い場合は常にj2r_mtを使用する
+"""
+
+import json
+import math
+import os
+import threading
+
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class FSRoboRKinematics(FSRoboRSharedInstance):
+    """
+    順運動学クラス
+    DHパラメータから手先の座標、角度(Rz, Ry, Rxのオイラー角)、姿勢情報を計算する
+    """
+
+    # DHパラメータ(標準DH) 軸ごとの[a(mm), alpha(deg), d(mm), theta offset(deg)]
+    # 実機の値と異なる場合は_PARAMETER_FILEで上書きする
+    # 値が異なる場合は照合で不一致となり、j2r_mtを使用する
+    _DH_PARAMETERS = [
+        [0.0, -90.0, 380.0, 0.0],
+        [340.0, 0.0, 0.0, -90.0],
+        [0.0, -90.0, 0.0, 0.0],
+        [0.0, 90.0, 340.0, 0.0],
+        [0.0, -90.0, 0.0, 0.0],
+        [0.0, 0.0, 92.0, 0.0]
+    ]
+    _PARAMETER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fsrobo_r_kinematics.json")
+
+    # 姿勢情報のビット
+    _POSTURE_WRIST = 0x1
+    _POSTURE_ELBOW = 0x2
+    _POSTURE_SHOULDER = 0x4
+
+    # 照合の許容誤差
+    _POSITION_TOLERANCE = 0.05                              # mm
+    _ANGLE_TOLERANCE = 0.01                                 # deg
+
+    # 使用開始までに一致が必要な照合回数
+    _VERIFY_SAMPLES = 20
+    # 使用開始後に照合する間隔(計算回数)
+    _VERIFY_INTERVAL = 100
+
+    # 状態
+    STATE_UNAVAILABLE = "UNAVAILABLE"
+    STATE_VERIFYING = "VERIFYING"
+    STATE_TRUSTED = "TRUSTED"
+    STATE_DISABLED = "DISABLED"
+
+    # 座標系(j2r_mtの引数)
+    _RBCOORD_LINE = 1
+
+    def __init__(self, parameters=None):
+        """
+        初期化
+
+        引数:
+            parameters: DHパラメータ ※省略時は_PARAMETER_FILE、無い場合は既定値
+        """
+        self._lock = threading.Lock()
+        if parameters is None:
+            parameters = self._DH_PARAMETERS
+            if os.path.exists(self._PARAMETER_FILE):
+                with open(self._PARAMETER_FILE) as f:
+                    parameters = json.load(f)
+        self._parameters = parameters
+        self._state = self.STATE_VERIFYING if numpy is not None else self.STATE_UNAVAILABLE
+        self._matches = 0
+        self._since_verify = 0
+        self._local_count = 0
+        self._native_count = 0
+        self._mismatch_count = 0
+
+    def stats(self):
+        """
+        統計情報を取得
+
+        戻り値:
+            stats: 統計情報
+                STATE: 状態
+                LOCAL: サーバー内で計算した回数
+                NATIVE: j2r_mtを使用した回数
+                MISMATCH: 照合で不一致となった回数
+        """
+        with self._lock:
+            return {
+                "STATE": self._state,
+                "LOCAL": self._local_count,
+                "NATIVE": self._native_count,
+                "MISMATCH": self._mismatch_count
+            }
+
+    def joint2pos(self, rb, joints, tool):
+        """
+        軸情報を座標情報に変換
+
+        引数:
+            rb: j2r_mtに使用するrblibのRobotオブジェクト
+            joints: J1～J6 (deg)
+            tool: 使用中のツールオフセット(FSRoboRModalState.active_tool()) 不明な場合はNone
+        戻り値:
+            res: j2r_mtと同じ形式の結果 (成否, X, Y, Z, Rz, Ry, Rx, 姿勢情報)
+        """
+        return self.joint2pos_batch(rb, [joints], tool)[0]
+
+    def joint2pos_batch(self, rb, joints_list, tool):
+        """
+        複数の軸情報をまとめて座標情報に変換
+        使用開始後はNumPyでまとめて計算する
+
+        引数:
+            rb: j2r_mtに使用するrblibのRobotオブジェクト
+            joints_list: J1～J6 (deg)のリスト
+            tool: 使用中のツールオフセット(FSRoboRModalState.active_tool()) 不明な場合はNone
+        戻り値:
+            results: j2r_mtと同じ形式の結果のリスト
+        """
+        if len(joints_list) == 0:
+            return []
+
+        with self._lock:
+            state = self._state
+            verify = False
+            if state == self.STATE_TRUSTED:
+                self._since_verify += len(joints_list)
+                if self._since_verify >= self._VERIFY_INTERVAL:
+                    self._since_verify = 0
+                    verify = True
+
+        if tool is None or state in (self.STATE_UNAVAILABLE, self.STATE_DISABLED):
+            return self._native(rb, joints_list)
+
+        local = self._forward(joints_list, tool)
+        if state == self.STATE_VERIFYING:
+            # 使用開始前はj2r_mtの結果を返し、照合だけ行う
+            results = self._native(rb, joints_list)
+            for native_res, local_res in zip(results, local):
+                self._verify(native_res, local_res)
+            return results
+
+        if verify:
+            # 使用開始後も定期的に照合し、不一致の場合はj2r_mtに戻す
+            native_res = self._native(rb, joints_list[:1])[0]
+            if not self._verify(native_res, local[0]):
+                return [native_res] + self._native(rb, joints_list[1:])
+
+        with self._lock:
+            self._local_count += len(local)
+        return local
+
+    def forward(self, joints_list, tool):
+        """
+        j2r_mtと照合せずにDHパラメータで順運動学を計算
+        NumPyが必要
+
+        引数:
+            joints_list: J1～J6 (deg)のリスト
+            tool: ツールオフセット(FSRoboRModalState.active_tool()と同じ形式)
+        戻り値:
+            results: j2r_mtと同じ形式の結果のリスト
+        """
+        return self._forward(joints_list, tool)
+
+    def _native(self, rb, joints_list):
+        """
+        j2r_mtで変換
+        """
+        with self._lock:
+            self._native_count += len(joints_list)
+        return [rb.j2r_mt(j[0], j[1], j[2], j[3], j[4], j[5], self._RBCOORD_LINE) for j in joints_list]
+
+    def _verify(self, native_res, local_res):
+        """
+        j2r_mtの結果とサーバー内の計算結果を照合し、状態を更新する
+
+        戻り値:
+            True: 一致
+            False: 不一致
+        """
+        if native_res[0] == False:
+            # 変換できない軸情報は照合しない
+            return True
+
+        match = native_res[7] == local_res[7]
+        for index in range(1, 4):
+            if abs(native_res[index] - local_res[index]) > self._POSITION_TOLERANCE:
+                match = False
+        # 特異点付近ではオイラー角が一意に決まらないため回転行列で比較する
+        native_rot = self._pose_matrix((0.0, 0.0, 0.0) + tuple(native_res[4:7]))
+        local_rot = self._pose_matrix((0.0, 0.0, 0.0) + tuple(local_res[4:7]))
+        if numpy.abs(native_rot - local_rot).max() > math.radians(self._ANGLE_TOLERANCE):
+            match = False
+
+        with self._lock:
+            if match:
+                if self._state == self.STATE_VERIFYING:
+                    self._matches += 1
+                    if self._matches >= self._VERIFY_SAMPLES:
+                        print("local kinematics model verified")
+                        self._state = self.STATE_TRUSTED
+            else:
+                print("local kinematics model diverged: native {} local {}".format(native_res, local_res))
+                self._mismatch_count += 1
+                self._state = self.STATE_DISABLED
+        return match
+
+    def _forward(self, joints_list, tool):
+        """
+        NumPyで順運動学を計算
+
+        引数:
+            joints_list: J1～J6 (deg)のリスト
+            tool: 使用中のツールオフセット
+        戻り値:
+            results: j2r_mtと同じ形式の結果のリスト
+        """
+        joints = numpy.radians(numpy.asarray(joints_list, dtype=numpy.float64))
+        count = joints.shape[0]
+        transform = numpy.tile(numpy.eye(4), (count, 1, 1))
+        wrist = None
+        for axis, (a, alpha, d, offset) in enumerate(self._parameters):
+            theta = joints[:, axis] + math.radians(offset)
+            ct = numpy.cos(theta)
+            st = numpy.sin(theta)
+            ca = math.cos(math.radians(alpha))
+            sa = math.sin(math.radians(alpha))
+            link = numpy.zeros((count, 4, 4))
+            link[:, 0, 0] = ct
+            link[:, 0, 1] = -st * ca
+            link[:, 0, 2] = st * sa
+            link[:, 0, 3] = a * ct
+            link[:, 1, 0] = st
+            link[:, 1, 1] = ct * ca
+            link[:, 1, 2] = -ct * sa
+            link[:, 1, 3] = a * st
+            link[:, 2, 1] = sa
+            link[:, 2, 2] = ca
+            link[:, 2, 3] = d
+            link[:, 3, 3] = 1.0
+            transform = numpy.einsum("nij,njk->nik", transform, link)
+            if axis == 4:
+                # 手首中心の位置を姿勢情報の判定に使用する
+                wrist = transform[:, :3, 3].copy()
+
+        if tool[0] != 0:
+            transform = numpy.einsum("nij,jk->nik", transform, self._pose_matrix(tool[1:]))
+
+        rot = transform[:, :3, :3]
+        rz = numpy.degrees(numpy.arctan2(rot[:, 1, 0], rot[:, 0, 0]))
+        ry = numpy.degrees(numpy.arctan2(-rot[:, 2, 0], numpy.hypot(rot[:, 0, 0], rot[:, 1, 0])))
+        rx = numpy.degrees(numpy.arctan2(rot[:, 2, 1], rot[:, 2, 2]))
+        posture = self._posture(joints, wrist)
+
+        position = transform[:, :3, 3]
+        return [(True, float(position[n, 0]), float(position[n, 1]), float(position[n, 2]),
+                 float(rz[n]), float(ry[n]), float(rx[n]), int(posture[n])) for n in range(count)]
+
+    def _posture(self, joints, wrist):
+        """
+        姿勢情報を計算
+        ビット0: 手首(J5が正)、ビット1: 肘(J3が正)、ビット2: 肩(手首中心がJ1の前方)
+        """
+        front = wrist[:, 0] * numpy.cos(joints[:, 0]) + wrist[:, 1] * numpy.sin(joints[:, 0]) >= 0.0
+        posture = numpy.where(joints[:, 4] >= 0.0, self._POSTURE_WRIST, 0)
+        posture = posture | numpy.where(joints[:, 2] >= 0.0, self._POSTURE_ELBOW, 0)
+        posture = posture | numpy.where(front, self._POSTURE_SHOULDER, 0)
+        return posture
+
+    @staticmethod
+    def _pose_matrix(pose):
+        """
+        座標(X, Y, Z, Rz, Ry, Rx)を同次変換行列に変換
+        """
+        x, y, z, rz, ry, rx = pose
+        cz, sz = math.cos(math.radians(rz)), math.sin(math.radians(rz))
+        cy, sy = math.cos(math.radians(ry)), math.sin(math.radians(ry))
+        cx, sx = math.cos(math.radians(rx)), math.sin(math.radians(rx))
+        return numpy.array([
+            [cz * cy, cz * sy * sx - sz * cx, cz * sy * cx + sz * sx, x],
+            [sz * cy, sz * sy * sx + cz * cx, sz * sy * cx - cz * sx, y],
+            [-sy, cy * sx, cy * cx, z],
+            [0.0, 0.0, 0.0, 1.0]
+        ])
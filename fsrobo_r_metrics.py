@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+CCサーバーの稼働状況を計測するモジュール
+コマンド、エラーコード、rblibの関数、接続、プログラム実行の回数と処理時間の分布を記録する
+
+記録はスレッドごとの領域に行い、取得時に全スレッド分を合算する
+記録時にロックを使用しないため、常時有効にしておくことができる
+取得中に記録された値は一部の項目にのみ反映される場合がある
+"""
+
+import bisect
+import threading
+import time
+import fsrobo_r_trace
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+from fsrobo_r_trace import FSRoboRTracer
+
+# 回数を記録する分類
+GROUP_ERROR = "ERR"
+GROUP_CONNECTION = "CON"
+# 回数と処理時間を記録する分類
+GROUP_COMMAND = "CMD"
+GROUP_RBLIB = "RB"
+GROUP_PROGRAM = "PRG"
+
+# 接続の記録名
+CONNECTION_ACCEPT = "ACCEPT"
+CONNECTION_REJECT = "REJECT"
+CONNECTION_OBSERVER_ACCEPT = "OBSERVER_ACCEPT"
+CONNECTION_OBSERVER_REJECT = "OBSERVER_REJECT"
+
+
+def constant_names(module):
+    """
+    定数定義モジュールの値と名前の対応表を作成
+
+    引数:
+        module: CommandID、ErrorCodeなど整数の定数を定義したモジュール
+    戻り値:
+        names: 値ごとの定数名
+    """
+    return dict((value, name) for name, value in vars(module).items()
+                if name.isupper() and isinstance(value, int))
+
+
+class _Shard(object):
+    """
+    1スレッド分の記録領域
+    書き込みは所有するスレッドのみが行う
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class FSRoboRMetrics(FSRoboRSharedInstance):
+    """
+    稼働状況の計測クラス
+    """
+
+    # 処理時間の分布の区切り(秒) 最後の区切りを超えた値は最終区間に数える
+    BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+               0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+    # 処理時間の記録の並び [回数, 失敗回数, 合計時間, 区間ごとの回数...]
+    _HIST_COUNT = 0
+    _HIST_FAILED = 1
+    _HIST_TOTAL = 2
+    _HIST_BUCKET = 3
+
+    def __init__(self):
+        """
+        初期化
+        """
+        self._started = time.time()
+        self._local = threading.local()
+        # 領域の登録と合算のみロックする
+        self._lock = threading.Lock()
+        self._shards = []
+        # 終了したスレッドの記録
+        self._retired = _Shard()
+
+    def _shard(self):
+        """
+        呼び出し元スレッドの記録領域を取得
+        """
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = _Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def count(self, group, name, value=1):
+        """
+        回数を記録する
+
+        引数:
+            group: 分類 GROUP_ERROR, GROUP_CONNECTION
+            name: 記録名
+            value: 加算する回数
+        """
+        counters = self._shard().counters
+        key = (group, name)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, group, name, seconds, failed=False):
+        """
+        回数と処理時間を記録する
+
+        引数:
+            group: 分類 GROUP_COMMAND, GROUP_RBLIB, GROUP_PROGRAM
+            name: 記録名
+            seconds: 処理時間(秒)
+            failed: 失敗した場合True
+        """
+        histograms = self._shard().histograms
+        key = (group, name)
+        entry = histograms.get(key)
+        if entry is None:
+            entry = [0, 0, 0.0] + [0] * (len(self.BUCKETS) + 1)
+            histograms[key] = entry
+        entry[self._HIST_COUNT] += 1
+        if failed:
+            entry[self._HIST_FAILED] += 1
+        entry[self._HIST_TOTAL] += seconds
+        entry[self._HIST_BUCKET + bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def snapshot(self):
+        """
+        全スレッドの記録を合算して取得
+
+        戻り値:
+            snapshot: JSON形式
+                UP: 計測開始からの経過時間(秒)
+                BK: 処理時間の分布の区切り(ms)
+                ERR, CON: 記録名ごとの回数
+                CMD, RB, PRG: 記録名ごとの処理時間
+                    N: 回数
+                    E: 失敗回数
+                    T: 合計時間(秒)
+                    H: 区間ごとの回数 要素数はBKより1つ多い
+        """
+        with self._lock:
+            # 終了したスレッドの記録は1つにまとめて、領域の数が増え続けないようにする
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+
+            total = _Shard()
+            self._merge(total, self._retired)
+            for _, shard in alive:
+                self._merge(total, shard)
+
+        result = {
+            "UP": time.time() - self._started,
+            "BK": [bound * 1000.0 for bound in self.BUCKETS]
+        }
+        for group in (GROUP_ERROR, GROUP_CONNECTION, GROUP_COMMAND, GROUP_RBLIB, GROUP_PROGRAM):
+            result[group] = {}
+        for (group, name), value in total.counters.items():
+            result[group][name] = value
+        for (group, name), entry in total.histograms.items():
+            result[group][name] = {
+                "N": entry[self._HIST_COUNT],
+                "E": entry[self._HIST_FAILED],
+                "T": entry[self._HIST_TOTAL],
+                "H": entry[self._HIST_BUCKET:]
+            }
+        return result
+
+    @staticmethod
+    def _merge(dest, shard):
+        """
+        記録領域を合算する
+        他のスレッドが書き込み中の領域も読めるよう、各値を複製してから加算する
+        """
+        for key, value in shard.counters.items():
+            dest.counters[key] = dest.counters.get(key, 0) + value
+        for key, entry in shard.histograms.items():
+            entry = list(entry)
+            merged = dest.histograms.get(key)
+            if merged is None:
+                dest.histograms[key] = entry
+            else:
+                for index, value in enumerate(entry):
+                    merged[index] += value
+
+
+class MeteredRobot(object):
+    """
+    rblibのRobotの関数ごとの呼び出し回数と処理時間を記録するラッパー
+    結果の先頭がFalseの場合は失敗として記録する
+    トレースが有効な場合は呼び出し区間も記録する
+    """
+
+    def __init__(self, robot, metrics=None):
+        """
+        初期化
+
+        引数:
+            robot: rblibのRobotオブジェクト
+            metrics: 記録先 ※省略時は共有インスタンス
+        """
+        self._robot = robot
+        self._metrics = metrics if metrics is not None else FSRoboRMetrics.get_instance()
+        self._tracer = FSRoboRTracer.get_instance()
+
+    def __getattr__(self, name):
+        func = getattr(self._robot, name)
+        if not callable(func):
+            return func
+        metrics = self._metrics
+        tracer = self._tracer
+        span_name = "rblib." + name
+
+        def metered(*args, **kwargs):
+            start = time.time()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = isinstance(result, tuple) and len(result) > 0 and result[0] is False
+                return result
+            finally:
+                end = time.time()
+                metrics.observe(GROUP_RBLIB, name, end - start, failed)
+                if tracer.enabled:
+                    tracer.complete(span_name, fsrobo_r_trace.CATEGORY_RBLIB, start, end)
+
+        # 2回目以降は__getattr__を経由しない
+        setattr(self, name, metered)
+        return metered
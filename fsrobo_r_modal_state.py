@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+"""
+コントローラのモーダル設定のシャドウを管理するモジュール
+"""
+
+import threading
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+from fsrobo_r_trace import FSRoboRTracer
+
+
+class FSRoboRModalState(FSRoboRSharedInstance):
+    """
+    モーダル設定シャドウクラス
+    コントローラに最後に適用したツール、asyncm、passm、overlap、zone、MDOの値を保持し、
+    変更が必要な設定のみをrblibに発行する
+    全セッションとプログラム実行で1つのインスタンスを共有する
+    """
+
+    # シャドウ対象の設定(値はrblibの関数名)
+    TOOL = "changetool"
+    ASYNCM = "asyncm"
+    PASSM = "passm"
+    OVERLAP = "overlap"
+    ZONE = "zone"
+    MDO = "disable_mdo"
+    # ツールオフセットの定義 値は(ツールID, X, Y, Z, Rz, Ry, Rx)
+    TOOL_OFFSET = "settool"
+
+    # 変更が無い場合に返す結果
+    _RESULT_SUCCESS = (True,)
+
+    def __init__(self):
+        """
+        初期化
+        """
+        # シャドウの参照と更新の排他 rblibの呼び出し中は保持しない
+        self._lock = threading.RLock()
+        # 設定を適用するスレッドの排他 動作完了待ちの間も他のスレッドのシャドウ参照を妨げない
+        self._apply_lock = threading.Lock()
+        self._state = {}
+        # 破棄した回数 適用中に破棄された場合は適用結果をシャドウに記録しない
+        self._generation = 0
+
+    def invalidate(self):
+        """
+        シャドウを破棄する
+        サーバー外部で設定が変更された可能性がある場合(プログラム実行、再接続)に使用
+        """
+        with self._lock:
+            self._state.clear()
+            self._generation += 1
+
+    def get(self, name):
+        """
+        最後に適用した設定値を取得
+
+        引数:
+            name: 設定名
+        戻り値:
+            value: 設定値 不明な場合はNone
+        """
+        with self._lock:
+            return self._state.get(name)
+
+    def record(self, name, value):
+        """
+        apply以外でコントローラに適用した設定値を記録
+
+        引数:
+            name: 設定名
+            value: 設定値 Noneの場合は不明とする
+        """
+        with self._lock:
+            if value is None:
+                self._state.pop(name, None)
+            else:
+                self._state[name] = value
+
+    def active_tool(self):
+        """
+        使用中のツールオフセットを取得
+
+        戻り値:
+            tool: ツールID 0以外の場合はツールオフセットの定義 不明な場合はNone
+        """
+        with self._lock:
+            tool_id = self._state.get(self.TOOL)
+            if tool_id is None:
+                return None
+            if tool_id == 0:
+                return (tool_id,)
+            offset = self._state.get(self.TOOL_OFFSET)
+            if offset is None or offset[0] != tool_id:
+                return None
+            return offset
+
+    def changes(self, settings):
+        """
+        未適用の設定を抽出
+
+        引数:
+            settings: (設定名, 値)のリスト
+        戻り値:
+            changes: 変更が必要な(設定名, 値)のリスト
+        """
+        with self._lock:
+            return [(name, value) for name, value in settings
+                    if name not in self._state or self._state[name] != value]
+
+    def apply(self, rb, settings, join=False):
+        """
+        設定を適用する
+        シャドウと値が一致する設定はrblibを呼び出さない
+        適用するスレッド同士は排他するが、rblibの呼び出し中もシャドウの参照は妨げない
+
+        引数:
+            rb: 設定に使用するrblibのRobotオブジェクト
+            settings: (設定名, 値)のリスト 指定順に適用する
+            join: 変更がある場合、適用前にjoinmで移動完了を待つか
+        戻り値:
+            result: 最後に失敗したrblibの結果 全て成功した場合は(True,)
+        """
+        with self._apply_lock:
+            with self._lock:
+                changes = self.changes(settings)
+                generation = self._generation
+            if len(changes) == 0:
+                return self._RESULT_SUCCESS
+
+            with FSRoboRTracer.get_instance().span("modal.apply"):
+                if join:
+                    rb.joinm()
+
+                result = self._RESULT_SUCCESS
+                for name, value in changes:
+                    res = getattr(rb, name)(value)
+                    succeeded = self._succeeded(res)
+                    if not succeeded:
+                        result = res
+                    with self._lock:
+                        if self._generation != generation:
+                            # 適用中に破棄された場合はコントローラの設定が不明
+                            continue
+                        if succeeded:
+                            self._state[name] = value
+                        else:
+                            # 失敗した設定は状態が不明になるため破棄
+                            self._state.pop(name, None)
+            return result
+
+    @staticmethod
+    def _succeeded(result):
+        """
+        rblibの結果が成功かを判断
+        """
+        if isinstance(result, (tuple, list)) and len(result) > 0:
+            return result[0] != False
+        return True
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+マニピュレータの動作時間を見積もるモジュール
+"""
+
+import math
+import threading
+import time
+
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+
+
+class FSRoboRMotionEstimator(FSRoboRSharedInstance):
+    """
+    動作時間見積もりクラス
+    台形の速度プロファイルで動作時間を計算し、サーバーが計測した実際の動作時間との比で補正する
+    最後に同期動作で移動した位置を保持し、計測した動作時間の補正に使用する
+    """
+
+    # 速度プロファイルのモデル
+    MODEL_PTP = "PTP"
+    MODEL_LINE = "LINE"
+
+    # 補正比率の更新の重み(指数移動平均)
+    _CALIBRATION_WEIGHT = 0.2
+    # 補正に使用する計測値の範囲(計測値/計算値) 停止などで外れた計測値は使用しない
+    _CALIBRATION_RATIO_MIN = 0.5
+    _CALIBRATION_RATIO_MAX = 3.0
+    # 補正に使用する計算値の最小値(秒) 短い動作は通信時間の影響が大きいため使用しない
+    _CALIBRATION_TIME_MIN = 0.05
+    # 補正済みとみなす計測数 少ない間は見積もりが軸の仕様の値のみに基づく
+    _CALIBRATION_SAMPLES_MIN = 5
+
+    def __init__(self):
+        """
+        初期化
+        """
+        self._lock = threading.Lock()
+        self._ratio = {self.MODEL_PTP: 1.0, self.MODEL_LINE: 1.0}
+        self._samples = {self.MODEL_PTP: 0, self.MODEL_LINE: 0}
+        self._joints = None
+        self._pose = None
+        self._position_time = None
+
+    @staticmethod
+    def profile_time(distance, speed, acctime, dacctime):
+        """
+        台形の速度プロファイルで移動時間を計算する
+        最高速度に達しない場合は三角形の速度プロファイルとする
+
+        引数:
+            distance: 移動量
+            speed: 最高速度(移動量/秒)
+            acctime: 最高速度までの加速時間(秒)
+            dacctime: 最高速度からの減速時間(秒)
+        戻り値:
+            time: 移動時間(秒)
+        """
+        if distance <= 0.0:
+            return 0.0
+        if speed <= 0.0:
+            raise ValueError("speed must be positive")
+        ramp = (acctime + dacctime) / 2.0
+        if distance >= speed * ramp:
+            return distance / speed + ramp
+        peak = math.sqrt(2.0 * distance * speed / (acctime + dacctime))
+        return peak * (acctime + dacctime) / speed
+
+    def ptp_time(self, start, target, speed_limits, acctime, dacctime):
+        """
+        PTP動作の移動時間を計算する
+        最も時間のかかる軸に他の軸が同期するものとする
+
+        引数:
+            start: 開始位置の軸情報(J1～J6)
+            target: 目標位置の軸情報(J1～J6)
+            speed_limits: 軸ごとの最高速度(deg/s)
+            acctime: 加速時間(秒)
+            dacctime: 減速時間(秒)
+        戻り値:
+            time: 移動時間(秒)
+        """
+        return max(self.profile_time(abs(end - begin), limit, acctime, dacctime)
+                   for begin, end, limit in zip(start, target, speed_limits))
+
+    def line_time(self, start, target, speed, acctime, dacctime):
+        """
+        直線補間動作の移動時間を計算する
+        手先の移動距離のみを考慮し、角度の変化は考慮しない
+
+        引数:
+            start: 開始位置の座標情報(X, Y, Z, ...)
+            target: 目標位置の座標情報(X, Y, Z, ...)
+            speed: 速度(mm/s)
+            acctime: 加速時間(秒)
+            dacctime: 減速時間(秒)
+        戻り値:
+            time: 移動時間(秒)
+        """
+        distance = math.sqrt(sum((end - begin) ** 2 for begin, end in zip(start[:3], target[:3])))
+        return self.profile_time(distance, speed, acctime, dacctime)
+
+    def estimate(self, model, time):
+        """
+        計算した移動時間を補正する
+
+        引数:
+            model: 速度プロファイルのモデル
+            time: 計算した移動時間(秒)
+        戻り値:
+            time: 補正した移動時間(秒)
+        """
+        with self._lock:
+            return time * self._ratio[model]
+
+    def calibrate(self, model, time, measured):
+        """
+        計測した移動時間で補正比率を更新する
+
+        引数:
+            model: 速度プロファイルのモデル
+            time: 計算した移動時間(秒)
+            measured: 計測した移動時間(秒)
+        戻り値:
+            True: 更新した
+            False: 補正に使用できない計測値のため更新しなかった
+        """
+        if time < self._CALIBRATION_TIME_MIN:
+            return False
+        ratio = measured / time
+        if ratio < self._CALIBRATION_RATIO_MIN or ratio > self._CALIBRATION_RATIO_MAX:
+            return False
+        with self._lock:
+            if self._samples[model] == 0:
+                self._ratio[model] = ratio
+            else:
+                self._ratio[model] += (ratio - self._ratio[model]) * self._CALIBRATION_WEIGHT
+            self._samples[model] += 1
+        return True
+
+    def position(self, max_age=None):
+        """
+        最後に同期動作で移動した位置を取得
+
+        引数:
+            max_age: 記録してからの経過時間の上限(秒) 超えた場合は不明とする ※省略時は上限なし
+        戻り値:
+            joints: 軸情報 不明な場合はNone
+            pose: 座標情報(X, Y, Z, Rz, Ry, Rx, 姿勢情報) 不明な場合はNone
+        """
+        with self._lock:
+            if max_age is not None and (self._position_time is None
+                                        or time.time() - self._position_time > max_age):
+                return None, None
+            return self._joints, self._pose
+
+    def set_position(self, joints, pose):
+        """
+        同期動作で移動した位置を記録
+
+        引数:
+            joints: 軸情報 不明な場合はNone
+            pose: 座標情報(X, Y, Z, Rz, Ry, Rx, 姿勢情報) 不明な場合はNone
+        """
+        with self._lock:
+            self._joints = joints
+            self._pose = pose
+            self._position_time = time.time()
+
+    def invalidate(self):
+        """
+        記録した位置を破棄する
+        非同期動作、中断、プログラム実行などで位置が不明になった場合に使用
+        """
+        self.set_position(None, None)
+
+    def stats(self):
+        """
+        補正の状態を取得
+
+        戻り値:
+            stats: モデルごとの状態
+                R: 補正比率(計測値/計算値)
+                N: 補正に使用した計測数
+                C: 1: 補正済み 0: 計測数が_CALIBRATION_SAMPLES_MIN未満で未補正
+        """
+        with self._lock:
+            return dict((model, {"R": self._ratio[model], "N": self._samples[model],
+                                 "C": int(self._samples[model] >= self._CALIBRATION_SAMPLES_MIN)})
+                        for model in self._ratio)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+数値配列をパックしたバイナリで受け渡すためのモジュール
+JSONでは {"T": 型, "S": 形状, "D": base64文字列} の形式で表す
+バイトオーダーはリトルエンディアン
+"""
+
+import base64
+import struct
+
+# 使用できる型(structの書式文字)と1要素のバイトサイズ
+TYPE_SIZES = {
+    "d": 8,
+    "f": 4,
+    "i": 4,
+    "I": 4,
+    "h": 2,
+    "H": 2,
+    "b": 1,
+    "B": 1
+}
+
+# JSONタグ
+_TAG_TYPE = "T"
+_TAG_SHAPE = "S"
+_TAG_DATA = "D"
+
+
+def _count(shape):
+    """
+    形状から要素数を求める
+    """
+    count = 1
+    for size in shape:
+        count *= size
+    return count
+
+
+def decode(spec):
+    """
+    JSON形式の配列をバイナリに変換
+
+    引数:
+        spec: T, S, Dを持つ辞書
+    戻り値:
+        type_code: 型
+        shape: 形状のリスト
+        data: パックされたバイナリ
+    """
+    type_code = str(spec[_TAG_TYPE])
+    if type_code not in TYPE_SIZES:
+        raise ValueError("unknown type: {}".format(type_code))
+    shape = [int(size) for size in spec[_TAG_SHAPE]]
+    if any(size < 0 for size in shape):
+        raise ValueError("invalid shape")
+    try:
+        data = base64.b64decode(spec[_TAG_DATA])
+    except TypeError:
+        raise ValueError("invalid base64 data")
+    if len(data) != _count(shape) * TYPE_SIZES[type_code]:
+        raise ValueError("data size does not match shape")
+    return type_code, shape, data
+
+
+def encode(type_code, shape, data):
+    """
+    バイナリをJSON形式の配列に変換
+
+    引数:
+        type_code: 型
+        shape: 形状のリスト
+        data: パックされたバイナリ
+    戻り値:
+        spec: T, S, Dを持つ辞書
+    """
+    return {
+        _TAG_TYPE: type_code,
+        _TAG_SHAPE: list(shape),
+        _TAG_DATA: base64.b64encode(data).decode("ascii")
+    }
+
+
+def unpack_rows(type_code, shape, data):
+    """
+    2次元のバイナリを行ごとのタプルのリストに変換
+
+    引数:
+        type_code: 型
+        shape: [行数, 列数]
+        data: パックされたバイナリ
+    戻り値:
+        rows: 行ごとのタプルのリスト
+    """
+    rows, cols = shape
+    values = struct.unpack("<{}{}".format(rows * cols, type_code), data)
+    return [values[index:index + cols] for index in range(0, rows * cols, cols)]
+
+
+def pack_rows(type_code, rows, cols):
+    """
+    行ごとの値のリストを2次元のバイナリに変換
+
+    引数:
+        type_code: 型
+        rows: 行ごとの値のリスト
+        cols: 列数
+    戻り値:
+        shape: [行数, 列数]
+        data: パックされたバイナリ
+    """
+    values = []
+    for row in rows:
+        values.extend(row)
+    return [len(rows), cols], struct.pack("<{}{}".format(len(values), type_code), *values)
+
+
+def unpack_values(type_code, shape, data):
+    """
+    バイナリを1次元の値のリストに変換
+
+    引数:
+        type_code: 型
+        shape: 形状
+        data: パックされたバイナリ
+    戻り値:
+        values: 値のリスト
+    """
+    return list(struct.unpack("<{}{}".format(_count(shape), type_code), data))
+
+
+def pack_values(type_code, values):
+    """
+    値のリストを1次元のバイナリに変換
+
+    引数:
+        type_code: 型
+        values: 値のリスト
+    戻り値:
+        shape: [要素数]
+        data: パックされたバイナリ
+    """
+    return [len(values)], struct.pack("<{}{}".format(len(values), type_code), *values)
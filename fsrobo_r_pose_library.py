@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+名前を付けて登録した座標情報(ポーズ)を管理するモジュール
+"""
+
+import json
+import os
+import threading
+
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+
+
+class FSRoboRPoseLibrary(FSRoboRSharedInstance):
+    """
+    ポーズライブラリクラス
+    ポーズの座標情報と、ツールオフセットと姿勢情報ごとの軸情報を保持し、ファイルに保存する
+    """
+
+    # ポーズの座標情報のキー
+    POSE_KEYS = ("X", "Y", "Z", "Rx", "Ry", "Rz", "P")
+
+    # 保存先のファイルを変更する環境変数名
+    # 既定ではソースのフォルダが読み込み専用でも保存できるよう、ホームのデータフォルダに保存する
+    _LIBRARY_FILE_ENV = "FSROBO_R_CC_POSE_FILE"
+    _LIBRARY_FILE = os.path.join(os.path.expanduser("~"), ".fsrobo_r", "fsrobo_r_poses.json")
+    _FILE_VERSION = 1
+
+    @classmethod
+    def _create_instance(cls):
+        """
+        共有インスタンスを生成する
+        環境変数_LIBRARY_FILE_ENVが設定されている場合はそのファイルに保存する
+        """
+        return cls(os.environ.get(cls._LIBRARY_FILE_ENV, cls._LIBRARY_FILE))
+
+    def __init__(self, path=_LIBRARY_FILE):
+        """
+        初期化
+        ファイルが存在する場合は読み込む
+
+        引数:
+            path: 保存先のファイル
+        """
+        self._lock = threading.Lock()
+        self._path = path
+        self._poses = {}
+        self._solutions = {}
+        if os.path.exists(path):
+            self._load()
+
+    def get(self, name):
+        """
+        ポーズの座標情報を取得
+
+        引数:
+            name: ポーズ名
+        戻り値:
+            pose: 座標情報(X, Y, Z, Rx, Ry, Rz, P) 登録されていない場合はNone
+        """
+        with self._lock:
+            pose = self._poses.get(name)
+            return dict(pose) if pose is not None else None
+
+    def poses(self):
+        """
+        全てのポーズを取得
+
+        戻り値:
+            poses: ポーズ名ごとの座標情報
+        """
+        with self._lock:
+            return dict((name, dict(pose)) for name, pose in self._poses.items())
+
+    def set(self, name, pose):
+        """
+        ポーズを登録または更新し、ファイルに保存する
+        更新した場合は保持している軸情報を破棄する
+
+        引数:
+            name: ポーズ名
+            pose: 座標情報(X, Y, Z, Rx, Ry, Rz, P)
+        """
+        with self._lock:
+            self._poses[name] = dict((key, pose[key]) for key in self.POSE_KEYS)
+            self._solutions[name] = {}
+            self._save()
+
+    def delete(self, name):
+        """
+        ポーズを削除し、ファイルに保存する
+
+        引数:
+            name: ポーズ名
+        戻り値:
+            True: 削除した
+            False: 登録されていない
+        """
+        with self._lock:
+            if name not in self._poses:
+                return False
+            del self._poses[name]
+            del self._solutions[name]
+            self._save()
+            return True
+
+    def joints(self, name, tool, posture):
+        """
+        ポーズの軸情報を取得
+
+        引数:
+            name: ポーズ名
+            tool: ツールオフセット(FSRoboRModalState.active_tool()の値)
+            posture: 姿勢情報
+        戻り値:
+            joints: 軸情報 計算されていない場合はNone
+        """
+        with self._lock:
+            return self._solutions.get(name, {}).get((tool, posture))
+
+    def store_joints(self, name, tool, posture, joints, save=False):
+        """
+        ポーズの軸情報を保持する
+
+        引数:
+            name: ポーズ名
+            tool: ツールオフセット(FSRoboRModalState.active_tool()の値)
+            posture: 姿勢情報
+            joints: 軸情報
+            save: ファイルに保存するか ※省略時は次の登録、削除時に保存する
+        """
+        with self._lock:
+            if name not in self._poses:
+                return
+            self._solutions[name][(tool, posture)] = tuple(joints)
+            if save:
+                self._save()
+
+    def _load(self):
+        """
+        ファイルから読み込む
+        """
+        with open(self._path) as f:
+            data = json.load(f)
+        for name, entry in data["POSES"].items():
+            self._poses[name] = dict((key, entry[key]) for key in self.POSE_KEYS)
+            self._solutions[name] = dict(((tuple(tool), posture), tuple(joints))
+                                         for tool, posture, joints in entry.get("J", []))
+
+    def _save(self):
+        """
+        ファイルに保存する
+        書き込み途中で停止しても既存のファイルが壊れないように、一時ファイルを置き換える
+        """
+        poses = {}
+        for name, pose in self._poses.items():
+            entry = dict(pose)
+            entry["J"] = [[list(tool), posture, list(joints)]
+                          for (tool, posture), joints in self._solutions[name].items()]
+            poses[name] = entry
+        folder_path = os.path.dirname(self._path)
+        if not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"VERSION": self._FILE_VERSION, "POSES": poses}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_path, self._path)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+CCサーバーから実行されたプログラムがパラメータを取得するためのモジュール
+
+使い方:
+    import fsrobo_r_program_param
+    param = fsrobo_r_program_param.get_param()
+    poses = fsrobo_r_program_param.get_array("POSES")
+
+パラメータのJSONは一度だけ解析して共有する
+数値配列は共有メモリ上のパックされたバイナリを参照するため、NumPyがある場合はコピーしない
+NumPyは数値配列を取得する場合のみ読み込む
+"""
+
+import json
+import struct
+import sys
+
+try:
+    _buffer = buffer
+except NameError:
+    def _buffer(obj, offset, size):
+        return memoryview(obj)[offset:offset + size]
+
+# CCサーバーから受信したパラメータ
+_param_text = None
+_param = None
+# 数値配列の配置 名前: (型, 形状, オフセット, バイトサイズ)
+_arrays = {}
+# 数値配列を格納した共有メモリ
+_memory = None
+
+
+def _import_numpy():
+    """
+    NumPyを読み込む
+    数値配列を使用しないプログラムで読み込み時間がかからないよう、初めて使用する時に読み込む
+
+    戻り値:
+        numpy: numpyモジュール 無い場合はNone
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    return numpy
+
+
+def _set_job(param_text, arrays, memory):
+    """
+    受信したジョブを設定する
+    fsrobo_r_program_runnerから呼び出す
+
+    引数:
+        param_text: パラメータ JSON形式
+        arrays: 数値配列の配置
+        memory: 数値配列を格納した共有メモリ
+    """
+    global _param_text, _param, _arrays, _memory
+    _param_text = param_text
+    _param = None
+    _arrays = arrays
+    _memory = memory
+
+
+def get_param():
+    """
+    パラメータを取得
+
+    戻り値:
+        param: JSONを解析したパラメータ
+    """
+    global _param
+    if _param is None:
+        if _param_text is not None:
+            _param = json.loads(_param_text)
+        elif len(sys.argv) > 1:
+            # CCサーバー以外から直接実行された場合
+            _param = json.loads(sys.argv[1])
+        else:
+            _param = {}
+    return _param
+
+
+def array_names():
+    """
+    受信した数値配列の名前の一覧を取得
+
+    戻り値:
+        names: 名前のリスト
+    """
+    return list(_arrays.keys())
+
+
+def get_buffer(name):
+    """
+    数値配列のバイナリを取得
+    共有メモリを直接参照するためコピーしない
+
+    引数:
+        name: 配列名
+    戻り値:
+        type_code: 型(structの書式文字)
+        shape: 形状のリスト
+        data: リトルエンディアンでパックされたバイナリ
+    """
+    type_code, shape, offset, size = _arrays[name]
+    return type_code, shape, _buffer(_memory, offset, size)
+
+
+def get_array(name):
+    """
+    数値配列を取得
+    NumPyがある場合は共有メモリを直接参照するndarrayを返し、
+    無い場合は要素を展開した入れ子のリストを返す
+
+    引数:
+        name: 配列名
+    戻り値:
+        array: 数値配列
+    """
+    type_code, shape, offset, size = _arrays[name]
+    numpy = _import_numpy()
+    if numpy is not None:
+        dtype = numpy.dtype(type_code).newbyteorder("<")
+        count = size // dtype.itemsize
+        return numpy.frombuffer(_memory, dtype, count, offset).reshape(shape)
+
+    values = list(struct.unpack_from("<{}{}".format(size // struct.calcsize(type_code), type_code),
+                                     _memory, offset))
+    for dim in reversed(shape[1:]):
+        values = [values[index:index + dim] for index in range(0, len(values), dim)]
+    return values
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+"""
+受信したプログラムを子プロセス内で実行するモジュール
+プログラムのrblib呼び出し回数とリソース使用量を計測し、親プロセスに通知する
+
+使い方:
+    python fsrobo_r_program_runner.py <プログラムのパス> <パラメータ>
+引数を省略した場合は、ジョブ受信用のファイルディスクリプタからプログラムのパスと
+パラメータを受信するまで待機する(事前起動)
+
+ジョブの形式:
+    ヘッダ(JSON) 改行 パラメータ(JSON)
+    ヘッダ
+        PATH: 実行するプログラムの絶対パス
+        FILE: 数値配列を格納した共有メモリのファイル ※数値配列がある場合のみ
+        BIN: 配列名ごとの[型, 形状, オフセット, バイトサイズ] ※数値配列がある場合のみ
+"""
+
+import sys
+import os
+import json
+import runpy
+import resource
+import fcntl
+import mmap
+import fsrobo_r_program_param
+
+# シミュレータを使用する環境変数名(fsrobo_r_rblib_sim.SIM_ENV)
+RBLIB_SIM_ENV = "FSROBO_R_RBLIB_SIM"
+# 計測結果を書き込むファイルディスクリプタの環境変数名
+STATS_FD_ENV = "FSROBO_R_CC_STATS_FD"
+# ジョブを受信するファイルディスクリプタの環境変数名
+JOB_FD_ENV = "FSROBO_R_CC_JOB_FD"
+
+
+def _install_call_counter(counts):
+    """
+    rblib.Robotの公開メソッドの呼び出し回数を数えるようにする
+    rblibが置き換えできない場合は何もしない
+
+    引数:
+        counts: メソッド名ごとの呼び出し回数 ※参照変数
+    戻り値:
+        True: 計測可能
+        False: 計測不可
+    """
+    try:
+        import rblib
+        robot_cls = rblib.Robot
+
+        def counted(name, func):
+            def wrapper(self, *args, **kwargs):
+                counts[name] = counts.get(name, 0) + 1
+                return func(self, *args, **kwargs)
+            return wrapper
+
+        names = [name for name in dir(robot_cls)
+                 if not name.startswith("_") and callable(getattr(robot_cls, name, None))]
+        methods = dict((name, counted(name, getattr(robot_cls, name))) for name in names)
+        rblib.Robot = type(robot_cls.__name__, (robot_cls,), methods)
+    except (ImportError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _set_cloexec(fd):
+    """
+    プログラムが起動する孫プロセスには引き継がない
+    """
+    fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+
+def _receive_job(job_fd):
+    """
+    親プロセスからジョブを受信する
+
+    引数:
+        job_fd: ジョブ受信用のファイルディスクリプタ
+    戻り値:
+        header: ジョブのヘッダ 取り消された場合はNone
+        param: パラメータ JSON形式
+    """
+    data = []
+    while True:
+        chunk = os.read(job_fd, 65536)
+        if len(chunk) == 0:
+            break
+        data.append(chunk)
+    os.close(job_fd)
+    if len(data) == 0:
+        return None, None
+    header, param = "".join(data).split("\n", 1)
+    return json.loads(header), param
+
+
+def _map_arrays(header):
+    """
+    数値配列を格納した共有メモリを読み込み専用で割り当てる
+
+    引数:
+        header: ジョブのヘッダ
+    戻り値:
+        arrays: 配列名ごとの(型, 形状, オフセット, バイトサイズ)
+        memory: 共有メモリ 数値配列が無い場合はNone
+    """
+    if "FILE" not in header:
+        return {}, None
+    with open(header["FILE"], "rb") as f:
+        memory = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = dict((str(name), (str(layout[0]), layout[1], layout[2], layout[3]))
+                  for name, layout in header["BIN"].items())
+    return arrays, memory
+
+
+def _report(stats_fd, counts, counting):
+    """
+    計測結果を親プロセスに通知する
+    """
+    if stats_fd is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    stats = {
+        "CPU_U": usage.ru_utime,
+        "CPU_S": usage.ru_stime,
+        "RSS": usage.ru_maxrss,
+        "CALLS": sum(counts.values()) if counting else None,
+        "CALLS_BY": counts if counting else None
+    }
+    try:
+        os.write(stats_fd, json.dumps(stats))
+        os.close(stats_fd)
+    except OSError:
+        pass
+
+
+def main():
+    """
+    main関数
+    """
+    stats_fd = os.environ.pop(STATS_FD_ENV, None)
+    if stats_fd is not None:
+        stats_fd = int(stats_fd)
+        _set_cloexec(stats_fd)
+
+    # ジョブ受信前にrblibの読み込みを済ませておく
+    # 環境変数が設定されている場合はシミュレータを使用する(FSROBO_R_RBLIB_SIM=localの場合はプロセスごとに独立)
+    # シミュレータはNumPyや運動学を読み込むため、使用しない場合は読み込まない
+    if os.environ.get(RBLIB_SIM_ENV):
+        import fsrobo_r_rblib_sim
+        fsrobo_r_rblib_sim.install_from_env()
+    counts = {}
+    counting = _install_call_counter(counts)
+
+    job_fd = os.environ.pop(JOB_FD_ENV, None)
+    if job_fd is not None:
+        job_fd = int(job_fd)
+        _set_cloexec(job_fd)
+        header, param = _receive_job(job_fd)
+        if header is None:
+            return
+        script = header["PATH"]
+        arrays, memory = _map_arrays(header)
+    else:
+        script = os.path.abspath(sys.argv[1])
+        param = sys.argv[2] if len(sys.argv) > 2 else "{}"
+        arrays, memory = {}, None
+    fsrobo_r_program_param._set_job(param, arrays, memory)
+
+    # 直接実行した場合と同じ作業フォルダ、引数、モジュール検索パスにする
+    script_dir, script_name = os.path.split(script)
+    os.chdir(script_dir)
+    sys.argv = [script_name, param]
+    sys.path[0] = script_dir
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        _report(stats_fd, counts, counting)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,603 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+rblibのシミュレータモジュール
+コントローラ無しでCCサーバー、コマンド、プログラム実行を動作させるため、
+rblib.Robotの代わりに軸情報、I/O、ADC、操作権、動作時間を模擬する
+順運動学と逆運動学はFSRoboRKinematicsのDHパラメータで計算するため、NumPyが必要
+
+使い方:
+    プロセス内で使用する場合
+        import fsrobo_r_rblib_sim
+        fsrobo_r_rblib_sim.install()
+        import rblib                # シミュレータのRobotを使用する
+    TCPサーバーとして起動する場合
+        python fsrobo_r_rblib_sim.py --port 12345 --latency 0.001 --jitter 0.0005
+        クライアント側は install(remote=True) で Robot(host, port) がサーバーに接続する
+    環境変数で切り替える場合(CCサーバーとプログラム実行用の子プロセス)
+        FSROBO_R_RBLIB_SIM=local: プロセス内のシミュレータを使用
+        FSROBO_R_RBLIB_SIM=tcp: TCPサーバーのシミュレータに接続
+        FSROBO_R_RBLIB_SIM_LATENCY: 呼び出しごとの遅延(秒)
+        FSROBO_R_RBLIB_SIM_JITTER: 遅延のばらつき(秒)
+        FSROBO_R_RBLIB_SIM_TIME_SCALE: 動作時間の倍率 0の場合は即時完了
+"""
+
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import fsrobo_r_frame
+from fsrobo_r_kinematics import FSRoboRKinematics
+from fsrobo_r_joint_spec import FSRoboRJointSpec
+from fsrobo_r_motion_estimator import FSRoboRMotionEstimator
+
+# シミュレータの切り替えに使用する環境変数名
+SIM_ENV = "FSROBO_R_RBLIB_SIM"
+LATENCY_ENV = "FSROBO_R_RBLIB_SIM_LATENCY"
+JITTER_ENV = "FSROBO_R_RBLIB_SIM_JITTER"
+TIME_SCALE_ENV = "FSROBO_R_RBLIB_SIM_TIME_SCALE"
+SIM_LOCAL = "local"
+SIM_TCP = "tcp"
+
+# 模擬するrblib.Robotのメソッド
+METHODS = (
+    "open", "close", "acq_permission", "rel_permission", "syssts", "ioctrl",
+    "jmark", "mark", "j2r_mt", "r2j_mt", "jntmove", "ptpmove", "ptpmove_mt", "cpmove",
+    "joinm", "abortm", "settool", "changetool", "asyncm", "passm", "overlap", "zone", "disable_mdo"
+)
+
+
+class SimController(object):
+    """
+    模擬コントローラクラス
+    複数のRobotオブジェクト(接続)で1つの状態を共有する
+    """
+
+    # エラー(エラー区分, エラーコード)
+    _ERROR_PERMISSION = (3, 1)
+    _ERROR_KINEMATICS = (2, 1)
+
+    # asyncm, passmの読み込み
+    _MODE_READ = 0
+    _ASYNCM_ON = 1
+
+    # I/Oのバンク ADCはバンク2の下位ワードを使用する
+    _ADC_BANK = 2
+    _WORD_MASK = 0xFFFFFFFF
+    _ADC_MASK = 0x0FFF
+
+    # 逆運動学の数値計算
+    _IK_ITERATIONS = 100
+    _IK_STEP = 1e-4                                         # deg
+    _IK_DAMPING = 1e-3
+    _IK_POSITION_TOLERANCE = 1e-5                           # mm
+    _IK_ANGLE_TOLERANCE = 1e-6                              # deg
+
+    def __init__(self, latency=0.0, jitter=0.0, time_scale=1.0, adc=(0, 0)):
+        """
+        初期化
+
+        引数:
+            latency: 呼び出しごとの遅延(秒)
+            jitter: 遅延のばらつき(秒) 一様分布
+            time_scale: 動作時間の倍率 0の場合は即時完了
+            adc: ADCの各チャンネルの値
+        """
+        self._lock = threading.RLock()
+        self._latency = latency
+        self._jitter = jitter
+        self._time_scale = time_scale
+        self._adc = adc
+        self._kinematics = FSRoboRKinematics()
+        self._estimator = FSRoboRMotionEstimator()
+        self._joint_spec = FSRoboRJointSpec.get_instance()
+
+        self._owner = None
+        self._next_connection = 0
+        self._tools = {0: (0,)}
+        self._tool_id = 0
+        self._modes = {"asyncm": 2, "passm": 2, "overlap": 0, "zone": 20, "disable_mdo": 0}
+        self._banks = {}
+
+        # 動作は(開始時刻, 終了時刻, 開始軸情報, 目標軸情報)の区間として登録する
+        self._settled = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        self._target = self._settled
+        self._segments = []
+        self._busy_until = 0.0
+        self._motion_id = 0
+
+    def connect(self):
+        """
+        接続IDを払い出す
+        """
+        with self._lock:
+            self._next_connection += 1
+            return self._next_connection
+
+    def disconnect(self, connection):
+        """
+        接続を閉じる 操作権を持っている場合は開放する
+        """
+        with self._lock:
+            if self._owner == connection:
+                self._owner = None
+
+    def call(self, connection, name, args):
+        """
+        rblib.Robotのメソッドを実行する
+
+        引数:
+            connection: 接続ID
+            name: メソッド名
+            args: 引数
+        戻り値:
+            res: rblibと同じ形式の結果
+        """
+        delay = self._latency + random.uniform(-self._jitter, self._jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return getattr(self, "_m_" + name)(connection, *args)
+
+    # 接続、操作権
+    def _m_open(self, connection):
+        return (True,)
+
+    def _m_close(self, connection):
+        self.disconnect(connection)
+        return (True,)
+
+    def _m_acq_permission(self, connection):
+        with self._lock:
+            if self._owner not in (None, connection):
+                return (False,) + self._ERROR_PERMISSION
+            self._owner = connection
+            return (True,)
+
+    def _m_rel_permission(self, connection):
+        self.disconnect(connection)
+        return (True,)
+
+    def _m_syssts(self, connection, sts_type):
+        return (True, 0)
+
+    # I/O
+    def _m_ioctrl(self, connection, bank, data_low, mask_low, data_high, mask_high):
+        with self._lock:
+            low, high = self._banks.get(bank, (0, 0))
+            # マスクのビットが0の箇所のみ書き込む
+            low = (low & mask_low) | (data_low & ~mask_low & self._WORD_MASK)
+            high = (high & mask_high) | (data_high & ~mask_high & self._WORD_MASK)
+            self._banks[bank] = (low, high)
+            if bank == self._ADC_BANK:
+                low = (low & ~(self._ADC_MASK | self._ADC_MASK << 16)) \
+                    | (self._adc[0] & self._ADC_MASK) | (self._adc[1] & self._ADC_MASK) << 16
+            return (True, low, high)
+
+    # 位置
+    def _m_jmark(self, connection):
+        return (True,) + tuple(self._position())
+
+    def _m_mark(self, connection):
+        return self._forward(self._position())
+
+    def _m_j2r_mt(self, connection, j1, j2, j3, j4, j5, j6, coord):
+        return self._forward((j1, j2, j3, j4, j5, j6))
+
+    def _m_r2j_mt(self, connection, x, y, z, rz, ry, rx, posture, coord, cc=None, option=None):
+        return self._inverse((x, y, z, rz, ry, rx), posture)
+
+    # 動作
+    def _m_jntmove(self, connection, j1, j2, j3, j4, j5, j6, speed, acctime, dacctime):
+        target = (j1, j2, j3, j4, j5, j6)
+        limits = self._joint_spec.speed_limits(speed)
+        return self._move(connection, target, lambda start: self._estimator.ptp_time(
+            start, target, limits, acctime, dacctime))
+
+    def _m_ptpmove(self, connection, x, y, z, rz, ry, rx, posture, coord, speed, acctime, dacctime):
+        res = self._inverse((x, y, z, rz, ry, rx), posture)
+        if res[0] != True:
+            return res
+        return self._m_jntmove(connection, *(res[1:7] + (speed, acctime, dacctime)))
+
+    def _m_ptpmove_mt(self, connection, x, y, z, rz, ry, rx, posture, coord, cc, option,
+                      speed, acctime, dacctime):
+        return self._m_ptpmove(connection, x, y, z, rz, ry, rx, posture, coord, speed, acctime, dacctime)
+
+    def _m_cpmove(self, connection, x, y, z, rz, ry, rx, posture, coord, speed, acctime, dacctime):
+        res = self._inverse((x, y, z, rz, ry, rx), posture)
+        if res[0] != True:
+            return res
+        target = res[1:7]
+        return self._move(connection, target, lambda start: self._estimator.line_time(
+            self._forward(start)[1:4], (x, y, z), speed, acctime, dacctime))
+
+    def _m_joinm(self, connection):
+        with self._lock:
+            wait = self._busy_until - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        return (True,)
+
+    def _m_abortm(self, connection):
+        with self._lock:
+            if self._owner != connection:
+                return (False,) + self._ERROR_PERMISSION
+            self._settled = self._position_locked(time.time())
+            self._target = self._settled
+            self._segments = []
+            self._busy_until = 0.0
+            return (True, self._motion_id)
+
+    # 設定
+    def _m_settool(self, connection, tool_id, x, y, z, rz, ry, rx):
+        with self._lock:
+            self._tools[tool_id] = (tool_id, x, y, z, rz, ry, rx)
+            return (True,)
+
+    def _m_changetool(self, connection, tool_id):
+        with self._lock:
+            if tool_id not in self._tools:
+                return (False,) + self._ERROR_KINEMATICS
+            self._tool_id = tool_id
+            return (True,)
+
+    def _m_asyncm(self, connection, value):
+        return self._mode(connection, "asyncm", value)
+
+    def _m_passm(self, connection, value):
+        return self._mode(connection, "passm", value)
+
+    def _m_overlap(self, connection, value):
+        return self._mode(connection, "overlap", value)
+
+    def _m_zone(self, connection, value):
+        return self._mode(connection, "zone", value)
+
+    def _m_disable_mdo(self, connection, value):
+        return self._mode(connection, "disable_mdo", value)
+
+    def _mode(self, connection, name, value):
+        """
+        モーダル設定を変更する asyncm, passmは0で現在の値を読み込む
+        """
+        with self._lock:
+            if name in ("asyncm", "passm") and value == self._MODE_READ:
+                return (True, self._modes[name])
+            self._modes[name] = value
+            return (True,)
+
+    def _move(self, connection, target, duration):
+        """
+        動作を登録する
+        asyncmがONの場合は登録してすぐに戻り、OFFの場合は動作の完了まで待つ
+
+        引数:
+            connection: 接続ID
+            target: 目標の軸情報
+            duration: 開始軸情報から動作時間(秒)を求める関数
+        """
+        with self._lock:
+            if self._owner != connection:
+                return (False,) + self._ERROR_PERMISSION
+            now = time.time()
+            self._position_locked(now)
+            start_time = max(now, self._busy_until)
+            end_time = start_time + duration(self._target) * self._time_scale
+            self._segments.append((start_time, end_time, self._target, tuple(target)))
+            self._target = tuple(target)
+            self._busy_until = end_time
+            self._motion_id += 1
+            wait = end_time - now if self._modes["asyncm"] != self._ASYNCM_ON else 0
+        if wait > 0:
+            time.sleep(wait)
+        return (True,)
+
+    def _position(self):
+        """
+        現在の軸情報を取得
+        """
+        with self._lock:
+            return self._position_locked(time.time())
+
+    def _position_locked(self, now):
+        """
+        指定した時刻の軸情報を求め、完了した動作を破棄する
+        動作中は軸空間で線形に補間する
+        """
+        while len(self._segments) > 0 and self._segments[0][1] <= now:
+            self._settled = self._segments.pop(0)[3]
+        if len(self._segments) == 0 or self._segments[0][0] > now:
+            return self._settled
+        start_time, end_time, start, target = self._segments[0]
+        ratio = (now - start_time) / (end_time - start_time)
+        return tuple(begin + (end - begin) * ratio for begin, end in zip(start, target))
+
+    def _tool(self):
+        with self._lock:
+            return self._tools[self._tool_id]
+
+    def _forward(self, joints):
+        """
+        順運動学 j2r_mtと同じ形式の結果を返す
+        """
+        return self._kinematics.forward([joints], self._tool())[0]
+
+    def _inverse(self, pose, posture):
+        """
+        減衰最小二乗法による逆運動学
+        現在の軸情報と、姿勢情報から決めた初期値から計算し、姿勢情報が一致する解を返す
+
+        引数:
+            pose: 座標情報(X, Y, Z, Rz, Ry, Rx)
+            posture: 姿勢情報
+        戻り値:
+            res: r2j_mtと同じ形式の結果
+        """
+        tool = self._tool()
+        target_position = numpy.asarray(pose[:3], dtype=numpy.float64)
+        target_rotation = numpy.asarray(fsrobo_r_frame.pose_matrix(*pose[3:6]))
+        shoulder = math.degrees(math.atan2(pose[1], pose[0]))
+        if not posture & 0x4:
+            shoulder += 180.0
+        seeds = [self._position(), (
+            shoulder if shoulder <= 180.0 else shoulder - 360.0,
+            0.0,
+            45.0 if posture & 0x2 else -45.0,
+            0.0,
+            45.0 if posture & 0x1 else -45.0,
+            0.0)]
+        for seed in seeds:
+            joints = self._solve(numpy.asarray(seed, dtype=numpy.float64), target_position, target_rotation, tool)
+            if joints is None:
+                continue
+            res = self._kinematics.forward([joints], tool)[0]
+            if res[7] == posture:
+                return (True,) + tuple(float(value) for value in joints)
+        return (False,) + self._ERROR_KINEMATICS
+
+    def _solve(self, joints, target_position, target_rotation, tool):
+        """
+        初期値から逆運動学を解く 収束しない場合はNone
+        """
+        step = numpy.eye(6) * self._IK_STEP
+        for _ in range(self._IK_ITERATIONS):
+            # 現在値と各軸を微小変化させた値をまとめて計算し、数値微分でヤコビ行列を求める
+            candidates = numpy.vstack([joints, joints + step])
+            errors = numpy.array([self._pose_error(res, target_position, target_rotation)
+                                  for res in self._kinematics.forward(candidates.tolist(), tool)])
+            error = errors[0]
+            if numpy.abs(error[:3]).max() < self._IK_POSITION_TOLERANCE \
+                    and numpy.abs(error[3:]).max() < self._IK_ANGLE_TOLERANCE:
+                return (joints + 180.0) % 360.0 - 180.0
+            jacobian = ((errors[1:] - error) / self._IK_STEP).T
+            delta = jacobian.T.dot(numpy.linalg.solve(
+                jacobian.dot(jacobian.T) + numpy.eye(6) * self._IK_DAMPING, error))
+            joints = joints - delta
+        return None
+
+    @staticmethod
+    def _pose_error(res, target_position, target_rotation):
+        """
+        目標との誤差 位置(mm)と回転(deg)
+        """
+        rotation = numpy.asarray(fsrobo_r_frame.pose_matrix(*res[4:7]))
+        difference = rotation.dot(target_rotation.T)
+        angle = 0.5 * numpy.array([difference[2, 1] - difference[1, 2],
+                                   difference[0, 2] - difference[2, 0],
+                                   difference[1, 0] - difference[0, 1]])
+        return numpy.concatenate([numpy.asarray(res[1:4]) - target_position, numpy.degrees(angle)])
+
+
+class _RobotBase(object):
+    """
+    rblib.Robotと同じメソッドを持つ基底クラス
+    """
+
+    def __init__(self, host, port):
+        self._host = host
+        self._port = port
+
+    def _call(self, name, args):
+        raise NotImplementedError()
+
+
+def _make_method(name):
+    def method(self, *args):
+        return self._call(name, args)
+    method.__name__ = name
+    return method
+
+
+for _name in METHODS:
+    setattr(_RobotBase, _name, _make_method(_name))
+
+
+class LocalRobot(_RobotBase):
+    """
+    プロセス内の模擬コントローラを使用するRobotクラス
+    """
+
+    # プロセス内で共有する模擬コントローラ
+    controller = None
+
+    def __init__(self, host, port):
+        super(LocalRobot, self).__init__(host, port)
+        if LocalRobot.controller is None:
+            LocalRobot.controller = SimController()
+        self._connection = LocalRobot.controller.connect()
+
+    def _call(self, name, args):
+        return LocalRobot.controller.call(self._connection, name, args)
+
+
+class RemoteRobot(_RobotBase):
+    """
+    TCPサーバーの模擬コントローラに接続するRobotクラス
+    """
+
+    def __init__(self, host, port):
+        super(RemoteRobot, self).__init__(host, port)
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _call(self, name, args):
+        with self._lock:
+            if self._sock is None:
+                self._sock = socket.create_connection((self._host, self._port))
+                self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._file = self._sock.makefile("rb")
+            self._sock.sendall((json.dumps([name, list(args)]) + "\n").encode("utf-8"))
+            res = tuple(json.loads(self._file.readline()))
+            if name == "close":
+                self._file.close()
+                self._sock.close()
+                self._sock = None
+            return res
+
+
+# rblibとして使用する場合のRobotクラス
+Robot = LocalRobot
+
+
+class _SimRequestHandler(socketserver.StreamRequestHandler):
+    """
+    TCPサーバーの接続ごとの処理 1行のJSON [メソッド名, 引数] に1行のJSONで結果を返す
+    """
+
+    def handle(self):
+        controller = self.server.controller
+        connection = controller.connect()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                line = self.rfile.readline()
+                if len(line) == 0:
+                    break
+                name, args = json.loads(line)
+                if name not in METHODS:
+                    res = (False,) + SimController._ERROR_KINEMATICS
+                else:
+                    res = controller.call(connection, name, args)
+                self.wfile.write((json.dumps(list(res)) + "\n").encode("utf-8"))
+        finally:
+            controller.disconnect(connection)
+
+
+class SimServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    模擬コントローラのTCPサーバー
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, controller):
+        socketserver.TCPServer.__init__(self, address, _SimRequestHandler)
+        self.controller = controller
+
+
+def install(remote=False, controller=None):
+    """
+    rblibの代わりにシミュレータを使用する
+    rblibをimportするモジュールより先に呼び出す
+
+    引数:
+        remote: True: TCPサーバーに接続する False: プロセス内の模擬コントローラを使用する
+        controller: プロセス内で使用する模擬コントローラ ※省略時は既定値で作成する
+    """
+    global Robot
+    Robot = RemoteRobot if remote else LocalRobot
+    if controller is not None:
+        LocalRobot.controller = controller
+    sys.modules["rblib"] = sys.modules[__name__]
+
+
+def install_from_env():
+    """
+    環境変数の設定に従ってシミュレータを使用する
+
+    戻り値:
+        True: シミュレータを使用する
+        False: 環境変数が設定されていない
+    """
+    mode = os.environ.get(SIM_ENV)
+    if not mode:
+        return False
+    if mode == SIM_LOCAL:
+        install(controller=SimController(float(os.environ.get(LATENCY_ENV, 0)),
+                                         float(os.environ.get(JITTER_ENV, 0)),
+                                         float(os.environ.get(TIME_SCALE_ENV, 1))))
+    else:
+        install(remote=True)
+    return True
+
+
+def main():
+    """
+    main関数 TCPサーバーとして起動する
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="rblib simulator server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--latency", type=float, default=0.0, help="per-call latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency jitter in seconds")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="motion time scale (0: instant)")
+    args = parser.parse_args()
+
+    controller = SimController(args.latency, args.jitter, args.time_scale)
+    server = SimServer((args.host, args.port), controller)
+    print("rblib simulator listening on {}:{}".format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
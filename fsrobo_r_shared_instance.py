@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+全セッションで共有するインスタンスを管理するモジュール
+"""
+
+import threading
+
+
+class FSRoboRSharedInstance(object):
+    """
+    共有インスタンスの基底クラス
+    継承したクラスごとに、全セッションで1つのインスタンスをget_instance()で共有する
+    """
+
+    # クラスごとの共有インスタンス
+    # 生成中に他の共有インスタンスを取得できるよう再入可能なロックを使用する
+    _instances = {}
+    _instances_lock = threading.RLock()
+
+    @classmethod
+    def get_instance(cls):
+        """
+        共有インスタンスを取得
+        初回のみ_create_instance()で生成する
+
+        戻り値:
+            instance: 全セッション共通のインスタンス
+        """
+        with FSRoboRSharedInstance._instances_lock:
+            instance = FSRoboRSharedInstance._instances.get(cls)
+            if instance is None:
+                instance = cls._create_instance()
+                FSRoboRSharedInstance._instances[cls] = instance
+            return instance
+
+    @classmethod
+    def _create_instance(cls):
+        """
+        共有インスタンスを生成する
+        生成時の引数や設定が必要なクラスはオーバーライドする
+        """
+        return cls()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+CCサーバーの処理区間を記録するトレースモジュール
+受信、解析、コマンド実行、rblibの呼び出し、送信などの区間をリングバッファに記録し、
+要求に応じてChromeのトレースイベント形式(chrome://tracing, Perfetto)のJSONファイルに出力する
+
+記録は実行中に切り替えることができる
+無効な場合は区間ごとにフラグを1回確認するのみで、時刻の取得やバッファへの追加は行わない
+"""
+
+import collections
+import json
+import os
+import tempfile
+import threading
+import time
+
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+
+# 起動時に記録を有効にする環境変数名(1で有効)
+TRACE_ENV = "FSROBO_R_CC_TRACE"
+
+# イベントの分類
+CATEGORY_SERVER = "server"
+CATEGORY_COMMAND = "command"
+CATEGORY_RBLIB = "rblib"
+
+
+class _Span(object):
+    """
+    withで囲んだ区間を記録する
+    """
+
+    __slots__ = ("_tracer", "_name", "_category", "_args", "_start")
+
+    def __init__(self, tracer, name, category, args):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tracer.complete(self._name, self._category, self._start, time.time(), self._args)
+        return False
+
+
+class _NullSpan(object):
+    """
+    記録が無効な場合の区間 何もしない
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class FSRoboRTracer(FSRoboRSharedInstance):
+    """
+    トレース記録クラス
+    """
+
+    # リングバッファに保持するイベント数
+    _CAPACITY = 100000
+
+    @classmethod
+    def _create_instance(cls):
+        """
+        共有インスタンスを生成する
+        環境変数TRACE_ENVが1の場合は記録を開始する
+        """
+        instance = cls()
+        instance.enable(os.environ.get(TRACE_ENV) == "1")
+        return instance
+
+    def __init__(self, capacity=_CAPACITY):
+        """
+        初期化
+
+        引数:
+            capacity: リングバッファに保持するイベント数 超えた場合は古いイベントから破棄する
+        """
+        # 記録の有無 呼び出し側で参照して記録を省略できる
+        self.enabled = False
+        # dequeへの追加はスレッドセーフのためロックしない
+        self._events = collections.deque(maxlen=capacity)
+        self._thread_names = {}
+        self._pid = os.getpid()
+
+    def enable(self, enabled):
+        """
+        記録の有効/無効を切り替える
+
+        引数:
+            enabled: True: 記録する False: 記録しない
+        """
+        self.enabled = bool(enabled)
+
+    def clear(self):
+        """
+        記録したイベントを破棄する
+        """
+        self._events.clear()
+
+    def size(self):
+        """
+        バッファ内のイベント数を取得
+        """
+        return len(self._events)
+
+    def span(self, name, category=CATEGORY_SERVER, args=None):
+        """
+        withで囲んだ区間を記録する
+
+        引数:
+            name: 区間の名前
+            category: イベントの分類
+            args: イベントに付加する情報 ※省略可
+        戻り値:
+            span: コンテキストマネージャ
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def complete(self, name, category, start, end, args=None):
+        """
+        計測済みの区間を記録する
+
+        引数:
+            name: 区間の名前
+            category: イベントの分類
+            start: 開始時刻(time.time())
+            end: 終了時刻(time.time())
+            args: イベントに付加する情報 ※省略可
+        """
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self._thread_names:
+            self._thread_names[tid] = thread.name
+        self._events.append((name, category, start, end, tid, args))
+
+    def dump(self, path):
+        """
+        バッファ内のイベントをトレースイベント形式のJSONファイルに出力する
+        出力したイベントはバッファに残る
+
+        引数:
+            path: 出力先のファイルパス
+        戻り値:
+            count: 出力したイベント数
+        """
+        events = list(self._events)
+        trace_events = [{
+            "name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}
+        } for tid, name in list(self._thread_names.items())]
+        for name, category, start, end, tid, args in events:
+            event = {
+                "name": name, "cat": category, "ph": "X", "pid": self._pid, "tid": tid,
+                "ts": start * 1e6, "dur": (end - start) * 1e6
+            }
+            if args is not None:
+                event["args"] = args
+            trace_events.append(event)
+
+        # 書き込み途中のファイルを読まれないよう、一時ファイルに出力してから置き換える
+        # 一時ファイルは既存のファイルやシンボリックリンクを上書きしないよう新規に作成する
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                        dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return len(events)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+CCサーバーの通信を記録するモジュール
+セッションごとに受信データと送信データを単調増加の時刻とともに追記専用のバイナリログに記録する
+記録したログはfsrobo_r_cc_replay.pyで再生できる
+
+ログの形式(リトルエンディアン):
+    ヘッダ: マジック(8バイト) 記録開始時のUNIX時刻(double)
+    レコード: 種別(uint8) セッション番号(uint32) 単調増加の時刻(double) データ長(uint32) データ
+    種別
+        KIND_OPEN: 接続 データは{"PEER": 接続元, "PERM": 接続権限の有無, "OBS": 観測セッションか}のJSON
+        KIND_IN: クライアントからの受信データ
+        KIND_OUT: クライアントへの送信データ
+        KIND_CLOSE: 切断 データなし
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import struct
+import threading
+import time
+
+from fsrobo_r_shared_instance import FSRoboRSharedInstance
+
+# 記録先のファイルパスを指定する環境変数名 未設定の場合は記録しない
+RECORD_ENV = "FSROBO_R_CC_RECORD"
+
+MAGIC = b"FSRCCREC"
+KIND_OPEN = 0
+KIND_IN = 1
+KIND_OUT = 2
+KIND_CLOSE = 3
+
+_HEADER = struct.Struct("<8sd")
+_RECORD = struct.Struct("<BIdI")
+
+
+def _clock_gettime():
+    """
+    CLOCK_MONOTONICを読む関数を作成する
+    Python 3のtime.monotonicが無い場合はlibcのclock_gettimeを使用する
+    """
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+
+    class _Timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        clock_gettime = libc.clock_gettime
+    except (OSError, AttributeError):
+        return time.time
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+    # LinuxのCLOCK_MONOTONIC
+    clock_monotonic = 1
+    timespec = _Timespec()
+
+    def monotonic():
+        clock_gettime(clock_monotonic, ctypes.byref(timespec))
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
+    # timespecを共有するため、複数スレッドから呼ぶ場合はロックする
+    lock = threading.Lock()
+
+    def locked():
+        with lock:
+            return monotonic()
+    return locked
+
+
+monotonic = _clock_gettime()
+
+
+class FSRoboRTrafficRecorder(FSRoboRSharedInstance):
+    """
+    通信記録クラス
+    """
+
+    @classmethod
+    def _create_instance(cls):
+        """
+        共有インスタンスを生成する
+        環境変数RECORD_ENVが設定されている場合のみ記録する
+        """
+        return cls(os.environ.get(RECORD_ENV))
+
+    def __init__(self, path=None):
+        """
+        初期化
+
+        引数:
+            path: 記録先のファイルパス Noneの場合は記録しない 既存のファイルには追記する
+        """
+        self.enabled = path is not None
+        self._fd = None
+        self._lock = threading.Lock()
+        self._next_session = 0
+        if self.enabled:
+            # O_APPENDの1回の書き込みはレコード単位で他の書き込みと混ざらない
+            self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            if os.fstat(self._fd).st_size == 0:
+                os.write(self._fd, _HEADER.pack(MAGIC, time.time()))
+            else:
+                # 追記する場合は前回までのセッション番号と重ならないようにする
+                _, records = read_log(path)
+                self._next_session = max([record[1] + 1 for record in records] or [0])
+
+    def open_session(self, connection, permission, observer=False):
+        """
+        セッションの記録を開始する
+
+        引数:
+            connection: クライアントとのソケット
+            permission: 接続権限の有無
+            observer: 観測セッションか
+        戻り値:
+            session: セッション番号 記録しない場合はNone
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            session = self._next_session
+            self._next_session += 1
+        try:
+            peer = "{}:{}".format(*connection.getpeername()[:2])
+        except (AttributeError, TypeError, IndexError, OSError, IOError):
+            peer = None
+        self._write(KIND_OPEN, session, json.dumps({"PEER": peer, "PERM": 1 if permission else 0,
+                                                     "OBS": 1 if observer else 0}))
+        return session
+
+    def inbound(self, session, data):
+        """
+        受信データを記録する
+        """
+        if session is not None:
+            self._write(KIND_IN, session, data)
+
+    def outbound(self, session, data):
+        """
+        送信データを記録する
+        """
+        if session is not None:
+            self._write(KIND_OUT, session, data)
+
+    def close_session(self, session):
+        """
+        セッションの記録を終了する
+        """
+        if session is not None:
+            self._write(KIND_CLOSE, session, b"")
+
+    def _write(self, kind, session, data):
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        record = _RECORD.pack(kind, session, monotonic(), len(data)) + data
+        try:
+            os.write(self._fd, record)
+        except OSError:
+            # 記録の失敗で通信を止めない
+            pass
+
+
+def read_log(path):
+    """
+    記録したログを読み込む
+    書き込み途中で終了した末尾のレコードは無視する
+
+    引数:
+        path: ログのファイルパス
+    戻り値:
+        started: 記録開始時のUNIX時刻
+        records: (種別, セッション番号, 時刻, データ)のリスト
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise ValueError("not a traffic log: {}".format(path))
+    magic, started = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a traffic log: {}".format(path))
+
+    records = []
+    offset = _HEADER.size
+    while offset + _RECORD.size <= len(data):
+        kind, session, timestamp, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if offset + length > len(data):
+            break
+        records.append((kind, session, timestamp, data[offset:offset + length]))
+        offset += length
+    return started, records
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+関節空間の軌道を処理するモジュール
+NumPyが無い場合は軌道を変更せずにそのまま返す
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def simplify(points, tolerance):
+    """
+    Ramer-Douglas-Peucker法で軌道の点を間引く
+    残した点を結ぶ線分から、間引いた点までの関節空間での距離が許容誤差以下になる
+
+    引数:
+        points: 軸情報(J1～J6)のリスト
+        tolerance: 許容誤差(deg) 0以下の場合は間引かない
+    戻り値:
+        indices: 残した点のインデックスのリスト 始点と終点は必ず残す
+        deviation: 間引いた点の最大の距離(deg)
+    """
+    count = len(points)
+    if numpy is None or tolerance <= 0 or count < 3:
+        return list(range(count)), 0.0
+
+    joints = numpy.asarray(points, dtype=numpy.float64)
+    keep = numpy.zeros(count, dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    deviation = 0.0
+    # 再帰の深さが点数に比例しないようにスタックで処理する
+    segments = [(0, count - 1)]
+    while len(segments) > 0:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        distance = _segment_distance(joints[first + 1:last], joints[first], joints[last])
+        index = int(distance.argmax())
+        if distance[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+        else:
+            deviation = max(deviation, float(distance[index]))
+    return numpy.flatnonzero(keep).tolist(), deviation
+
+
+def _segment_distance(points, start, end):
+    """
+    線分から各点までの距離を計算する
+
+    引数:
+        points: 点の配列 形状[N, 6]
+        start: 線分の始点
+        end: 線分の終点
+    戻り値:
+        distance: 各点までの距離 形状[N]
+    """
+    direction = end - start
+    length = numpy.dot(direction, direction)
+    offset = points - start
+    if length == 0.0:
+        return numpy.sqrt((offset * offset).sum(axis=1))
+    ratio = numpy.clip(offset.dot(direction) / length, 0.0, 1.0)
+    offset = offset - ratio[:, numpy.newaxis] * direction
+    return numpy.sqrt((offset * offset).sum(axis=1))
+
+
+def spline_available():
+    """
+    スプライン補間が使用可能かを確認
+
+    戻り値:
+        True: 使用可能
+        False: NumPyが無いため使用不可
+    """
+    return numpy is not None
+
+
+def spline(knots, times, period, degree, speed_limits):
+    """
+    通過点(ノット)と時刻からスプライン補間した軌道を一定周期でサンプリングする
+    3次は始点と終点の速度を0としたC2連続の3次スプライン
+    5次は3次スプラインのノットでの速度と加速度を使用した5次エルミート補間で、始点と終点の加速度も0とする
+    サンプルの速度が制限を超える場合は、時間を引き伸ばして制限内に収める
+
+    引数:
+        knots: 軸情報(J1～J6)のリスト 2点以上
+        times: 各ノットの時刻(秒)のリスト 単調増加
+        period: サンプリング周期(秒)
+        degree: 3または5
+        speed_limits: 軸ごとの速度制限(deg/s)のリスト
+    戻り値:
+        samples: サンプリングした軸情報のリスト 最初と最後のノットを含む
+        scale: 時間の引き伸ばし率 1.0以上
+    """
+    if degree not in (3, 5):
+        raise ValueError("spline degree must be 3 or 5")
+    if period <= 0:
+        raise ValueError("spline period must be positive")
+    points = numpy.asarray(knots, dtype=numpy.float64)
+    stamps = numpy.asarray(times, dtype=numpy.float64)
+    if len(points) < 2 or points.shape[1:] != (6,) or stamps.shape != (len(points),):
+        raise ValueError("spline needs at least two [6] knots and one time per knot")
+    if (numpy.diff(stamps) <= 0).any():
+        raise ValueError("knot times must be strictly increasing")
+
+    limits = numpy.asarray(speed_limits, dtype=numpy.float64)
+    samples, velocities = _sample_spline(points, stamps, period, degree)
+    scale = max(1.0, float((numpy.abs(velocities) / limits).max()))
+    if scale > 1.0:
+        # 時間を一様に引き伸ばすと経路は変わらずに速度が1/scaleになる
+        stamps = stamps[0] + (stamps - stamps[0]) * scale
+        samples, velocities = _sample_spline(points, stamps, period, degree)
+    return samples.tolist(), scale
+
+
+def _sample_spline(points, stamps, period, degree):
+    """
+    スプラインをサンプリングする
+
+    引数:
+        points: ノットの配列 形状[K, 6]
+        stamps: ノットの時刻 形状[K]
+        period: サンプリング周期(秒)
+        degree: 3または5
+    戻り値:
+        samples: 位置 形状[M, 6]
+        velocities: 速度(deg/s) 形状[M, 6]
+    """
+    velocity, acceleration = _knot_derivatives(points, stamps)
+    sample_times = numpy.append(numpy.arange(stamps[0], stamps[-1], period), stamps[-1])
+    segment = numpy.clip(numpy.searchsorted(stamps, sample_times, side="right") - 1, 0, len(stamps) - 2)
+    h = (stamps[segment + 1] - stamps[segment])[:, numpy.newaxis]
+    u = (sample_times[:, numpy.newaxis] - stamps[segment][:, numpy.newaxis]) / h
+    p0 = points[segment]
+    p1 = points[segment + 1]
+    v0 = velocity[segment] * h
+    v1 = velocity[segment + 1] * h
+
+    u2 = u * u
+    u3 = u2 * u
+    if degree == 3:
+        samples = (2 * u3 - 3 * u2 + 1) * p0 + (u3 - 2 * u2 + u) * v0 \
+            + (-2 * u3 + 3 * u2) * p1 + (u3 - u2) * v1
+        velocities = ((6 * u2 - 6 * u) * p0 + (3 * u2 - 4 * u + 1) * v0
+                      + (-6 * u2 + 6 * u) * p1 + (3 * u2 - 2 * u) * v1) / h
+    else:
+        u4 = u3 * u
+        u5 = u4 * u
+        a0 = acceleration[segment] * h * h
+        a1 = acceleration[segment + 1] * h * h
+        samples = (1 - 10 * u3 + 15 * u4 - 6 * u5) * p0 \
+            + (u - 6 * u3 + 8 * u4 - 3 * u5) * v0 \
+            + (0.5 * u2 - 1.5 * u3 + 1.5 * u4 - 0.5 * u5) * a0 \
+            + (0.5 * u3 - u4 + 0.5 * u5) * a1 \
+            + (-4 * u3 + 7 * u4 - 3 * u5) * v1 \
+            + (10 * u3 - 15 * u4 + 6 * u5) * p1
+        velocities = ((-30 * u2 + 60 * u3 - 30 * u4) * p0
+                      + (1 - 18 * u2 + 32 * u3 - 15 * u4) * v0
+                      + (u - 4.5 * u2 + 6 * u3 - 2.5 * u4) * a0
+                      + (1.5 * u2 - 4 * u3 + 2.5 * u4) * a1
+                      + (-12 * u2 + 28 * u3 - 15 * u4) * v1
+                      + (30 * u2 - 60 * u3 + 30 * u4) * p1) / h
+    return samples, velocities
+
+
+def _knot_derivatives(points, stamps):
+    """
+    始点と終点の速度を0とした3次スプラインのノットでの速度と加速度を計算する
+
+    引数:
+        points: ノットの配列 形状[K, 6]
+        stamps: ノットの時刻 形状[K]
+    戻り値:
+        velocity: ノットでの速度 形状[K, 6]
+        acceleration: ノットでの加速度 形状[K, 6] 始点と終点は0
+    """
+    count = len(points)
+    h = numpy.diff(stamps)[:, numpy.newaxis]
+    slope = numpy.diff(points, axis=0) / h
+
+    # 内側のノットで加速度が連続になる条件の連立方程式(三重対角)を解く
+    velocity = numpy.zeros_like(points)
+    if count > 2:
+        inner = count - 2
+        matrix = numpy.zeros((inner, inner))
+        index = numpy.arange(inner)
+        matrix[index, index] = 2 * (h[:-1, 0] + h[1:, 0])
+        matrix[index[1:], index[:-1]] = h[2:, 0]
+        matrix[index[:-1], index[1:]] = h[:-2, 0]
+        rhs = 3 * (h[1:] * slope[:-1] + h[:-1] * slope[1:])
+        velocity[1:-1] = numpy.linalg.solve(matrix, rhs)
+
+    # 各区間の始点での加速度 3次スプラインはC2連続のため区間の境界で一致する
+    acceleration = numpy.zeros_like(points)
+    acceleration[1:-1] = (6 * slope[1:] - 4 * velocity[1:-1] - 2 * velocity[2:]) / h[1:]
+    return velocity, acceleration
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+fsrobo_r_cc_codecのメッセージ分割のテスト
+"""
+
+import json
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fsrobo_r_cc_codec
+
+MESSAGES = [
+    b'{"CD": 4095, "PR": 1, "DT": 3, "DA": "{}"}',
+    b'{"CD": 257, "DA": "{\\"J1\\": 10.5, \\"NAME\\": \\"a}b{c\\"}"}',
+    b'{"S": "quote \\" and backslash \\\\", "N": [1, [2, {"x": []}], 3]}',
+    b'[1, 2, {"a": "]"}]',
+    b'{}',
+    json.dumps({"K": u"日本", "L": list(range(200))}).encode("utf-8")
+]
+
+
+def _chunks(data, sizes):
+    """
+    データをsizesの長さを順に繰り返して分割する
+    """
+    chunks = []
+    index = 0
+    while index < len(data):
+        size = sizes[len(chunks) % len(sizes)]
+        chunks.append(data[index:index + size])
+        index += size
+    return chunks
+
+
+class MessageSplitterTest(unittest.TestCase):
+
+    def split_chunks(self, chunks):
+        splitter = fsrobo_r_cc_codec.MessageSplitter()
+        messages = []
+        for chunk in chunks:
+            messages.extend(bytes(message) for message in splitter.feed(chunk))
+        return messages, splitter
+
+    def test_single_feed(self):
+        messages, splitter = self.split_chunks([b"".join(MESSAGES)])
+        self.assertEqual(messages, MESSAGES)
+        self.assertFalse(splitter.pending())
+
+    def test_byte_by_byte(self):
+        stream = b" \n".join(MESSAGES)
+        messages, splitter = self.split_chunks([stream[index:index + 1] for index in range(len(stream))])
+        self.assertEqual(messages, MESSAGES)
+        self.assertFalse(splitter.pending())
+
+    def test_random_chunks(self):
+        rng = random.Random(7)
+        stream = b"".join(MESSAGES * 20)
+        for _ in range(50):
+            sizes = [rng.randint(1, 64) for _ in range(10)]
+            messages, splitter = self.split_chunks(_chunks(stream, sizes))
+            self.assertEqual(messages, MESSAGES * 20)
+            self.assertFalse(splitter.pending())
+
+    def test_pending_message(self):
+        stream = MESSAGES[0] + MESSAGES[1][:20]
+        messages, splitter = self.split_chunks([stream])
+        self.assertEqual(messages, MESSAGES[:1])
+        self.assertTrue(splitter.pending())
+        self.assertEqual(splitter.take_pending(), MESSAGES[1][:20])
+        self.assertFalse(splitter.pending())
+        # 取り出した後は新しいメッセージから分割する
+        self.assertEqual([bytes(message) for message in splitter.feed(MESSAGES[2])], MESSAGES[2:3])
+
+    def test_split(self):
+        messages, rest = fsrobo_r_cc_codec.split(MESSAGES[3] + MESSAGES[4] + MESSAGES[0][:5])
+        self.assertEqual([bytes(message) for message in messages], MESSAGES[3:5])
+        self.assertEqual(rest, MESSAGES[0][:5])
+
+    def test_reader_decodes_messages(self):
+        reader = fsrobo_r_cc_codec.MessageReader()
+        envelopes = []
+        for chunk in _chunks(b"".join(MESSAGES), [3, 11, 5]):
+            envelopes.extend(reader.feed(chunk))
+        self.assertEqual(envelopes, [json.loads(message.decode("utf-8")) for message in MESSAGES])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+fsrobo_r_frameのテスト
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fsrobo_r_frame
+
+POSE = (350.0, -120.0, 480.0, 30.0, -20.0, 160.0)
+
+
+def _transpose(matrix):
+    return [[matrix[j][i] for j in range(3)] for i in range(3)]
+
+
+class OffsetPoseTest(unittest.TestCase):
+
+    def assertPoseEqual(self, actual, expected):
+        """
+        位置と姿勢が一致することを確認する 角度の表現の違いは回転行列で比較する
+        """
+        for value, target in zip(actual[:3], expected[:3]):
+            self.assertAlmostEqual(value, target, places=6)
+        actual_matrix = fsrobo_r_frame.pose_matrix(*actual[3:6])
+        expected_matrix = fsrobo_r_frame.pose_matrix(*expected[3:6])
+        for actual_row, expected_row in zip(actual_matrix, expected_matrix):
+            for value, target in zip(actual_row, expected_row):
+                self.assertAlmostEqual(value, target, places=9)
+
+    def inverse_offset(self, offset, tool_frame):
+        """
+        offsetで移動した後に元の位置に戻す相対移動量を求める
+        """
+        delta = fsrobo_r_frame.pose_matrix(*offset[3:6])
+        inverse = _transpose(delta)
+        if tool_frame:
+            # ツール座標系では移動後の姿勢で平行移動するため、回転を打ち消した移動量にする
+            translation = [-value for value in fsrobo_r_frame.rotate(inverse, offset[:3])]
+        else:
+            translation = [-value for value in offset[:3]]
+        return tuple(translation) + fsrobo_r_frame.matrix_angles(inverse)
+
+    def test_round_trip(self):
+        offsets = [
+            (10.0, -5.0, 2.5, 0.0, 0.0, 0.0),
+            (0.0, 0.0, 0.0, 15.0, 0.0, 0.0),
+            (0.0, 0.0, 0.0, 0.0, -25.0, 40.0),
+            (12.0, 7.0, -30.0, 5.0, 10.0, -15.0)
+        ]
+        for tool_frame in (False, True):
+            for offset in offsets:
+                moved = fsrobo_r_frame.offset_pose(POSE, offset, tool_frame)
+                back = fsrobo_r_frame.offset_pose(moved, self.inverse_offset(offset, tool_frame), tool_frame)
+                self.assertPoseEqual(back, POSE)
+
+    def test_translation_only_keeps_angles(self):
+        for tool_frame in (False, True):
+            moved = fsrobo_r_frame.offset_pose(POSE, (1.0, 2.0, 3.0, 0, 0, 0), tool_frame)
+            self.assertEqual(moved[3:6], POSE[3:6])
+
+    def test_tool_translation_follows_orientation(self):
+        offset = (10.0, 20.0, -5.0, 0.0, 0.0, 0.0)
+        moved = fsrobo_r_frame.offset_pose(POSE, offset, True)
+        translation = fsrobo_r_frame.rotate(fsrobo_r_frame.pose_matrix(*POSE[3:6]), offset[:3])
+        base = fsrobo_r_frame.offset_pose(POSE, tuple(translation) + (0.0, 0.0, 0.0), False)
+        self.assertPoseEqual(moved, base)
+
+    def test_angles_round_trip(self):
+        for angles in ((0.0, 0.0, 0.0), (30.0, -20.0, 160.0), (-170.0, 80.0, -45.0)):
+            matrix = fsrobo_r_frame.pose_matrix(*angles)
+            for value, expected in zip(fsrobo_r_frame.matrix_angles(matrix), angles):
+                self.assertAlmostEqual(value, expected, places=9)
+
+
+if __name__ == "__main__":
+    unittest.main()
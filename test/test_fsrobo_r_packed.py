@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+fsrobo_r_packedのテスト
+"""
+
+import json
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fsrobo_r_packed
+
+# 型ごとの境界値を含むテスト値
+VALUES = {
+    "d": [0.0, -1.5, 1e300, 3.141592653589793],
+    "f": [0.0, -1.5, 2.5, 1024.0],
+    "i": [0, -1, 2 ** 31 - 1, -2 ** 31],
+    "I": [0, 1, 2 ** 32 - 1, 12345],
+    "h": [0, -1, 2 ** 15 - 1, -2 ** 15],
+    "H": [0, 1, 2 ** 16 - 1, 300],
+    "b": [0, -1, 127, -128],
+    "B": [0, 1, 255, 128]
+}
+
+
+class PackedTest(unittest.TestCase):
+
+    def test_values_round_trip(self):
+        for type_code, values in VALUES.items():
+            shape, data = fsrobo_r_packed.pack_values(type_code, values)
+            self.assertEqual(shape, [len(values)])
+            self.assertEqual(len(data), len(values) * fsrobo_r_packed.TYPE_SIZES[type_code])
+            # JSONを経由しても同じバイナリに戻る
+            spec = json.loads(json.dumps(fsrobo_r_packed.encode(type_code, shape, data)))
+            decoded = fsrobo_r_packed.decode(spec)
+            self.assertEqual(decoded, (type_code, shape, data))
+            self.assertEqual(fsrobo_r_packed.unpack_values(*decoded), values)
+
+    def test_rows_round_trip(self):
+        rows = [(float(index), index * 0.5, -index, 0.0, 1e-9, 180.0) for index in range(50)]
+        shape, data = fsrobo_r_packed.pack_rows("d", rows, 6)
+        self.assertEqual(shape, [50, 6])
+        decoded = fsrobo_r_packed.decode(fsrobo_r_packed.encode("d", shape, data))
+        self.assertEqual(fsrobo_r_packed.unpack_rows(*decoded), rows)
+
+    def test_little_endian(self):
+        shape, data = fsrobo_r_packed.pack_values("i", [1])
+        self.assertEqual(data, struct.pack("<i", 1))
+
+    def test_empty_array(self):
+        shape, data = fsrobo_r_packed.pack_rows("d", [], 6)
+        self.assertEqual(fsrobo_r_packed.unpack_rows(*fsrobo_r_packed.decode(
+            fsrobo_r_packed.encode("d", shape, data))), [])
+
+    def test_decode_rejects_invalid_spec(self):
+        spec = fsrobo_r_packed.encode("d", *fsrobo_r_packed.pack_values("d", [1.0, 2.0]))
+        for key, value in (("T", "q"), ("S", [3]), ("S", [-2]), ("D", "AAAA")):
+            invalid = dict(spec)
+            invalid[key] = value
+            with self.assertRaises(ValueError):
+                fsrobo_r_packed.decode(invalid)
+
+
+if __name__ == "__main__":
+    unittest.main()
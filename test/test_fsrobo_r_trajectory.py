@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# FSRobo-R Package BSDL
+# ---------
+# Copyright (C) 2019 FUJISOFT. All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation and/or
+# other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ---------
+
+
+"""
+fsrobo_r_trajectoryのテスト
+"""
+
+import math
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fsrobo_r_trajectory
+
+
+def _distance(point, start, end):
+    """
+    線分から点までの関節空間での距離(テスト用にNumPyを使わずに計算する)
+    """
+    direction = [e - s for s, e in zip(start, end)]
+    offset = [p - s for s, p in zip(start, point)]
+    length = sum(d * d for d in direction)
+    ratio = 0.0
+    if length > 0.0:
+        ratio = min(1.0, max(0.0, sum(o * d for o, d in zip(offset, direction)) / length))
+    return math.sqrt(sum((o - ratio * d) ** 2 for o, d in zip(offset, direction)))
+
+
+@unittest.skipUnless(fsrobo_r_trajectory.spline_available(), "numpy is not available")
+class SimplifyTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(1)
+        # ほぼ直線上の点にノイズと折れ曲がりを加えた軌道
+        self.points = []
+        for index in range(500):
+            bend = 30.0 if index > 250 else 0.0
+            self.points.append([index * 0.1 + random.uniform(-0.05, 0.05),
+                                bend * (index - 250) / 250.0 if index > 250 else 0.0,
+                                math.sin(index / 50.0) * 5.0, 0.0, random.uniform(-0.02, 0.02), 0.0])
+
+    def test_deviation_within_tolerance(self):
+        for tolerance in (0.01, 0.1, 0.5, 2.0):
+            indices, deviation = fsrobo_r_trajectory.simplify(self.points, tolerance)
+            self.assertEqual(indices[0], 0)
+            self.assertEqual(indices[-1], len(self.points) - 1)
+            self.assertEqual(indices, sorted(set(indices)))
+            self.assertLess(len(indices), len(self.points))
+            worst = 0.0
+            for first, last in zip(indices, indices[1:]):
+                for index in range(first + 1, last):
+                    worst = max(worst, _distance(self.points[index], self.points[first], self.points[last]))
+            self.assertLessEqual(worst, tolerance + 1e-9)
+            self.assertAlmostEqual(worst, deviation, places=9)
+
+    def test_removes_collinear_points(self):
+        points = [[index * 1.0, index * 2.0, 0.0, 0.0, 0.0, -index * 0.5] for index in range(100)]
+        indices, deviation = fsrobo_r_trajectory.simplify(points, 0.001)
+        self.assertEqual(indices, [0, 99])
+        self.assertAlmostEqual(deviation, 0.0)
+
+    def test_zero_tolerance_keeps_all_points(self):
+        indices, deviation = fsrobo_r_trajectory.simplify(self.points, 0)
+        self.assertEqual(indices, list(range(len(self.points))))
+        self.assertEqual(deviation, 0.0)
+
+
+@unittest.skipUnless(fsrobo_r_trajectory.spline_available(), "numpy is not available")
+class SplineTest(unittest.TestCase):
+
+    KNOTS = [
+        [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        [10.0, 5.0, -3.0, 0.0, 20.0, 0.0],
+        [20.0, -5.0, 3.0, 10.0, 0.0, 45.0],
+        [25.0, 0.0, 0.0, 0.0, -10.0, 90.0]
+    ]
+    TIMES = [0.0, 0.5, 1.2, 2.0]
+    PERIOD = 0.01
+    WIDE_LIMITS = [1e6] * 6
+
+    def test_passes_through_knots(self):
+        for degree in (3, 5):
+            samples, scale = fsrobo_r_trajectory.spline(self.KNOTS, self.TIMES, self.PERIOD, degree,
+                                                        self.WIDE_LIMITS)
+            self.assertEqual(scale, 1.0)
+            for knot, stamp in zip(self.KNOTS, self.TIMES):
+                sample = samples[int(round(stamp / self.PERIOD))]
+                for value, expected in zip(sample, knot):
+                    self.assertAlmostEqual(value, expected, places=6)
+
+    def test_velocity_within_limits_after_stretching(self):
+        limits = [20.0, 20.0, 20.0, 30.0, 30.0, 40.0]
+        for degree in (3, 5):
+            samples, scale = fsrobo_r_trajectory.spline(self.KNOTS, self.TIMES, self.PERIOD, degree, limits)
+            self.assertGreater(scale, 1.0)
+            self.assertEqual(samples[0], self.KNOTS[0])
+            for value, expected in zip(samples[-1], self.KNOTS[-1]):
+                self.assertAlmostEqual(value, expected, places=6)
+            # 最後の区間は周期より短いため除く
+            for previous, current in zip(samples[:-2], samples[1:-1]):
+                for axis in range(6):
+                    speed = abs(current[axis] - previous[axis]) / self.PERIOD
+                    self.assertLessEqual(speed, limits[axis] * 1.01)
+
+    def test_rejects_invalid_input(self):
+        with self.assertRaises(ValueError):
+            fsrobo_r_trajectory.spline(self.KNOTS, self.TIMES, self.PERIOD, 4, self.WIDE_LIMITS)
+        with self.assertRaises(ValueError):
+            fsrobo_r_trajectory.spline(self.KNOTS, [0.0, 1.0, 1.0, 2.0], self.PERIOD, 3, self.WIDE_LIMITS)
+        with self.assertRaises(ValueError):
+            fsrobo_r_trajectory.spline(self.KNOTS[:1], self.TIMES[:1], self.PERIOD, 3, self.WIDE_LIMITS)
+
+
+if __name__ == "__main__":
+    unittest.main()